@@ -5,6 +5,16 @@ import pytest
 from unittest.mock import Mock, MagicMock
 
 
+@pytest.fixture(autouse=True)
+def journal_root(tmp_path, monkeypatch):
+    """Keep the started-domain journal of tests out of the real /run."""
+    from truenas_pylibvirt import journal
+
+    root = tmp_path / "journal"
+    monkeypatch.setattr(journal, "JOURNAL_ROOT", str(root))
+    return root
+
+
 @pytest.fixture
 def mock_connection():
     """Mock Connection object for testing."""
@@ -13,6 +23,8 @@ def mock_connection():
     conn.domain_state = Mock(return_value=Mock(value='RUNNING'))
     conn.get_domain = Mock()
     conn.list_domains = Mock(return_value=[])
+    conn.call = Mock(side_effect=lambda operation, func, *args: func(*args))
+    conn.monitoring_call = Mock(side_effect=lambda operation, func: func(conn.connection))
     return conn
 
 
@@ -16,6 +16,13 @@ from truenas_pylibvirt.device import CDROMDevice
         '<target dev="sda" bus="sata" />'
         '<boot order="1" /></disk>'
     ),
+    (
+        "",
+        '<disk type="file" device="cdrom">'
+        '<driver type="raw" />'
+        '<target dev="sda" bus="sata" />'
+        '<boot order="1" /></disk>'
+    ),
 ])
 def test_cdrom_xml_generation(path, expected_xml, device_context, mock_device_delegate):
     """Test CDROM device XML generation."""
@@ -0,0 +1,85 @@
+"""Tests for starting and stopping the devices of a domain."""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from truenas_pylibvirt.device.manager import DeviceManager
+
+
+class _Device:
+    def __init__(self, name, log, concurrent=True, barrier=None, fail=False):
+        self.name = name
+        self.log = log
+        self.CONCURRENT_RUN = concurrent
+        self.barrier = barrier
+        self.fail = fail
+
+    def identity(self):
+        return self.name
+
+    @contextmanager
+    def run(self, connection, domain_uuid):
+        if self.barrier is not None:
+            # Only passes if the other devices are being started at the same time
+            self.barrier.wait(5)
+        if self.fail:
+            raise RuntimeError(self.name)
+        self.log.append(f"start {self.name}")
+        try:
+            yield
+        finally:
+            self.log.append(f"stop {self.name}")
+
+
+def test_sequential_start_and_reverse_teardown():
+    log = []
+    manager = DeviceManager([_Device("a", log), _Device("b", log)], "uuid")
+
+    with manager.start(Mock()):
+        assert log == ["start a", "start b"]
+
+    assert log == ["start a", "start b", "stop b", "stop a"]
+
+
+def test_parallel_start_runs_concurrent_devices_together():
+    log = []
+    barrier = threading.Barrier(3)
+    devices = [_Device(name, log, barrier=barrier) for name in ("a", "b", "c")]
+    devices.append(_Device("serial", log, concurrent=False))
+    manager = DeviceManager(devices, "uuid", parallel=True)
+
+    with manager.start(Mock()):
+        assert sorted(log) == ["start a", "start b", "start c", "start serial"]
+
+    assert sorted(log[4:]) == ["stop a", "stop b", "stop c", "stop serial"]
+    # Devices that can not run concurrently are torn down after the others
+    assert log[-1] == "stop serial"
+
+
+def test_parallel_start_rolls_back_on_failure():
+    log = []
+    devices = [_Device("a", log), _Device("b", log, fail=True), _Device("serial", log, concurrent=False)]
+    manager = DeviceManager(devices, "uuid", parallel=True)
+
+    with pytest.raises(RuntimeError, match="b"):
+        with manager.start(Mock()):
+            pytest.fail("devices must not be considered started")
+
+    assert sorted(log) == ["start a", "start serial", "stop a", "stop serial"]
+
+
+def test_start_without_tracer_does_not_resolve_identities():
+    log = []
+    device = _Device("a", log)
+    device.identity = Mock(return_value="a")
+    manager = DeviceManager([device], "uuid")
+
+    with manager.start(Mock()):
+        pass
+
+    assert log == ["start a", "stop a"]
+    device.identity.assert_not_called()
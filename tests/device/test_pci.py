@@ -4,8 +4,11 @@ from __future__ import annotations
 from unittest.mock import Mock, patch
 from xml.etree import ElementTree as ET
 
+import libvirt
+
 from truenas_pylibvirt.device import PCIDevice
 from truenas_pylibvirt.domain.start_validator import StartValidationContext
+from truenas_pylibvirt.libvirtd.ownership import OwnershipIndex
 
 
 def test_pci_device_exclusive():
@@ -66,6 +69,8 @@ def test_pci_conflict_detection_no_conflict(mock_device_delegate):
     # Mock connection with no other VMs
     mock_conn = Mock()
     mock_conn.connection.listAllDomains.return_value = []
+    mock_conn.monitoring_call.side_effect = lambda operation, func: func(mock_conn.connection)
+    mock_conn.ownership = OwnershipIndex(mock_conn)
 
     context = StartValidationContext(
         connection=mock_conn,
@@ -106,6 +111,8 @@ def test_pci_conflict_detection_with_conflict(mock_device_delegate):
 
     mock_conn = Mock()
     mock_conn.connection.listAllDomains.return_value = [mock_domain]
+    mock_conn.monitoring_call.side_effect = lambda operation, func: func(mock_conn.connection)
+    mock_conn.ownership = OwnershipIndex(mock_conn)
 
     context = StartValidationContext(
         connection=mock_conn,
@@ -148,6 +155,8 @@ def test_pci_no_conflict_with_self(mock_device_delegate):
 
     mock_conn = Mock()
     mock_conn.connection.listAllDomains.return_value = [mock_domain]
+    mock_conn.monitoring_call.side_effect = lambda operation, func: func(mock_conn.connection)
+    mock_conn.ownership = OwnershipIndex(mock_conn)
 
     context = StartValidationContext(
         connection=mock_conn,
@@ -187,7 +196,11 @@ def test_pci_no_conflict_with_inactive_vm(mock_device_delegate):
     mock_domain.name.return_value = "other-vm"
 
     mock_conn = Mock()
-    mock_conn.connection.listAllDomains.return_value = [mock_domain]
+    mock_conn.connection.listAllDomains.side_effect = lambda flags=0: (
+        [] if flags & libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE else [mock_domain]
+    )
+    mock_conn.monitoring_call.side_effect = lambda operation, func: func(mock_conn.connection)
+    mock_conn.ownership = OwnershipIndex(mock_conn)
 
     context = StartValidationContext(
         connection=mock_conn,
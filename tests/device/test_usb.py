@@ -5,6 +5,7 @@ from unittest.mock import Mock, patch
 from xml.etree import ElementTree as ET
 
 from truenas_pylibvirt.device import USBDevice
+from truenas_pylibvirt.libvirtd.ownership import OwnershipIndex
 
 
 def test_usb_device_exclusive():
@@ -425,6 +426,8 @@ def test_usb_conflict_detection(mock_device_delegate):
 
     mock_conn = Mock()
     mock_conn.connection.listAllDomains.return_value = [mock_domain]
+    mock_conn.monitoring_call.side_effect = lambda operation, func: func(mock_conn.connection)
+    mock_conn.ownership = OwnershipIndex(mock_conn)
 
     from truenas_pylibvirt.domain.start_validator import StartValidationContext
     context = StartValidationContext(
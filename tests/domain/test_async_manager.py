@@ -0,0 +1,110 @@
+"""Tests for the asyncio domain manager facade."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import Mock
+
+from truenas_pylibvirt.domain.async_manager import AsyncDomainManager
+from truenas_pylibvirt.domain.manager import DomainManager
+from truenas_pylibvirt.libvirtd.async_connection import AsyncConnection
+from truenas_pylibvirt.libvirtd.connection import DomainEvent, DomainState, VirDomainEvent
+
+
+def _domain(uuid="uuid", shutdown_timeout=30):
+    domain = Mock()
+    domain.configuration.uuid = uuid
+    domain.configuration.name = "test"
+    domain.configuration.shutdown_timeout = shutdown_timeout
+    return domain
+
+
+def _event_callbacks(mock_connection):
+    return [call[0][0] for call in mock_connection.register_domain_event_callback.call_args_list]
+
+
+def test_shutdown_returns_on_stopped_event(mock_connection):
+    mock_connection.domain_state.return_value = DomainState.RUNNING
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.isActive.return_value = True
+
+    async def main():
+        async_connection = AsyncConnection(mock_connection)
+        manager = AsyncDomainManager(DomainManager(mock_connection), async_connection)
+        try:
+            task = asyncio.create_task(manager.shutdown(_domain(), resend_interval=10))
+            while not libvirt_domain.shutdown.called:
+                await asyncio.sleep(0.01)
+
+            for callback in _event_callbacks(mock_connection):
+                callback(DomainEvent(event=VirDomainEvent.STOPPED, uuid="uuid"))
+
+            await asyncio.wait_for(task, 1)
+            assert libvirt_domain.shutdown.call_count == 1
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+
+def test_shutdown_resends_until_timeout(mock_connection):
+    mock_connection.domain_state.return_value = DomainState.RUNNING
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.isActive.return_value = True
+
+    async def main():
+        async_connection = AsyncConnection(mock_connection)
+        domain_manager = DomainManager(mock_connection)
+        manager = AsyncDomainManager(domain_manager, async_connection)
+        try:
+            await manager.shutdown(_domain(), shutdown_timeout=0.2, resend_interval=0.05)
+            assert libvirt_domain.shutdown.call_count >= 2
+            assert domain_manager._stop_waiters == {}
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+
+def test_shutdown_of_already_stopped_domain(mock_connection):
+    mock_connection.domain_state.return_value = DomainState.SHUTOFF
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.isActive.return_value = True
+
+    async def main():
+        async_connection = AsyncConnection(mock_connection)
+        manager = AsyncDomainManager(DomainManager(mock_connection), async_connection)
+        try:
+            await manager.shutdown(_domain())
+            libvirt_domain.shutdown.assert_not_called()
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+
+def test_delete_awaits_cleanup(mock_connection):
+    mock_connection.domain_state.return_value = DomainState.RUNNING
+    libvirt_domain = mock_connection.get_domain.return_value
+    domain = _domain()
+    domain_manager = DomainManager(mock_connection)
+    started_domain = Mock(started_at=0.0)
+    domain_manager.started_domains["uuid"] = started_domain
+    domain.undefine.side_effect = lambda _: started_domain.cleanup.assert_called_once()
+
+    async def main():
+        async_connection = AsyncConnection(mock_connection)
+        manager = AsyncDomainManager(domain_manager, async_connection)
+        loop = asyncio.get_running_loop()
+        libvirt_domain.destroy.side_effect = lambda: loop.call_later(0.05, lambda: [
+            callback(DomainEvent(event=VirDomainEvent.STOPPED, uuid="uuid"))
+            for callback in _event_callbacks(mock_connection)
+        ])
+        try:
+            await asyncio.wait_for(manager.delete(domain), 5)
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+    domain.undefine.assert_called_once_with(libvirt_domain)
+    assert domain_manager._cleanup_waiters == {}
@@ -0,0 +1,141 @@
+"""Tests for batch domain operations."""
+from __future__ import annotations
+
+import threading
+import time
+from unittest.mock import Mock
+
+from truenas_pylibvirt.domain.batch import run_batch
+from truenas_pylibvirt.domain.managers import DomainManagers
+from truenas_pylibvirt.error import Error
+from truenas_pylibvirt.libvirtd.connection import DomainState
+from truenas_pylibvirt.libvirtd.stats import DomainStats
+
+
+def _domain(uuid):
+    domain = Mock()
+    domain.configuration.uuid = uuid
+    domain.configuration.name = uuid
+    return domain
+
+
+def _recorder():
+    calls = []
+    lock = threading.Lock()
+
+    def operation(domain):
+        with lock:
+            calls.append(domain.configuration.uuid)
+
+    return calls, operation
+
+
+def test_priorities_and_dependencies():
+    calls, operation = _recorder()
+    domains = [_domain(uuid) for uuid in ("a", "b", "c", "d")]
+
+    results = run_batch(
+        domains, operation, max_concurrency=1, priorities={"c": 10, "d": 5}, dependencies={"c": ["a"]},
+    )
+
+    assert results == {"a": None, "b": None, "c": None, "d": None}
+    # `c` has the highest priority but has to wait for `a`
+    assert calls == ["d", "a", "c", "b"]
+
+
+def test_reverse_dependencies():
+    calls, operation = _recorder()
+
+    run_batch([_domain("a"), _domain("b")], operation, max_concurrency=1, dependencies={"a": ["b"]},
+              reverse_dependencies=True)
+
+    assert calls == ["a", "b"]
+
+
+def test_failure_skips_dependents():
+    calls, operation = _recorder()
+
+    def fail_a(domain):
+        if domain.configuration.uuid == "a":
+            raise Error("boom")
+        operation(domain)
+
+    results = run_batch(
+        [_domain("a"), _domain("b"), _domain("c")], fail_a, dependencies={"b": ["a"], "c": ["b"]},
+    )
+
+    assert str(results["a"]) == "boom"
+    assert isinstance(results["b"], Error)
+    assert isinstance(results["c"], Error)
+    assert calls == []
+
+
+def test_dependency_cycle_is_reported():
+    calls, operation = _recorder()
+
+    results = run_batch([_domain("a"), _domain("b"), _domain("c")], operation, dependencies={"a": ["b"], "b": ["a"]})
+
+    assert "cycle" in str(results["a"]) and "cycle" in str(results["b"])
+    assert results["c"] is None
+    assert calls == ["c"]
+
+
+def test_concurrency_limit():
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def operation(domain):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    run_batch([_domain(str(i)) for i in range(8)], operation, max_concurrency=3)
+
+    assert max_running == 3
+
+
+def test_shutdown_many_skips_inactive_domains():
+    managers = DomainManagers(Mock())
+    managers.vms.shutdown = Mock()
+    managers.vms_connection.bulk_stats.return_value = {
+        "running": DomainStats("running", state=DomainState.RUNNING),
+        "stopped": DomainStats("stopped", state=DomainState.SHUTOFF),
+    }
+    domains = [_domain("running"), _domain("stopped"), _domain("undefined")]
+
+    results = managers.shutdown_many(domains)
+
+    assert results == {"running": None, "stopped": None, "undefined": None}
+    managers.vms_connection.bulk_stats.assert_called_once()
+    managers.vms.shutdown.assert_called_once_with(domains[0], None)
+
+
+def test_shutdown_many_timeout_blocks_dependencies():
+    managers = DomainManagers(Mock())
+    managers.vms.shutdown = Mock(side_effect=lambda domain, timeout: domain.configuration.uuid != "app")
+    managers.vms_connection.bulk_stats.return_value = {
+        uuid: DomainStats(uuid, state=DomainState.RUNNING) for uuid in ("app", "db")
+    }
+    domains = [_domain("app"), _domain("db")]
+
+    results = managers.shutdown_many(domains, dependencies={"app": ["db"]})
+
+    assert isinstance(results["app"], Error)
+    assert isinstance(results["db"], Error)
+    managers.vms.shutdown.assert_called_once_with(domains[0], None)
+
+
+def test_start_many_shares_one_validation_snapshot():
+    managers = DomainManagers(Mock())
+    managers.vms.start = Mock()
+    domains = [_domain("first"), _domain("second")]
+
+    assert managers.start_many(domains) == {"first": None, "second": None}
+
+    [first, second] = managers.vms.start.call_args_list
+    assert first.args[1] is second.args[1]
@@ -0,0 +1,485 @@
+"""Tests for DomainManager lifecycle operations."""
+from __future__ import annotations
+
+import threading
+import time
+from unittest.mock import MagicMock, Mock
+from xml.etree import ElementTree
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt import journal, runtime
+from truenas_pylibvirt.device.cdrom import CDROMDevice
+from truenas_pylibvirt.device.delegate import DeviceDelegate
+from truenas_pylibvirt.device.manager import DeviceManager
+from truenas_pylibvirt.device.storage import RawStorageDevice, StorageDeviceType
+from truenas_pylibvirt.domain.manager import DomainManager, StartedDomain
+from truenas_pylibvirt.error import Error
+from truenas_pylibvirt.journal import JournalEntryKind
+from truenas_pylibvirt.libvirtd.connection import DomainEvent, DomainState, VirDomainEvent
+from truenas_pylibvirt.libvirtd.events import DeviceRemovedEvent
+
+
+def _domain(uuid="uuid", shutdown_timeout=30, transient=False):
+    domain = Mock()
+    domain.configuration.uuid = uuid
+    domain.configuration.name = "test"
+    domain.configuration.shutdown_timeout = shutdown_timeout
+    domain.configuration.transient = transient
+    return domain
+
+
+@pytest.fixture
+def manager(mock_connection):
+    mock_connection.domain_state.return_value = DomainState.RUNNING
+    mock_connection.get_domain.return_value.isActive.return_value = True
+    return DomainManager(mock_connection)
+
+
+def _stop(manager, uuid="uuid"):
+    event = DomainEvent(event=VirDomainEvent.STOPPED, uuid=uuid)
+    manager._resolve_stop_waiters(event)
+    manager._domain_event_callback(event)
+
+
+def test_shutdown_returns_on_stopped_event(manager, mock_connection):
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.shutdown.side_effect = lambda: threading.Timer(0.05, _stop, (manager,)).start()
+
+    start = time.monotonic()
+    assert manager.shutdown(_domain(), resend_interval=10) is True
+
+    assert time.monotonic() - start < 5
+    assert libvirt_domain.shutdown.call_count == 1
+    assert manager._stop_waiters == {}
+
+
+def test_shutdown_resends_until_timeout(manager, mock_connection):
+    libvirt_domain = mock_connection.get_domain.return_value
+
+    assert manager.shutdown(_domain(), shutdown_timeout=0.2, resend_interval=0.05) is False
+
+    assert libvirt_domain.shutdown.call_count >= 2
+    assert manager._stop_waiters == {}
+
+
+def test_shutdown_of_already_stopped_domain(manager, mock_connection):
+    mock_connection.domain_state.return_value = DomainState.SHUTOFF
+
+    manager.shutdown(_domain())
+
+    mock_connection.get_domain.return_value.shutdown.assert_not_called()
+
+
+def test_shutdown_waits_for_domain_already_shutting_down(manager, mock_connection):
+    mock_connection.domain_state.return_value = DomainState.SHUTDOWN
+    libvirt_domain = mock_connection.get_domain.return_value
+
+    assert manager.shutdown(_domain(), shutdown_timeout=0.1, resend_interval=0.05) is False
+
+    threading.Timer(0.05, _stop, (manager,)).start()
+    assert manager.shutdown(_domain(), resend_interval=10) is True
+    libvirt_domain.shutdown.assert_not_called()
+
+
+def test_wait_for_stop_ignores_other_domains(manager):
+    future = manager.wait_for_stop("uuid")
+    _stop(manager, "other")
+    assert not future.done()
+
+    _stop(manager)
+    assert future.result(0).uuid == "uuid"
+
+
+def test_delete_waits_for_cleanup_instead_of_sleeping(manager, mock_connection):
+    libvirt_domain = mock_connection.get_domain.return_value
+    started_domain = Mock(started_at=0.0)
+    manager.started_domains["uuid"] = started_domain
+
+    def destroy():
+        # The STOPPED event is delivered on a dispatcher worker
+        threading.Timer(0.05, _stop, (manager,)).start()
+
+    libvirt_domain.destroy.side_effect = destroy
+    domain = _domain()
+    domain.undefine.side_effect = lambda _: started_domain.cleanup.assert_called_once()
+
+    start = time.monotonic()
+    manager.delete(domain)
+
+    assert time.monotonic() - start < 5
+    domain.undefine.assert_called_once_with(libvirt_domain)
+    assert manager._cleanup_waiters == {}
+
+
+def _startable_domain(uuid, devices=(), generate=None, transient=False, autodestroy=False):
+    domain = MagicMock()
+    domain.configuration.uuid = uuid
+    domain.configuration.name = uuid
+    domain.configuration.transient = transient
+    domain.configuration.autodestroy = autodestroy
+    domain.device_manager.devices = list(devices)
+    domain.xml_generator.return_value.generate_xml.side_effect = generate or (lambda: ("<domain/>", "hash"))
+    return domain
+
+
+def _exclusive_device(identity):
+    device = Mock()
+    device.EXCLUSIVE_DEVICE = True
+    device.identity.return_value = identity
+    device.ownership_keys.return_value = []
+    device.is_available.return_value = True
+    device.validate_start.return_value = []
+    return device
+
+
+def test_independent_domains_start_in_parallel(manager, mock_connection):
+    other_created = threading.Event()
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.create.side_effect = lambda: other_created.set() or 0
+    libvirt_domain.metadata.side_effect = libvirt.libvirtError("no metadata")
+
+    def slow_generate():
+        # Would time out if starts were serialized by a manager-wide lock
+        assert other_created.wait(5)
+        return "<domain/>", "hash"
+
+    slow = threading.Thread(target=manager.start, args=(_startable_domain("slow", generate=slow_generate),))
+    slow.start()
+    time.sleep(0.05)
+    manager.start(_startable_domain("fast"))
+    slow.join(5)
+
+    assert set(manager.started_domains) == {"slow", "fast"}
+
+
+def test_exclusive_device_is_reserved_during_start(manager, mock_connection):
+    mock_connection.get_domain.return_value.create.return_value = 0
+    mock_connection.get_domain.return_value.metadata.side_effect = libvirt.libvirtError("no metadata")
+    generating = threading.Event()
+    release = threading.Event()
+
+    def slow_generate():
+        generating.set()
+        release.wait(5)
+        return "<domain/>", "hash"
+
+    first = threading.Thread(
+        target=manager.start, args=(_startable_domain("first", [_exclusive_device("gpu")], slow_generate),),
+    )
+    first.start()
+    assert generating.wait(5)
+    try:
+        with pytest.raises(Error, match="being claimed"):
+            manager.start(_startable_domain("second", [_exclusive_device("gpu")]))
+    finally:
+        release.set()
+        first.join(5)
+
+    assert manager._reserved_devices == {}
+    assert "first" in manager.started_domains
+
+
+def test_unchanged_domain_is_not_redefined(manager, mock_connection):
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.create.return_value = 0
+    libvirt_domain.metadata.return_value = '<truenas:config xmlns:truenas="ns" hash="hash"/>'
+
+    manager.start(_startable_domain("uuid"))
+    mock_connection.define_domain.assert_not_called()
+    manager.started_domains.clear()
+
+    libvirt_domain.metadata.return_value = '<truenas:config xmlns:truenas="ns" hash="old"/>'
+    manager.start(_startable_domain("uuid"))
+    mock_connection.define_domain.assert_called_once_with("<domain/>")
+
+
+def test_transient_domain_is_created_without_define(manager, mock_connection):
+    manager.start(_startable_domain("uuid", transient=True, autodestroy=True))
+
+    mock_connection.create_domain.assert_called_once_with("<domain/>", libvirt.VIR_DOMAIN_START_AUTODESTROY)
+    mock_connection.define_domain.assert_not_called()
+    mock_connection.get_domain.return_value.create.assert_not_called()
+    assert "uuid" in manager.started_domains
+
+
+def test_delete_does_not_undefine_transient_domain(manager, mock_connection):
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.isPersistent.return_value = False
+    libvirt_domain.destroy.side_effect = lambda: threading.Timer(0.05, _stop, (manager,)).start()
+    domain = _domain(transient=True)
+
+    manager.delete(domain)
+    libvirt_domain.destroy.assert_called_once()
+    domain.undefine.assert_not_called()
+
+    # Once stopped there is nothing left to delete
+    mock_connection.get_domain.return_value = None
+    manager.delete(domain)
+
+
+def test_stop_of_rehydrated_domain_runs_journaled_cleanup(manager, mock_connection, monkeypatch):
+    monkeypatch.setattr(runtime, "cleanup_for_uuid", Mock())
+    journal.record("uuid", JournalEntryKind.PCI_DEVICE, "pci_a")
+
+    manager.rehydrate("uuid", journal.load("uuid"))
+    _stop(manager)
+
+    mock_connection.connection.nodeDeviceLookupByName.assert_called_once_with("pci_a")
+    assert manager.started_domains == {}
+    assert journal.load_all() == {}
+
+
+def _disk(path, type_=StorageDeviceType.VIRTIO, delegate=None):
+    path.touch()
+    return RawStorageDevice(
+        type_=type_, logical_sectorsize=None, physical_sectorsize=None, iotype=None,
+        path=str(path), serial=None, **({"device_delegate": delegate} if delegate else {}),
+    )
+
+
+@pytest.fixture
+def started(manager, mock_connection, tmp_path):
+    domain = _startable_domain("uuid")
+    domain.device_manager = DeviceManager([_disk(tmp_path / "boot")], "uuid")
+    manager.started_domains["uuid"] = StartedDomain(domain, mock_connection)
+    return domain
+
+
+def test_attach_device_continues_device_numbering(manager, mock_connection, started, tmp_path):
+    libvirt_domain = mock_connection.get_domain.return_value
+    disk = _disk(tmp_path / "data")
+
+    manager.attach_device(started, disk)
+
+    xml, flags = libvirt_domain.attachDeviceFlags.call_args.args
+    target = ElementTree.fromstring(xml).find("target")
+    assert target.get("dev") == "vdb"
+    assert flags == libvirt.VIR_DOMAIN_AFFECT_LIVE | libvirt.VIR_DOMAIN_AFFECT_CONFIG
+    assert disk in started.device_manager.devices
+    assert [s.device for s in started.device_manager.started_devices][-1] is disk
+    mock_connection.ownership.refresh.assert_called_with("uuid")
+
+
+def test_failed_attach_exits_device_run_context(manager, mock_connection, started, tmp_path):
+    mock_connection.get_domain.return_value.attachDeviceFlags.side_effect = libvirt.libvirtError("busy")
+    disk = _disk(tmp_path / "data")
+
+    with pytest.raises(libvirt.libvirtError):
+        manager.attach_device(started, disk)
+
+    assert disk not in started.device_manager.devices
+    assert len(started.device_manager.started_devices) == 1
+
+
+def test_detach_device_waits_for_device_removed_event(manager, mock_connection, started, tmp_path):
+    disk = _disk(tmp_path / "data")
+    manager.attach_device(started, disk)
+    mock_connection.domain_xml.return_value = (
+        f'<domain><devices><disk><source file="{tmp_path / "data"}"/><target dev="vdb" bus="virtio"/>'
+        '<alias name="virtio-disk1"/></disk></devices></domain>'
+    )
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.detachDeviceFlags.side_effect = lambda xml, flags: threading.Timer(
+        0.05, manager._device_removed_callback, (DeviceRemovedEvent(uuid="uuid", alias="virtio-disk1"),),
+    ).start()
+
+    manager.detach_device(started, disk)
+
+    libvirt_domain.detachDeviceFlags.assert_called_once()
+    assert disk not in started.device_manager.devices
+    assert len(started.device_manager.started_devices) == 1
+    assert manager._device_removed_waiters == {}
+
+
+def test_detach_device_not_released_by_guest(manager, mock_connection, started, tmp_path):
+    disk = _disk(tmp_path / "data")
+    manager.attach_device(started, disk)
+    mock_connection.domain_xml.return_value = (
+        f'<domain><devices><disk><source file="{tmp_path / "data"}"/><target dev="vdb" bus="virtio"/>'
+        '<alias name="virtio-disk1"/></disk></devices></domain>'
+    )
+
+    with pytest.raises(Error, match="was not released"):
+        manager.detach_device(started, disk, timeout=0.05)
+
+    # Still attached to the current run
+    assert disk in started.device_manager.devices
+    assert manager._device_removed_waiters == {}
+
+
+def test_detach_device_without_alias_keeps_device(manager, mock_connection, started, tmp_path):
+    disk = _disk(tmp_path / "data")
+    manager.attach_device(started, disk)
+    mock_connection.domain_xml.return_value = "<domain><devices/></domain>"
+
+    with pytest.raises(Error, match="Unable to find device"):
+        manager.detach_device(started, disk)
+
+    mock_connection.get_domain.return_value.detachDeviceFlags.assert_not_called()
+    assert disk in started.device_manager.devices
+    assert len(started.device_manager.started_devices) == 2
+
+
+def test_detach_one_of_identical_devices(manager, mock_connection, started, tmp_path):
+    delegate = DeviceDelegate()
+    first, second = _disk(tmp_path / "data", delegate=delegate), _disk(tmp_path / "data", delegate=delegate)
+    assert first == second
+    manager.attach_device(started, first)
+    manager.attach_device(started, second)
+    mock_connection.domain_xml.return_value = (
+        '<domain><devices>'
+        f'<disk><source file="{tmp_path / "data"}"/><target dev="vdb" bus="virtio"/><alias name="virtio-disk1"/></disk>'
+        f'<disk><source file="{tmp_path / "data"}"/><target dev="vdc" bus="virtio"/><alias name="virtio-disk2"/></disk>'
+        '</devices></domain>'
+    )
+    mock_connection.get_domain.return_value.detachDeviceFlags.side_effect = lambda xml, flags: (
+        manager._device_removed_callback(DeviceRemovedEvent(uuid="uuid", alias="virtio-disk2"))
+    )
+
+    manager.detach_device(started, second, timeout=1)
+
+    assert ElementTree.fromstring(
+        mock_connection.get_domain.return_value.detachDeviceFlags.call_args.args[0]
+    ).find("target").get("dev") == "vdc"
+    assert [device is first for device in started.device_manager.devices] == [False, True]
+    assert [s.device is first for s in started.device_manager.started_devices] == [False, True]
+
+
+def test_attach_device_invalidates_config_hash(manager, mock_connection, started, tmp_path):
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.create.return_value = 0
+    metadata = {"xml": '<truenas:config xmlns:truenas="ns" hash="hash"/>'}
+
+    def get_metadata(*args):
+        if metadata["xml"] is None:
+            raise libvirt.libvirtError("no metadata")
+        return metadata["xml"]
+
+    libvirt_domain.metadata.side_effect = get_metadata
+    libvirt_domain.setMetadata.side_effect = lambda type_, xml, key, uri, flags: metadata.update(xml=xml)
+
+    manager.attach_device(started, _disk(tmp_path / "data"))
+    _stop(manager)
+    # The configuration the domain is restarted with does not have the hotplugged disk
+    manager.start(_startable_domain("uuid"))
+
+    mock_connection.define_domain.assert_called_once_with("<domain/>")
+
+
+def test_attach_device_reserves_exclusive_device(manager, started):
+    device = _exclusive_device("0000:01:00.0")
+    manager._reserved_devices[(device.__class__.__name__, "0000:01:00.0")] = "other"
+
+    with pytest.raises(Error, match="being claimed"):
+        manager.attach_device(started, device)
+
+    device.run.assert_not_called()
+    assert device not in started.device_manager.devices
+
+
+def test_change_media_keeps_cdrom_target(manager, mock_connection, started, tmp_path):
+    cdrom = CDROMDevice(path=str(tmp_path / "old.iso"))
+    started.device_manager.devices.insert(0, _disk(tmp_path / "sata", StorageDeviceType.AHCI))
+    started.device_manager.devices.append(cdrom)
+    (tmp_path / "new.iso").touch()
+    libvirt_domain = mock_connection.get_domain.return_value
+
+    media = manager.change_media(started, cdrom, str(tmp_path / "new.iso"))
+
+    xml, flags = libvirt_domain.updateDeviceFlags.call_args.args
+    element = ElementTree.fromstring(xml)
+    assert element.find("source").get("file") == str(tmp_path / "new.iso")
+    assert element.find("target").get("dev") == "sdb"
+    assert element.find("boot").get("order") == "3"
+    assert flags == libvirt.VIR_DOMAIN_AFFECT_LIVE | libvirt.VIR_DOMAIN_AFFECT_CONFIG
+    assert started.device_manager.devices[-1] is media
+
+
+def test_change_media_ejects(manager, mock_connection, started, tmp_path):
+    cdrom = CDROMDevice(path=str(tmp_path / "old.iso"))
+    started.device_manager.devices.append(cdrom)
+
+    media = manager.change_media(started, cdrom, None)
+
+    element = ElementTree.fromstring(mock_connection.get_domain.return_value.updateDeviceFlags.call_args.args[0])
+    assert element.find("source") is None
+    assert element.find("target").get("dev") == "sda"
+    assert media.path == ""
+
+
+def test_change_media_to_missing_image(manager, mock_connection, started, tmp_path):
+    cdrom = CDROMDevice(path=str(tmp_path / "old.iso"))
+    started.device_manager.devices.append(cdrom)
+
+    with pytest.raises(Error, match="does not exist"):
+        manager.change_media(started, cdrom, str(tmp_path / "missing.iso"))
+
+    mock_connection.get_domain.return_value.updateDeviceFlags.assert_not_called()
+    assert started.device_manager.devices[-1] is cdrom
+
+
+def test_change_media_of_one_of_identical_cdroms(manager, mock_connection, started, tmp_path):
+    (tmp_path / "old.iso").touch()
+    delegate = DeviceDelegate()
+    first, second = (CDROMDevice(path=str(tmp_path / "old.iso"), device_delegate=delegate) for _ in range(2))
+    started.device_manager.devices.extend([first, second])
+
+    media = manager.change_media(started, second, None)
+
+    element = ElementTree.fromstring(mock_connection.get_domain.return_value.updateDeviceFlags.call_args.args[0])
+    assert element.find("target").get("dev") == "sdb"
+    assert started.device_manager.devices[1] is first
+    assert started.device_manager.devices[2] is media
+    # The next start redefines the domain from its configuration
+    mock_connection.get_domain.return_value.setMetadata.assert_called_once()
+    assert "uuid" in manager._stale_definitions
+
+
+def test_domain_locks_are_dropped_once_unused(manager, mock_connection):
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with manager._domain_lock("uuid"):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    assert held.wait(5)
+    assert manager._domain_locks["uuid"][1] == 1
+
+    release.set()
+    thread.join(5)
+    mock_connection.get_domain.return_value.create.return_value = 0
+    mock_connection.get_domain.return_value.metadata.side_effect = libvirt.libvirtError("no metadata")
+    manager.start(_startable_domain("other"))
+    _stop(manager, "other")
+
+    assert manager._domain_locks == {}
+
+
+def test_stopped_event_handled_after_restart_is_ignored(manager, mock_connection, monkeypatch):
+    cleanup_for_uuid = Mock()
+    monkeypatch.setattr(runtime, "cleanup_for_uuid", cleanup_for_uuid)
+    libvirt_domain = mock_connection.get_domain.return_value
+    libvirt_domain.create.return_value = 0
+    libvirt_domain.metadata.side_effect = libvirt.libvirtError("no metadata")
+    previous_run = Mock(started_at=0.0)
+    manager.started_domains["uuid"] = previous_run
+
+    event = DomainEvent(event=VirDomainEvent.STOPPED, uuid="uuid")
+    manager._resolve_stop_waiters(event)
+    # Restarted as soon as `shutdown()` returned, the STOPPED callback is still queued on the dispatcher
+    mock_connection.domain_state.return_value = DomainState.SHUTOFF
+    manager.start(_startable_domain("uuid"))
+    previous_run.cleanup.assert_called_once()
+    cleanup_for_uuid.assert_called_once_with("uuid")
+    current_run = manager.started_domains["uuid"]
+
+    manager._domain_event_callback(event)
+
+    assert manager.started_domains["uuid"] is current_run
+    cleanup_for_uuid.assert_called_once()
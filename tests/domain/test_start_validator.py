@@ -1,8 +1,9 @@
 """Tests for domain start validation."""
 from __future__ import annotations
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from truenas_pylibvirt.device import NICDevice, NICDeviceType, PCIDevice
 from truenas_pylibvirt.domain.start_validator import StartValidator, StartValidationContext
 from truenas_pylibvirt.device.manager import DeviceManager
 
@@ -91,3 +92,48 @@ def test_start_validator_accumulates_errors(mock_connection):
 
     # Should have errors from both devices
     assert len(errors) == 2
+
+
+def test_pci_devices_share_one_host_scan(mock_connection, mock_device_delegate):
+    """All PCI devices of a start share a single IOMMU scan and only the devices in use are looked up."""
+    details = {'critical': False, 'error': None, 'drivers': []}
+    devices = [
+        PCIDevice(
+            domain="0000", bus="01", slot="00", function=function, pci_device=f"pci_0000_01_00_{function}",
+            device_delegate=mock_device_delegate,
+        )
+        for function in ("0", "1")
+    ]
+    mock_connection.ownership.owner.return_value = None
+    context = StartValidationContext(connection=mock_connection, domain_uuid="test-uuid")
+
+    with (
+        patch(
+            'truenas_pylibvirt.domain.start_validator.get_iommu_groups_info', return_value={},
+        ) as get_iommu_groups_info,
+        patch(
+            'truenas_pylibvirt.domain.start_validator.get_single_pci_device_details',
+            side_effect=lambda name, iommu_info: {name: details},
+        ) as get_single_pci_device_details,
+    ):
+        errors = StartValidator().validate(devices, context)
+
+    assert errors == []
+    get_iommu_groups_info.assert_called_once_with(get_critical_info=True)
+    assert [call.args[0] for call in get_single_pci_device_details.call_args_list] == [
+        "pci_0000_01_00_0", "pci_0000_01_00_1",
+    ]
+
+
+def test_nic_identity_uses_snapshot_default_route(mock_connection, mock_device_delegate):
+    nic = NICDevice(
+        type_=NICDeviceType.BRIDGE, source="", model=None, mac=None, trust_guest_rx_filters=False,
+        device_delegate=mock_device_delegate,
+    )
+    context = StartValidationContext(connection=mock_connection, domain_uuid="test-uuid")
+    context.snapshot._default_route_interface = "eno1"
+
+    with patch('truenas_pylibvirt.device.nic.netlink_route') as netlink_route:
+        assert nic.identity(context) == "eno1"
+
+    netlink_route.assert_not_called()
@@ -0,0 +1,90 @@
+"""Tests for start pipeline tracing."""
+from __future__ import annotations
+
+from unittest.mock import MagicMock, Mock
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.domain.manager import DomainManager
+from truenas_pylibvirt.domain.tracing import StartTracer, TraceCollector, TraceHook
+from truenas_pylibvirt.error import Error
+
+
+def _device(identity):
+    device = MagicMock()
+    device.EXCLUSIVE_DEVICE = False
+    device.identity.return_value = identity
+    device.is_available.return_value = True
+    device.validate_start.return_value = []
+    return device
+
+
+def _domain(uuid="uuid", devices=()):
+    domain = MagicMock()
+    domain.configuration.uuid = uuid
+    domain.configuration.name = uuid
+    domain.configuration.transient = False
+    domain.device_manager.devices = list(devices)
+    domain.xml_generator.return_value.generate_xml.return_value = ("<domain/>", "hash")
+    return domain
+
+
+@pytest.fixture
+def manager(mock_connection):
+    mock_connection.get_domain.return_value.create.return_value = 0
+    mock_connection.get_domain.return_value.metadata.side_effect = libvirt.libvirtError("no metadata")
+    manager = DomainManager(mock_connection)
+    manager.collector = TraceCollector(max_traces=2)
+    manager.add_trace_hook(manager.collector)
+    return manager
+
+
+def test_start_emits_span_per_phase(manager):
+    manager.start(_domain(devices=[_device("disk"), _device("nic")]))
+
+    trace = manager.collector.last("uuid")
+    assert trace.error is None
+    assert trace.duration >= 0
+    names = [(span.name, span.device) for span in trace.spans]
+    assert names[:5] == [
+        ("device.is_available", "disk"), ("device.validate_start", "disk"),
+        ("device.is_available", "nic"), ("device.validate_start", "nic"),
+        ("validate", None),
+    ]
+    assert ("create", None) in names
+    assert ("define", None) in names
+    assert ("xml", None) in names
+
+
+def test_failed_start_is_traced(manager):
+    domain = _domain()
+    manager.connection.define_domain.side_effect = Error("define failed")
+
+    with pytest.raises(Error):
+        manager.start(domain)
+
+    trace = manager.collector.last("uuid")
+    assert "define failed" in trace.error
+    assert [span for span in trace.spans if span.name == "define"][0].error is not None
+
+
+def test_collector_keeps_last_traces(manager):
+    for _ in range(3):
+        manager.start(_domain())
+        manager.started_domains.clear()
+
+    assert len(manager.collector.traces("uuid")) == 2
+    assert manager.collector.traces("other") == []
+
+
+def test_failing_hook_does_not_break_tracing():
+    hook = Mock(spec=TraceHook)
+    hook.span.side_effect = RuntimeError
+    tracer = StartTracer("uuid", [hook])
+
+    with tracer.span("xml"):
+        pass
+    tracer.finish()
+
+    hook.finished.assert_called_once_with(tracer.trace)
@@ -106,3 +106,20 @@ def test_tpm_model(arch_type, expected_model):
     tpm_elements = [d for d in gen._devices_xml_children() if d.tag == "tpm"]
     assert len(tpm_elements) == 1
     assert tpm_elements[0].attrib["model"] == expected_model
+
+
+def test_generate_xml_embeds_config_hash():
+    from xml.etree import ElementTree
+
+    from truenas_pylibvirt.domain.base.xml import CONFIG_METADATA_NAMESPACE, config_hash_from_metadata
+
+    gen = _generator()
+    with patch.object(VmDomainXmlGenerator, 'generate', side_effect=lambda: ElementTree.Element('domain', id='a')):
+        xml, config_hash = gen.generate_xml()
+        assert gen.generate_xml() == (xml, config_hash)
+
+    config = ElementTree.fromstring(xml).find(f'metadata/{{{CONFIG_METADATA_NAMESPACE}}}config')
+    assert config_hash_from_metadata(ElementTree.tostring(config).decode()) == config_hash
+
+    with patch.object(VmDomainXmlGenerator, 'generate', side_effect=lambda: ElementTree.Element('domain', id='b')):
+        assert gen.generate_xml()[1] != config_hash
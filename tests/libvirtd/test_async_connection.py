@@ -0,0 +1,57 @@
+"""Tests for the asyncio connection facade."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import Mock
+
+from truenas_pylibvirt.libvirtd.async_connection import AsyncConnection
+from truenas_pylibvirt.libvirtd.connection import DomainEvent, VirDomainEvent
+
+
+def test_calls_run_on_dedicated_executor(mock_connection):
+    async def main():
+        async_connection = AsyncConnection(mock_connection, max_workers=1)
+        try:
+            mock_connection.get_domain.return_value = "domain"
+            assert await async_connection.get_domain("uuid") == "domain"
+            mock_connection.get_domain.assert_called_once_with("uuid")
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+
+def test_wait_for_event_resolves_from_callback(mock_connection):
+    async def main():
+        async_connection = AsyncConnection(mock_connection)
+        callback = mock_connection.register_domain_event_callback.call_args[0][0]
+        try:
+            future = async_connection.wait_for_event("uuid", [VirDomainEvent.STOPPED])
+
+            callback(DomainEvent(event=VirDomainEvent.STARTED, uuid="uuid"))
+            callback(DomainEvent(event=VirDomainEvent.STOPPED, uuid="other-uuid"))
+            await asyncio.sleep(0)
+            assert not future.done()
+
+            callback(DomainEvent(event=VirDomainEvent.STOPPED, uuid="uuid"))
+            event = await asyncio.wait_for(future, 1)
+            assert event.event == VirDomainEvent.STOPPED
+            assert async_connection._event_waiters == {}
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_is_unregistered(mock_connection):
+    async def main():
+        async_connection = AsyncConnection(Mock())
+        try:
+            future = async_connection.wait_for_event("uuid", [VirDomainEvent.STOPPED])
+            future.cancel()
+            await asyncio.sleep(0)
+            assert async_connection._event_waiters == {}
+        finally:
+            async_connection.close()
+
+    asyncio.run(main())
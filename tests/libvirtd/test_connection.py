@@ -0,0 +1,329 @@
+"""Tests for libvirt connection handling."""
+from __future__ import annotations
+
+import threading
+from unittest.mock import Mock, patch
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.error import Error
+from truenas_pylibvirt.libvirtd.connection import Connection, DomainState, VirDomainEvent
+from truenas_pylibvirt.libvirtd.event_dispatcher import EventDispatcher
+
+
+def _libvirt_error(code):
+    e = libvirt.libvirtError("error")
+    e.err = (code, None, "message", None, None, None, None, -1, -1)
+    return e
+
+
+def _raw_connection():
+    raw_connection = Mock()
+    raw_connection.getAllDomainStats.return_value = []
+    return raw_connection
+
+
+@pytest.fixture
+def raw_connection():
+    return _raw_connection()
+
+
+@pytest.fixture
+def connection(raw_connection):
+    manager = Mock()
+    manager.open.return_value = raw_connection
+    return Connection(manager, "test:///default")
+
+
+def test_connection_is_opened_lazily(connection, raw_connection):
+    assert connection.is_alive is False
+    assert connection.connection is raw_connection
+    assert connection.is_alive is True
+    raw_connection.registerCloseCallback.assert_called_once()
+
+
+def test_connection_access_does_not_issue_rpcs(connection, raw_connection):
+    for _ in range(5):
+        connection.connection
+
+    connection.manager.open.assert_called_once()
+    raw_connection.isAlive.assert_not_called()
+    raw_connection.listAllDomains.assert_not_called()
+
+
+def test_close_callback_invalidates_connection(connection, raw_connection):
+    connection.connection
+    connection._libvirt_close_callback(raw_connection, 0, None)
+    assert connection.is_alive is False
+
+    new_raw_connection = _raw_connection()
+    connection.manager.open.return_value = new_raw_connection
+    assert connection.connection is new_raw_connection
+    raw_connection.close.assert_called_once()
+
+
+def test_close_callback_for_replaced_connection_is_ignored(connection, raw_connection):
+    connection.connection
+    connection._libvirt_close_callback(Mock(), 0, None)
+    assert connection.is_alive is True
+
+
+def test_ensure_alive_marks_connection_dead_when_probe_fails(connection, raw_connection):
+    connection.connection
+    raw_connection.getLibVersion.side_effect = _libvirt_error(libvirt.VIR_ERR_INTERNAL_ERROR)
+    assert connection.ensure_alive() is False
+    assert connection.is_alive is False
+
+
+def test_get_domain_retries_on_dead_connection(connection, raw_connection):
+    connection.connection
+    raw_connection.lookupByName.side_effect = _libvirt_error(libvirt.VIR_ERR_INTERNAL_ERROR)
+    raw_connection.isAlive.return_value = False
+
+    new_raw_connection = _raw_connection()
+    connection.manager.open.return_value = new_raw_connection
+
+    assert connection.get_domain("uuid") is new_raw_connection.lookupByName.return_value
+
+
+def test_get_domain_does_not_retry_when_connection_is_alive(connection, raw_connection):
+    connection.connection
+    raw_connection.lookupByName.side_effect = _libvirt_error(libvirt.VIR_ERR_INTERNAL_ERROR)
+    raw_connection.isAlive.return_value = True
+    raw_connection.getLibVersion.return_value = 9000000
+
+    with pytest.raises(libvirt.libvirtError):
+        connection.get_domain("uuid")
+
+    connection.manager.open.assert_called_once()
+
+
+def test_get_domain_returns_none_for_missing_domain(connection, raw_connection):
+    raw_connection.lookupByName.side_effect = _libvirt_error(libvirt.VIR_ERR_NO_DOMAIN)
+    assert connection.get_domain("uuid") is None
+    raw_connection.isAlive.assert_not_called()
+
+
+def test_get_domain_caches_handles(connection, raw_connection):
+    domain = connection.get_domain("uuid")
+    assert connection.get_domain("uuid") is domain
+    raw_connection.lookupByName.assert_called_once_with("uuid")
+
+
+def test_define_domain_populates_cache(connection, raw_connection):
+    raw_connection.defineXML.return_value.name.return_value = "uuid"
+    connection.define_domain("<domain/>")
+    assert connection.get_domain("uuid") is raw_connection.defineXML.return_value
+    raw_connection.lookupByName.assert_not_called()
+
+
+def test_undefined_event_evicts_cached_handle(connection, raw_connection):
+    domain = connection.get_domain("uuid")
+    domain.name.return_value = "uuid"
+    connection._libvirt_event_callback(raw_connection, domain, libvirt.VIR_DOMAIN_EVENT_UNDEFINED, 0, None)
+
+    connection.get_domain("uuid")
+    assert raw_connection.lookupByName.call_count == 2
+
+
+def test_stopped_event_evicts_transient_domain_handle(connection, raw_connection):
+    domain = raw_connection.createXML.return_value
+    domain.name.return_value = "uuid"
+    assert connection.create_domain("<domain/>", libvirt.VIR_DOMAIN_START_AUTODESTROY) is domain
+    raw_connection.createXML.assert_called_once_with("<domain/>", libvirt.VIR_DOMAIN_START_AUTODESTROY)
+    assert connection.get_domain("uuid") is domain
+
+    connection._libvirt_event_callback(raw_connection, domain, libvirt.VIR_DOMAIN_EVENT_STOPPED, 0, None)
+    connection.get_domain("uuid")
+    raw_connection.lookupByName.assert_called_once_with("uuid")
+
+
+def test_reconnect_drops_cached_handles(connection, raw_connection):
+    connection.get_domain("uuid")
+    connection._libvirt_close_callback(raw_connection, 0, None)
+
+    new_raw_connection = _raw_connection()
+    connection.manager.open.return_value = new_raw_connection
+    assert connection.get_domain("uuid") is new_raw_connection.lookupByName.return_value
+
+
+def test_event_callbacks_run_on_dispatcher(connection, raw_connection):
+    connection.manager.event_dispatcher = EventDispatcher(max_workers=1)
+    handled = []
+    connection.register_domain_event_callback(lambda event: handled.append((event, threading.current_thread())))
+
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    connection._libvirt_event_callback(raw_connection, domain, libvirt.VIR_DOMAIN_EVENT_STOPPED, 0, None)
+    assert connection.manager.event_dispatcher.wait_idle(5)
+    connection.manager.event_dispatcher.close()
+
+    [(event, thread)] = handled
+    assert event.uuid == "uuid"
+    assert event.event == VirDomainEvent.STOPPED
+    assert thread is not threading.current_thread()
+
+
+def test_immediate_event_callbacks_do_not_wait_for_dispatcher(connection, raw_connection):
+    connection.manager.event_dispatcher = EventDispatcher(max_workers=1)
+    blocker = threading.Event()
+    connection.register_domain_event_callback(lambda event: blocker.wait(5))
+    immediate = []
+    connection.register_domain_event_callback(immediate.append, immediate=True)
+
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    connection._libvirt_event_callback(raw_connection, domain, libvirt.VIR_DOMAIN_EVENT_STOPPED, 0, None)
+    try:
+        [event] = immediate
+        assert event.event == VirDomainEvent.STOPPED
+    finally:
+        blocker.set()
+        assert connection.manager.event_dispatcher.wait_idle(5)
+        connection.manager.event_dispatcher.close()
+
+
+def _stats_record(uuid, state):
+    domain = Mock()
+    domain.name.return_value = uuid
+    return domain, {"state.state": state}
+
+
+def test_missed_events_are_replayed_on_reconnect(connection, raw_connection):
+    connection.manager.event_dispatcher = EventDispatcher(max_workers=1)
+    events = []
+    connection.register_domain_event_callback(events.append)
+
+    raw_connection.getAllDomainStats.return_value = [
+        _stats_record("stopped", libvirt.VIR_DOMAIN_RUNNING),
+        _stats_record("removed", libvirt.VIR_DOMAIN_RUNNING),
+        _stats_record("unchanged", libvirt.VIR_DOMAIN_RUNNING),
+        _stats_record("started", libvirt.VIR_DOMAIN_SHUTOFF),
+    ]
+    connection.connection
+    connection._libvirt_close_callback(raw_connection, 0, None)
+
+    new_raw_connection = _raw_connection()
+    new_raw_connection.getAllDomainStats.return_value = [
+        _stats_record("stopped", libvirt.VIR_DOMAIN_SHUTOFF),
+        _stats_record("unchanged", libvirt.VIR_DOMAIN_RUNNING),
+        _stats_record("started", libvirt.VIR_DOMAIN_RUNNING),
+        _stats_record("new", libvirt.VIR_DOMAIN_SHUTOFF),
+    ]
+    connection.manager.open.return_value = new_raw_connection
+    connection.connection
+    assert connection.manager.event_dispatcher.wait_idle(5)
+    connection.manager.event_dispatcher.close()
+
+    assert all(event.replayed for event in events)
+    assert {(event.uuid, event.event) for event in events} == {
+        ("stopped", VirDomainEvent.STOPPED),
+        ("removed", VirDomainEvent.STOPPED),
+        ("removed", VirDomainEvent.UNDEFINED),
+        ("started", VirDomainEvent.STARTED),
+        ("new", VirDomainEvent.DEFINED),
+    }
+    removed_events = [event.event for event in events if event.uuid == "removed"]
+    assert removed_events == [VirDomainEvent.STOPPED, VirDomainEvent.UNDEFINED]
+
+
+def test_lifecycle_events_update_state_table(connection, raw_connection):
+    raw_connection.getAllDomainStats.return_value = [_stats_record("uuid", libvirt.VIR_DOMAIN_RUNNING)]
+    connection.connection
+
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    connection._libvirt_event_callback(raw_connection, domain, libvirt.VIR_DOMAIN_EVENT_STOPPED, 0, None)
+
+    assert connection.domain_state_entry("uuid").state == DomainState.SHUTOFF
+    assert connection.domain_state(domain, cached=True) == DomainState.SHUTOFF
+    domain.state.assert_not_called()
+
+
+def test_auto_reconnect_reopens_connection_in_background(raw_connection):
+    manager = Mock()
+    manager.open.side_effect = [raw_connection, Error("libvirtd is not running"), _raw_connection()]
+    connection = Connection(manager, "test:///default", auto_reconnect=True)
+    connection.connection
+
+    with patch("truenas_pylibvirt.libvirtd.connection.RECONNECT_INITIAL_DELAY", 0.01):
+        connection._libvirt_close_callback(raw_connection, 0, None)
+        connection._reconnect_thread.join(5)
+
+    assert manager.open.call_count == 3
+    assert connection.is_alive
+
+
+def test_fresh_domain_state_read_updates_state_table(connection, raw_connection):
+    connection.connection
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    domain.state.return_value = [libvirt.VIR_DOMAIN_PAUSED, 0]
+
+    assert connection.domain_state_entry("uuid") is None
+    assert connection.domain_state(domain, cached=True) == DomainState.PAUSED
+    assert connection.domain_state_entry("uuid").state == DomainState.PAUSED
+
+    domain.state.return_value = [libvirt.VIR_DOMAIN_RUNNING, 0]
+    assert connection.domain_state(domain, cached=True) == DomainState.PAUSED
+    assert connection.domain_state(domain) == DomainState.RUNNING
+    assert domain.state.call_count == 2
+
+
+@pytest.fixture
+def laned_connection(raw_connection):
+    read_only_connection = _raw_connection()
+    manager = Mock()
+    manager.open.side_effect = lambda uri, read_only=False: read_only_connection if read_only else raw_connection
+    return Connection(manager, "test:///default", monitoring_lanes=1), read_only_connection
+
+
+def test_monitoring_calls_use_read_only_lane(laned_connection, raw_connection):
+    connection, read_only_connection = laned_connection
+    connection.connection
+    raw_connection.reset_mock()
+
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    read_only_connection.getAllDomainStats.return_value = [(domain, {"state.state": libvirt.VIR_DOMAIN_RUNNING})]
+    read_only_connection.lookupByName.return_value.XMLDesc.return_value = "<domain/>"
+
+    assert connection.bulk_stats()["uuid"].state == DomainState.RUNNING
+    assert connection.domain_xml("uuid") == "<domain/>"
+
+    raw_connection.getAllDomainStats.assert_not_called()
+    raw_connection.lookupByName.assert_not_called()
+    # Handles of the read-only connection must not be used for lifecycle operations
+    assert "uuid" not in connection._domains
+
+
+def test_monitoring_lane_is_reopened_after_close(laned_connection):
+    connection, read_only_connection = laned_connection
+    connection.domain_xml("uuid")
+    lane = connection.monitoring_pool.lanes[0]
+    lane._libvirt_close_callback(read_only_connection, 0, None)
+
+    connection.domain_xml("uuid")
+    assert connection.manager.open.call_count == 2
+
+
+def test_missed_events_are_replayed_without_bulk_stats(connection, raw_connection):
+    connection.manager.event_dispatcher = EventDispatcher(max_workers=1)
+    events = []
+    connection.register_domain_event_callback(events.append)
+    raw_connection.getAllDomainStats.side_effect = _libvirt_error(libvirt.VIR_ERR_NO_SUPPORT)
+    domain = Mock()
+    domain.name.return_value = "stopped"
+    domain.state.return_value = [libvirt.VIR_DOMAIN_RUNNING, 1]
+    raw_connection.listAllDomains.return_value = [domain]
+    connection.connection
+    assert connection.domain_states()["stopped"].state == DomainState.RUNNING
+    connection._libvirt_close_callback(raw_connection, 0, None)
+
+    domain.state.return_value = [libvirt.VIR_DOMAIN_SHUTOFF, 1]
+    connection.connection
+    assert connection.manager.event_dispatcher.wait_idle(5)
+    connection.manager.event_dispatcher.close()
+
+    assert [(event.uuid, event.event) for event in events] == [("stopped", VirDomainEvent.STOPPED)]
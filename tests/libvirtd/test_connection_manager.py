@@ -0,0 +1,55 @@
+"""Tests for libvirt event loop handling in ConnectionManager."""
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from truenas_pylibvirt.libvirtd.connection_manager import ConnectionManager
+
+
+@pytest.fixture
+def libvirt_mock():
+    with patch("truenas_pylibvirt.libvirtd.connection_manager.libvirt") as libvirt_mock:
+        libvirt_mock.virEventRunDefaultImpl.side_effect = lambda: time.sleep(0.01)
+        yield libvirt_mock
+
+
+def test_thread_mode_starts_and_stops_event_thread(libvirt_mock):
+    manager = ConnectionManager(Mock())
+    libvirt_mock.virEventRegisterDefaultImpl.assert_called_once()
+
+    event_thread = manager._event_thread
+    assert event_thread.is_alive()
+
+    manager.close()
+    assert not event_thread.is_alive()
+    libvirt_mock.virEventAddTimeout.assert_called_once()
+
+
+def test_close_closes_connections(libvirt_mock):
+    manager = ConnectionManager(Mock())
+    connection = manager.create("test:///default")
+    connection._close = Mock()
+
+    manager.close()
+    connection._close.assert_called_once()
+
+
+def test_asyncio_mode_registers_libvirtaio(libvirt_mock):
+    libvirtaio = Mock()
+    loop = asyncio.new_event_loop()
+    try:
+        with patch.dict("sys.modules", {"libvirtaio": libvirtaio}):
+            manager = ConnectionManager(Mock(), loop=loop)
+
+        libvirtaio.virEventRegisterAsyncIOImpl.assert_called_once_with(loop=loop)
+        libvirt_mock.virEventRegisterDefaultImpl.assert_not_called()
+        assert manager._event_thread is None
+
+        manager.close()
+        libvirt_mock.virEventAddTimeout.assert_not_called()
+    finally:
+        loop.close()
@@ -0,0 +1,73 @@
+"""Tests for off-loop event dispatching."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from truenas_pylibvirt.libvirtd.event_dispatcher import EventDispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = EventDispatcher(max_workers=4)
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_events_for_same_key_run_in_order(dispatcher):
+    handled = []
+
+    def handler(i):
+        time.sleep(0.001 * (5 - i))
+        handled.append(i)
+
+    for i in range(5):
+        dispatcher.submit("uuid", lambda i=i: handler(i))
+
+    assert dispatcher.wait_idle(5)
+    assert handled == [0, 1, 2, 3, 4]
+
+
+def test_events_for_different_keys_run_concurrently(dispatcher):
+    barrier = threading.Barrier(2, timeout=5)
+
+    dispatcher.submit("uuid-a", barrier.wait)
+    dispatcher.submit("uuid-b", barrier.wait)
+
+    assert dispatcher.wait_idle(5)
+    assert dispatcher.metrics().failed == 0
+
+
+def test_metrics_track_queue_depth_and_failures(dispatcher):
+    release = threading.Event()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    dispatcher.submit("uuid", lambda: release.wait(5))
+    dispatcher.submit("uuid", fail)
+    dispatcher.submit("uuid", lambda: None)
+
+    metrics = dispatcher.metrics()
+    assert metrics.active_keys == 1
+    assert metrics.max_key_queue_depth == 3
+
+    release.set()
+    assert dispatcher.wait_idle(5)
+
+    metrics = dispatcher.metrics()
+    assert metrics.queued == 0
+    assert metrics.active_keys == 0
+    assert metrics.dispatched == 3
+    assert metrics.failed == 1
+
+
+def test_submit_after_close_is_dropped():
+    dispatcher = EventDispatcher(max_workers=1)
+    dispatcher.close()
+
+    dispatcher.submit("uuid", lambda: None)
+    assert dispatcher.wait_idle(0)
+    assert dispatcher.metrics().queued == 0
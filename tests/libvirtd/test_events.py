@@ -0,0 +1,112 @@
+"""Tests for typed libvirt domain event subscriptions."""
+from __future__ import annotations
+
+from unittest.mock import Mock
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.libvirtd.connection import Connection, VirDomainEvent
+from truenas_pylibvirt.libvirtd.event_dispatcher import EventDispatcher
+from truenas_pylibvirt.libvirtd.events import (
+    AgentLifecycleEvent, AgentLifecycleState, BalloonChangeEvent, DeviceRemovedEvent, lifecycle_event_detail,
+)
+
+
+@pytest.fixture
+def connection():
+    manager = Mock()
+    manager.event_dispatcher = EventDispatcher(max_workers=1)
+    manager.open.return_value.getAllDomainStats.return_value = []
+    yield Connection(manager, "test:///default")
+    manager.event_dispatcher.close()
+
+
+def _registered_callback(raw_connection, event_id):
+    for call in raw_connection.domainEventRegisterAny.call_args_list:
+        if call[0][1] == event_id:
+            return call[0][2]
+
+    raise AssertionError(f"Event {event_id} is not registered")
+
+
+def _domain(uuid="uuid"):
+    domain = Mock()
+    domain.name.return_value = uuid
+    return domain
+
+
+def test_lifecycle_event_detail():
+    assert lifecycle_event_detail("STOPPED", libvirt.VIR_DOMAIN_EVENT_STOPPED_DESTROYED) == "DESTROYED"
+    assert lifecycle_event_detail("STARTED", libvirt.VIR_DOMAIN_EVENT_STARTED_BOOTED) == "BOOTED"
+    assert lifecycle_event_detail("UNKNOWN", 0) == "UNKNOWN"
+
+
+def test_lifecycle_events_carry_detail(connection):
+    events = []
+    connection.register_domain_event_callback(events.append)
+    raw_connection = connection.connection
+
+    callback = _registered_callback(raw_connection, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE)
+    callback(
+        raw_connection, _domain(), libvirt.VIR_DOMAIN_EVENT_STOPPED, libvirt.VIR_DOMAIN_EVENT_STOPPED_SHUTDOWN, None,
+    )
+    assert connection.manager.event_dispatcher.wait_idle(5)
+
+    [event] = events
+    assert event.event == VirDomainEvent.STOPPED
+    assert event.detail == "SHUTDOWN"
+
+
+def test_typed_events_are_registered_on_open(connection):
+    events = []
+    connection.register_event_callback(BalloonChangeEvent, events.append)
+    raw_connection = connection.connection
+
+    callback = _registered_callback(raw_connection, libvirt.VIR_DOMAIN_EVENT_ID_BALLOON_CHANGE)
+    callback(raw_connection, _domain(), 1024, None)
+    assert connection.manager.event_dispatcher.wait_idle(5)
+
+    assert events == [BalloonChangeEvent(uuid="uuid", actual=1024)]
+
+
+def test_typed_event_subscription_on_open_connection(connection):
+    raw_connection = connection.connection
+    events = []
+    connection.register_event_callback(DeviceRemovedEvent, events.append)
+    connection.register_event_callback(DeviceRemovedEvent, events.append)
+
+    registered = [call[0][1] for call in raw_connection.domainEventRegisterAny.call_args_list]
+    assert registered.count(libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED) == 1
+
+    callback = _registered_callback(raw_connection, libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED)
+    callback(raw_connection, _domain(), "hostdev0", None)
+    assert connection.manager.event_dispatcher.wait_idle(5)
+
+    assert events == [DeviceRemovedEvent(uuid="uuid", alias="hostdev0")] * 2
+
+
+def test_agent_lifecycle_event_is_decoded(connection):
+    events = []
+    connection.register_event_callback(AgentLifecycleEvent, events.append)
+    raw_connection = connection.connection
+
+    callback = _registered_callback(raw_connection, libvirt.VIR_DOMAIN_EVENT_ID_AGENT_LIFECYCLE)
+    callback(
+        raw_connection, _domain(),
+        libvirt.VIR_CONNECT_DOMAIN_EVENT_AGENT_LIFECYCLE_STATE_CONNECTED,
+        libvirt.VIR_CONNECT_DOMAIN_EVENT_AGENT_LIFECYCLE_REASON_CHANNEL,
+        None,
+    )
+    assert connection.manager.event_dispatcher.wait_idle(5)
+
+    [event] = events
+    assert event.state == AgentLifecycleState.CONNECTED
+
+
+def test_close_deregisters_events(connection):
+    connection.register_event_callback(BalloonChangeEvent, lambda event: None)
+    raw_connection = connection.connection
+
+    connection._close()
+    assert raw_connection.domainEventDeregisterAny.call_count == 2
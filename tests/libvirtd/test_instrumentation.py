@@ -0,0 +1,87 @@
+"""Tests for libvirt RPC instrumentation."""
+from __future__ import annotations
+
+import logging
+from unittest.mock import Mock
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.libvirtd.connection import Connection
+from truenas_pylibvirt.libvirtd.instrumentation import InstrumentedProxy, LATENCY_BUCKETS, RpcMetrics, unwrap
+
+
+def _raw_connection():
+    domain = Mock()
+    domain.__class__ = libvirt.virDomain
+    domain.name.return_value = "uuid"
+    raw_connection = Mock()
+    raw_connection.__class__ = libvirt.virConnect
+    raw_connection.getAllDomainStats.return_value = []
+    raw_connection.lookupByName.return_value = domain
+    return raw_connection
+
+
+def _connection(rpc_metrics=None):
+    manager = Mock()
+    manager.open.return_value = _raw_connection()
+    return Connection(manager, "test:///default", rpc_metrics=rpc_metrics)
+
+
+def test_disabled_instrumentation_returns_raw_objects():
+    connection = _connection()
+    assert connection.connection is connection.manager.open.return_value
+    assert not isinstance(connection.get_domain("uuid"), InstrumentedProxy)
+
+
+def test_calls_are_recorded_per_uri_and_method():
+    metrics = RpcMetrics()
+    connection = _connection(metrics)
+
+    domain = connection.get_domain("uuid")
+    assert isinstance(domain, InstrumentedProxy)
+    domain.create()
+    domain.create()
+    unwrap(domain).state.side_effect = libvirt.libvirtError("error")
+    with pytest.raises(libvirt.libvirtError):
+        domain.state()
+
+    snapshot = metrics.snapshot()["test:///default"]
+    assert snapshot["virConnect.lookupByName"].calls == 1
+    assert snapshot["virDomain.create"].calls == 2
+    assert sum(snapshot["virDomain.create"].histogram) == 2
+    assert snapshot["virDomain.state"].errors == 1
+    # Answered locally, not worth timing
+    assert "virDomain.name" not in snapshot
+    # Cache holds raw handles, libvirt type-checks them when passed as arguments
+    assert not isinstance(connection._domains["uuid"], InstrumentedProxy)
+
+
+def test_histogram_buckets():
+    metrics = RpcMetrics(slow_call_threshold=None)
+    metrics.record("uri", "method", 0.0005, False)
+    metrics.record("uri", "method", 0.2, False)
+    metrics.record("uri", "method", 100, True)
+
+    method_metrics = metrics.snapshot()["uri"]["method"]
+    assert method_metrics.histogram[0] == 1
+    assert method_metrics.histogram[LATENCY_BUCKETS.index(0.5)] == 1
+    assert method_metrics.histogram[-1] == 1
+    assert method_metrics.max_time == 100
+
+
+def test_slow_calls_are_logged(caplog):
+    metrics = RpcMetrics(slow_call_threshold=1)
+    with caplog.at_level(logging.WARNING):
+        metrics.record("uri", "virDomain.create", 0.5, False)
+        metrics.record("uri", "virDomain.create", 2, False)
+
+    assert len(caplog.records) == 1
+    assert "virDomain.create" in caplog.records[0].getMessage()
+
+
+def test_unwrap():
+    domain = Mock()
+    domain.__class__ = libvirt.virDomain
+    assert unwrap(RpcMetrics().wrap("uri", domain)) is domain
+    assert unwrap(domain) is domain
@@ -0,0 +1,84 @@
+"""Tests for the device ownership index."""
+from __future__ import annotations
+
+from unittest.mock import Mock
+from xml.etree import ElementTree
+
+import libvirt
+
+from truenas_pylibvirt.libvirtd.connection import Connection, DomainEvent, VirDomainEvent
+from truenas_pylibvirt.libvirtd.ownership import OwnershipIndex, domain_xml_ownership_keys, pci_key
+
+PCI_XML = '''
+    <domain>
+      <devices>
+        <hostdev type="pci">
+          <source><address domain="0x0000" bus="0x01" slot="0x00" function="0x0"/></source>
+        </hostdev>
+        <disk type="block"><source dev="/dev/zvol/tank/disk"/></disk>
+        <graphics type="spice" port="5900"/>
+      </devices>
+    </domain>
+'''
+PCI_KEY = pci_key("0x0000", "0x01", "0x00", "0x0")
+
+
+def _connection(domains):
+    connection = Mock()
+    connection.monitoring_call.side_effect = lambda operation, func: func(connection.connection)
+    connection.connection.listAllDomains.return_value = domains
+    return connection
+
+
+def _domain(uuid, xml):
+    domain = Mock()
+    domain.UUIDString.return_value = uuid
+    domain.name.return_value = uuid
+    domain.XMLDesc.return_value = xml
+    return domain
+
+
+def test_index_is_built_once():
+    domain = _domain("other", PCI_XML)
+    connection = _connection([domain])
+    index = OwnershipIndex(connection)
+
+    assert index.owner([PCI_KEY]) == "other"
+    assert index.owner([PCI_KEY], exclude_uuid="other") is None
+
+    connection.connection.listAllDomains.assert_called_once_with(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE)
+    domain.XMLDesc.assert_called_once()
+
+
+def test_shared_resources_are_not_indexed():
+    # Disks (e.g. ISOs) may be shared between domains and display ports are not exclusive devices
+    assert domain_xml_ownership_keys(ElementTree.fromstring(PCI_XML)) == {PCI_KEY}
+
+
+def test_index_follows_claims_and_releases():
+    connection = _connection([])
+    index = OwnershipIndex(connection)
+    assert index.owner([PCI_KEY]) is None
+
+    index.claim("vm", [PCI_KEY])
+    assert index.owner([PCI_KEY]) == "vm"
+
+    index.release("vm")
+    assert index.owner([PCI_KEY]) is None
+
+
+def test_started_event_refreshes_index():
+    raw_connection = Mock()
+    raw_connection.getAllDomainStats.return_value = []
+    raw_connection.listAllDomains.return_value = []
+    raw_connection.lookupByName.return_value.XMLDesc.return_value = PCI_XML
+    manager = Mock()
+    manager.open.return_value = raw_connection
+    connection = Connection(manager, "test:///default")
+    assert connection.ownership.owner([PCI_KEY]) is None
+
+    connection._update_ownership(DomainEvent(event=VirDomainEvent.STARTED, uuid="vm"))
+    assert connection.ownership.owner([PCI_KEY]) == "vm"
+
+    connection._update_ownership(DomainEvent(event=VirDomainEvent.STOPPED, uuid="vm"))
+    assert connection.ownership.owner([PCI_KEY]) is None
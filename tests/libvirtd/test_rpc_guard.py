@@ -0,0 +1,126 @@
+"""Tests for RPC deadlines and the circuit breaker."""
+from __future__ import annotations
+
+import threading
+import time
+from unittest.mock import Mock
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.error import CircuitOpenError, RpcTimeoutError
+from truenas_pylibvirt.libvirtd.connection import Connection
+from truenas_pylibvirt.libvirtd.rpc_guard import CircuitState, RpcGuard, RpcGuardConfig
+
+
+@pytest.fixture
+def hang():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def guard():
+    guard = RpcGuard(RpcGuardConfig(
+        timeouts={"slow": 0.05, "unguarded": None}, default_timeout=1, failure_threshold=2, reset_timeout=0.1,
+    ))
+    yield guard
+    guard.close()
+
+
+def test_call_returns_result(guard):
+    assert guard.call("fast", lambda a, b: a + b, 1, 2) == 3
+    assert guard.breaker.state == CircuitState.CLOSED
+
+
+def test_call_times_out(guard, hang):
+    with pytest.raises(RpcTimeoutError):
+        guard.call("slow", hang.wait)
+
+
+def test_libvirt_errors_do_not_trip_the_breaker(guard):
+    def fail():
+        raise libvirt.libvirtError("error")
+
+    for _ in range(5):
+        with pytest.raises(libvirt.libvirtError):
+            guard.call("fast", fail)
+
+    assert guard.breaker.state == CircuitState.CLOSED
+
+
+def test_breaker_opens_after_repeated_timeouts_and_fails_fast(guard, hang):
+    for _ in range(2):
+        with pytest.raises(RpcTimeoutError):
+            guard.call("slow", hang.wait)
+
+    assert guard.breaker.state == CircuitState.OPEN
+
+    func = Mock()
+    with pytest.raises(CircuitOpenError):
+        guard.call("fast", func)
+    with pytest.raises(CircuitOpenError):
+        guard.call("unguarded", func)
+    func.assert_not_called()
+
+
+def test_breaker_probes_after_reset_timeout(guard, hang):
+    for _ in range(2):
+        with pytest.raises(RpcTimeoutError):
+            guard.call("slow", hang.wait)
+
+    time.sleep(0.15)
+    # Failed probe reopens the circuit with a longer delay
+    with pytest.raises(RpcTimeoutError):
+        guard.call("slow", hang.wait)
+    assert guard.breaker.state == CircuitState.OPEN
+
+    time.sleep(0.15)
+    with pytest.raises(CircuitOpenError):
+        guard.call("fast", Mock())
+
+    time.sleep(0.1)
+    assert guard.call("fast", lambda: 1) == 1
+    assert guard.breaker.state == CircuitState.CLOSED
+
+
+def test_connection_calls_go_through_guard(hang):
+    raw_connection = Mock()
+    raw_connection.getAllDomainStats.return_value = []
+    raw_connection.defineXML.side_effect = lambda xml: hang.wait()
+    manager = Mock()
+    manager.open.return_value = raw_connection
+    connection = Connection(manager, "test:///default", rpc_guard_config=RpcGuardConfig(timeouts={"defineXML": 0.05}))
+
+    try:
+        with pytest.raises(RpcTimeoutError):
+            connection.define_domain("<domain/>")
+    finally:
+        connection.rpc_guard.close()
+
+
+def test_hung_reconnect_is_guarded(hang):
+    raw_connection = Mock()
+    raw_connection.getAllDomainStats.return_value = []
+    manager = Mock()
+    manager.open.side_effect = lambda uri: hang.wait() and raw_connection
+    connection = Connection(manager, "test:///default", rpc_guard_config=RpcGuardConfig(
+        timeouts={"open": 0.05}, failure_threshold=1, reset_timeout=60,
+    ))
+
+    try:
+        with pytest.raises(RpcTimeoutError):
+            connection.connection
+        # Callers do not queue up behind the hung opening, nor start another one
+        with pytest.raises(CircuitOpenError):
+            connection.get_domain("uuid")
+        assert manager.open.call_count == 1
+
+        hang.set()
+        deadline = time.monotonic() + 5
+        while not connection.is_alive and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert connection.is_alive
+    finally:
+        connection.rpc_guard.close()
@@ -0,0 +1,161 @@
+"""Tests for bulk domain statistics."""
+from __future__ import annotations
+
+from unittest.mock import Mock
+
+import libvirt
+import pytest
+
+from truenas_pylibvirt.device import CDROMDevice, DiskStorageDevice, NICDevice, NICDeviceType, StorageDeviceType
+from truenas_pylibvirt.libvirtd.connection import Connection, DomainState
+from truenas_pylibvirt.libvirtd.stats import DomainStats, DomainStatsGroup
+
+
+RECORD = {
+    "state.state": libvirt.VIR_DOMAIN_RUNNING,
+    "state.reason": 1,
+    "balloon.current": 2048,
+    "balloon.maximum": 4096,
+    "vcpu.current": 2,
+    "vcpu.maximum": 2,
+    "vcpu.0.time": 100,
+    "vcpu.1.time": 200,
+    "block.count": 2,
+    "block.0.name": "sda",
+    "block.0.path": "/dev/zvol/tank/disk",
+    "block.0.rd.bytes": 512,
+    "block.1.name": "sdb",
+    "block.1.path": "/mnt/tank/install.iso",
+    "net.count": 1,
+    "net.0.name": "vnet0",
+    "net.0.rx.bytes": 1024,
+}
+
+
+@pytest.fixture
+def connection():
+    manager = Mock()
+    manager.open.return_value.getAllDomainStats.return_value = []
+    return Connection(manager, "test:///default")
+
+
+def test_domain_stats_from_libvirt(connection):
+    stats = DomainStats.from_libvirt("uuid", RECORD, connection.domain_state_from_code)
+
+    assert stats.state == DomainState.RUNNING
+    assert stats.memory_usage == 2048 * 1024
+    assert stats.vcpu.times == {0: 100, 1: 200}
+    assert [block.name for block in stats.block] == ["sda", "sdb"]
+    assert stats.block[0].rd_bytes == 512
+    assert stats.interfaces[0].name == "vnet0"
+    assert stats.interfaces[0].rx_bytes == 1024
+
+
+def test_domain_stats_with_missing_groups(connection):
+    stats = DomainStats.from_libvirt("uuid", {}, connection.domain_state_from_code)
+
+    assert stats.state is None
+    assert stats.memory_usage is None
+    assert stats.block == []
+    assert stats.interfaces == []
+
+
+DOMAIN_XML = '''
+    <domain>
+      <devices>
+        <interface type="bridge">
+          <source bridge="br1"/>
+          <mac address="52:54:00:aa:bb:cc"/>
+          <target dev="vnet0"/>
+        </interface>
+        <interface type="bridge">
+          <source bridge="br0"/>
+          <mac address="52:54:00:00:00:01"/>
+          <target dev="vnet1"/>
+        </interface>
+      </devices>
+    </domain>
+'''
+
+
+def _nic(mock_device_delegate, source, mac=None):
+    return NICDevice(
+        type_=NICDeviceType.BRIDGE, source=source, model=None, mac=mac, trust_guest_rx_filters=False,
+        device_delegate=mock_device_delegate,
+    )
+
+
+def test_device_stats_maps_entries_to_devices(connection, mock_device_delegate):
+    disk = DiskStorageDevice(
+        type_=StorageDeviceType.AHCI, logical_sectorsize=None, physical_sectorsize=None, iotype=None,
+        path="/dev/zvol/tank/disk", serial=None, device_delegate=mock_device_delegate,
+    )
+    cdrom = CDROMDevice(path="/mnt/tank/install.iso", device_delegate=mock_device_delegate)
+    # Matched by source since it has no configured MAC address
+    nic = _nic(mock_device_delegate, "br0")
+    # Listed ahead of the first interface, e.g. after a hotplug
+    hotplugged_nic = _nic(mock_device_delegate, "br1", "52:54:00:AA:BB:CC")
+    stats = DomainStats.from_libvirt("uuid", {
+        **RECORD, "net.count": 2, "net.0.name": "vnet0", "net.1.name": "vnet1",
+    }, connection.domain_state_from_code)
+
+    device_stats = stats.device_stats([nic, hotplugged_nic, disk, cdrom], DOMAIN_XML)
+
+    assert [(device, entry.name) for device, entry in device_stats] == [
+        (disk, "sda"), (cdrom, "sdb"), (hotplugged_nic, "vnet0"), (nic, "vnet1"),
+    ]
+
+
+def test_device_stats_skips_ambiguous_interfaces(connection, mock_device_delegate):
+    nics = [_nic(mock_device_delegate, "br0"), _nic(mock_device_delegate, "br0")]
+    stats = DomainStats.from_libvirt("uuid", {
+        "net.count": 2, "net.0.name": "vnet1", "net.1.name": "vnet2",
+    }, connection.domain_state_from_code)
+
+    assert stats.device_stats(nics, DOMAIN_XML) == []
+    assert stats.device_stats(nics, None) == []
+
+
+def test_bulk_stats_uses_single_rpc(connection):
+    raw_connection = connection.connection
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    raw_connection.getAllDomainStats.reset_mock()
+    raw_connection.getAllDomainStats.return_value = [(domain, RECORD)]
+
+    result = connection.bulk_stats({DomainStatsGroup.STATE})
+
+    assert list(result) == ["uuid"]
+    assert result["uuid"].state == DomainState.RUNNING
+    raw_connection.getAllDomainStats.assert_called_once_with(libvirt.VIR_DOMAIN_STATS_STATE, 0)
+
+
+def test_bulk_stats_for_selected_uuids(connection):
+    raw_connection = connection.connection
+    raw_connection.getAllDomainStats.reset_mock()
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    raw_connection.lookupByName.return_value = domain
+    raw_connection.domainListGetStats.return_value = [(domain, RECORD)]
+
+    result = connection.bulk_stats(uuids=["uuid"])
+
+    assert list(result) == ["uuid"]
+    assert raw_connection.domainListGetStats.call_args[0][0] == [domain]
+    raw_connection.getAllDomainStats.assert_not_called()
+
+
+def test_bulk_stats_without_driver_support(connection):
+    raw_connection = connection.connection
+    error = libvirt.libvirtError("this function is not supported by the connection driver")
+    error.err = (libvirt.VIR_ERR_NO_SUPPORT, None, "message", None, None, None, None, -1, -1)
+    raw_connection.getAllDomainStats.side_effect = error
+    raw_connection.getLibVersion.return_value = 10000000
+    domain = Mock()
+    domain.name.return_value = "uuid"
+    domain.state.return_value = [libvirt.VIR_DOMAIN_RUNNING, 1]
+    raw_connection.listAllDomains.return_value = [domain]
+
+    result = connection.bulk_stats()
+
+    assert result == {"uuid": DomainStats("uuid", state=DomainState.RUNNING)}
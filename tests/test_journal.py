@@ -0,0 +1,148 @@
+"""Tests for the started-domain journal."""
+from __future__ import annotations
+
+import os
+from unittest.mock import Mock
+
+from truenas_pylibvirt import journal, runtime
+from truenas_pylibvirt.domain.manager import RehydratedDomain
+from truenas_pylibvirt.domain.managers import DomainManagers
+from truenas_pylibvirt.journal import JournalEntry, JournalEntryKind
+from truenas_pylibvirt.libvirtd.ownership import pci_key
+
+
+def test_load_all_without_journal_is_untrusted():
+    assert journal.load_all() is None
+
+
+def test_record_and_discard():
+    journal.record("uuid-a", JournalEntryKind.MOUNT, "/run/a")
+    journal.record("uuid-a", JournalEntryKind.MOUNT, "/run/a")
+    journal.record("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_0000_01_00_0")
+
+    assert journal.load_all() == {"uuid-a": JournalEntry(mounts=["/run/a"], pci_devices=["pci_0000_01_00_0"])}
+
+    journal.discard("uuid-a", JournalEntryKind.MOUNT, "/run/a")
+    journal.discard("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_0000_01_00_0")
+    journal.discard("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_0000_01_00_0")
+
+    # Emptied entries are dropped, the journal itself stays trusted
+    assert journal.load_all() == {}
+
+
+def test_unreadable_entry_makes_journal_untrusted(journal_root):
+    journal.record("uuid-a", JournalEntryKind.MOUNT, "/run/a")
+    (journal_root / "uuid-b.json").write_text("{")
+
+    assert journal.load_all() is None
+
+
+def test_terminate_process_checks_start_time(monkeypatch):
+    kill = Mock()
+    monkeypatch.setattr(os, "kill", kill)
+
+    own_start_time = journal.process_start_time(os.getpid())
+    assert own_start_time is not None
+
+    journal.terminate_process(os.getpid(), own_start_time + 1)
+    kill.assert_not_called()
+
+    journal.terminate_process(os.getpid(), own_start_time)
+    kill.assert_called_once()
+
+
+def _connection():
+    connection = Mock()
+    connection.call.side_effect = lambda operation, func, *args: func(*args)
+    return connection
+
+
+def test_rehydrated_domain_undoes_journaled_staging(monkeypatch):
+    umount_and_rmdir = Mock()
+    monkeypatch.setattr(runtime, "umount_and_rmdir", umount_and_rmdir)
+    journal.record("uuid-a", JournalEntryKind.MOUNT, "/run/a")
+    journal.record("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_a")
+    journal.record("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_shared")
+    # Left behind by a domain that is still running
+    journal.record("uuid-b", JournalEntryKind.PCI_DEVICE, "pci_shared")
+    connection = _connection()
+
+    RehydratedDomain("uuid-a", connection, journal.load("uuid-a")).cleanup()
+
+    umount_and_rmdir.assert_called_once_with("/run/a")
+    connection.connection.nodeDeviceLookupByName.assert_called_once_with("pci_a")
+    assert set(journal.load_all()) == {"uuid-b"}
+
+
+def _domain_managers(active, inactive=()):
+    managers = DomainManagers.__new__(DomainManagers)
+    managers.containers = Mock()
+    managers.containers.connection.list_domains.return_value = []
+    managers.vms = Mock()
+    managers.vms.connection = _connection()
+    domains = []
+    for uuid, is_active in [(uuid, True) for uuid in active] + [(uuid, False) for uuid in inactive]:
+        domain = Mock()
+        domain.name.return_value = uuid
+        domain.isActive.return_value = is_active
+        domains.append(domain)
+    managers.vms.connection.list_domains.return_value = domains
+    return managers
+
+
+def test_reconcile_rehydrates_from_journal(monkeypatch):
+    reconcile = Mock()
+    monkeypatch.setattr(runtime, "reconcile", reconcile)
+    monkeypatch.setattr(runtime, "cleanup_for_uuid", Mock())
+    monkeypatch.setattr(runtime, "umount_and_rmdir", Mock())
+    journal.record("running", JournalEntryKind.PCI_DEVICE, "pci_a")
+    journal.record("stopped", JournalEntryKind.PCI_DEVICE, "pci_b")
+    managers = _domain_managers(["running"], ["stopped"])
+
+    managers.reconcile_runtime_state()
+
+    reconcile.assert_not_called()
+    assert managers.vms.rehydrate.call_args.args[0] == "running"
+    runtime.cleanup_for_uuid.assert_called_once_with("stopped")
+    managers.vms.connection.connection.nodeDeviceLookupByName.assert_called_once_with("pci_b")
+    assert set(journal.load_all()) == {"running"}
+
+
+def test_reconcile_without_journal_sweeps(monkeypatch):
+    reconcile = Mock()
+    monkeypatch.setattr(runtime, "reconcile", reconcile)
+
+    _domain_managers(["running"], ["stopped"]).reconcile_runtime_state()
+
+    reconcile.assert_called_once_with({"running"})
+
+
+def test_failed_record_falls_back_to_sweep(monkeypatch):
+    reconcile = Mock()
+    monkeypatch.setattr(runtime, "reconcile", reconcile)
+    journal.record("running", JournalEntryKind.MOUNT, "/run/a")
+    monkeypatch.setattr(journal, "_write", Mock(side_effect=OSError("No space left on device")))
+    journal.record("running", JournalEntryKind.MOUNT, "/run/b")
+    journal.record("stopped", JournalEntryKind.MOUNT, "/run/c")
+
+    _domain_managers(["running"], ["stopped"]).reconcile_runtime_state()
+
+    reconcile.assert_called_once_with({"running"})
+    # Until the running domain stops
+    assert journal.load_all() is None
+    journal.remove("running")
+    assert journal.load_all() == {}
+
+
+def test_rehydrated_domain_with_untrusted_journal_checks_ownership(journal_root):
+    journal.record("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_0000_01_00_0")
+    journal.record("uuid-a", JournalEntryKind.PCI_DEVICE, "pci_0000_02_00_0")
+    (journal_root / "uuid-b.json").write_text("{")
+    connection = _connection()
+    connection.ownership.owner.side_effect = lambda keys, exclude_uuid: (
+        "other" if keys == [pci_key("0x0000", "0x02", "0x00", "0x0")] else None
+    )
+
+    RehydratedDomain("uuid-a", connection, journal.load("uuid-a")).cleanup()
+
+    connection.connection.nodeDeviceLookupByName.assert_called_once_with("pci_0000_01_00_0")
@@ -1,5 +1,6 @@
 from .device.storage import DiskStorageDevice, StorageDeviceType, StorageDeviceIoType  # noqa
 from .device.nic import NICDevice, NICDeviceModel, NICDeviceType, PciAddress  # noqa
+from .domain.async_manager import AsyncDomainManager  # noqa
 from .domain.base.configuration import Time  # noqa
 from .domain.base.domain import BaseDomain  # noqa
 from .domain.container.configuration import (  # noqa
@@ -8,16 +9,24 @@ from .domain.container.configuration import (  # noqa
 )
 from .domain.container.domain import ContainerDomain  # noqa
 from .domain.managers import DEFAULT_CONTAINERS_URI, DEFAULT_VMS_URI, DomainManagers  # noqa
+from .domain.tracing import StartTrace, TraceCollector, TraceHook  # noqa
 from .domain.vm.configuration import (  # noqa
     VmBootloader, VmCpuMode, VmDomainConfiguration,
 )
 from .domain.vm.domain import VmDomain  # noqa
-from .error import Error, DomainDoesNotExistError, GuestAgentError, is_no_domain_error  # noqa
+from .error import (  # noqa
+    Error, CircuitOpenError, DomainDoesNotExistError, GuestAgentError, RpcTimeoutError, is_no_domain_error,
+)
+from .libvirtd.async_connection import AsyncConnection  # noqa
 from .libvirtd.connection import Connection  # noqa
 from .libvirtd.connection_manager import ConnectionManager  # noqa
+from .libvirtd.rpc_guard import RpcGuardConfig  # noqa
 from .libvirtd.service_delegate import ServiceDelegate  # noqa
+from .libvirtd.stats import DomainStats, DomainStatsGroup  # noqa
 
 __all__ = [
+    'AsyncConnection',
+    'AsyncDomainManager',
     'ContainerCapabilitiesPolicy',
     'ContainerDomain',
     'ContainerDomainConfiguration',
@@ -26,11 +35,14 @@ __all__ = [
     'Connection',
     'ConnectionManager',
     'BaseDomain',
+    'CircuitOpenError',
     'DEFAULT_CONTAINERS_URI',
     'DEFAULT_VMS_URI',
     'DiskStorageDevice',
     'DomainDoesNotExistError',
     'DomainManagers',
+    'DomainStats',
+    'DomainStatsGroup',
     'Error',
     'GuestAgentError',
     'is_no_domain_error',
@@ -38,10 +50,15 @@ __all__ = [
     'NICDeviceModel',
     'NICDeviceType',
     'PciAddress',
+    'RpcGuardConfig',
+    'RpcTimeoutError',
     'ServiceDelegate',
+    'StartTrace',
     'StorageDeviceIoType',
     'StorageDeviceType',
     'Time',
+    'TraceCollector',
+    'TraceHook',
     'VmBootloader',
     'VmCpuMode',
     'VmDomain',
@@ -9,6 +9,7 @@ from xml.etree import ElementTree
 
 import libvirt
 
+from ..error import Error
 from .counters import Counters
 from .delegate import DeviceDelegate
 
@@ -16,6 +17,7 @@ from .delegate import DeviceDelegate
 if TYPE_CHECKING:
     from ..domain.start_validator import StartValidationContext
     from ..libvirtd.connection import Connection
+    from ..libvirtd.ownership import OwnershipKey
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +34,9 @@ class Device(ABC):
 
     # Override in subclasses that require exclusive access (can only be used by one VM at a time)
     EXCLUSIVE_DEVICE = False
+    # Override in subclasses whose `run()` does not depend on other devices of the domain, so that it can be entered
+    # and exited concurrently with them (see `DeviceManager.parallel`)
+    CONCURRENT_RUN = False
 
     def __post_init__(self) -> None:
         if self.device_delegate is None:
@@ -45,14 +50,16 @@ class Device(ABC):
     def run(self, connection: Connection, domain_uuid: str) -> Generator[None, None, None]:
         yield
 
-    def is_available(self) -> bool:
-        return self.device_delegate.is_available(self) and self.is_available_impl()
+    def is_available(self, context: StartValidationContext | None = None) -> bool:
+        """`context` is passed during start validation, its snapshot spares devices from rescanning the host."""
+        return self.device_delegate.is_available(self) and self.is_available_impl(context)
 
     @abstractmethod
-    def is_available_impl(self) -> bool:
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
         ...
 
-    def identity(self) -> str:
+    def identity(self, context: StartValidationContext | None = None) -> str:
+        """`context` is passed during start validation, see `is_available`."""
         return self.identity_impl()
 
     @abstractmethod
@@ -99,33 +106,17 @@ class Device(ABC):
         Returns: (is_in_use, vm_name_using_it)
         """
         try:
-            # List all domains
-            for domain in connection.connection.listAllDomains():
-                # Skip ourselves
-                if domain.UUIDString() == exclude_domain_uuid:
-                    continue
-
-                # Only check active VMs
-                if not domain.isActive():
-                    continue
-
-                # Get domain XML and let subclass check for conflicts
-                xml_str = domain.XMLDesc()
-                root = ElementTree.fromstring(xml_str)
-
-                if self._is_device_in_domain_xml(root):
-                    return True, domain.name()
-
-            return False, None
-
-        except libvirt.libvirtError as e:
+            owner = connection.ownership.owner(self.ownership_keys(), exclude_domain_uuid)
+        except (Error, libvirt.libvirtError) as e:
             # Log error but don't fail - device might still work
             logger.warning(f"Failed to check device conflicts: {e}")
             return False, None
 
-    def _is_device_in_domain_xml(self, domain_xml_root: ElementTree.Element) -> bool:
+        return owner is not None, owner
+
+    def ownership_keys(self) -> list[OwnershipKey]:
         """
-        Override to check if this device is present in the domain XML.
-        Child classes should implement this method and return True if the device is found.
+        Override to return the host resources this device claims, as found in domain XML (see `OwnershipIndex`).
+        Exclusive devices conflict with active domains claiming any of them.
         """
-        return False
+        return []
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 from xml.etree import ElementTree
 
 from .base import Device, DeviceXmlContext
 from .utils import disk_from_number
 from ..xml import xml_element
 
+if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
+
 
 @dataclass(kw_only=True)
 class CDROMDevice(Device):
@@ -24,7 +28,10 @@ class CDROMDevice(Device):
                 attributes={"type": "file", "device": "cdrom"},
                 children=[
                     xml_element("driver", attributes={"type": "raw"}),
-                    xml_element("source", attributes={"file": self.path}),
+                ] + (
+                    # Without a path the drive is empty (media ejected by `DomainManager.change_media`)
+                    [xml_element("source", attributes={"file": self.path})] if self.path else []
+                ) + [
                     xml_element("target", attributes={"dev": f"sd{disk_from_number(disk_number)}", "bus": "sata"}),
                     xml_element("boot", attributes={"order": str(boot_number)}),
                 ]
@@ -34,8 +41,8 @@ class CDROMDevice(Device):
     def identity_impl(self) -> str:
         return self.path
 
-    def is_available_impl(self) -> bool:
-        return os.path.exists(self.identity())
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
+        return not self.path or os.path.exists(self.identity())
 
     def validate_impl(self) -> list[tuple[str, str]]:
         verrors = []
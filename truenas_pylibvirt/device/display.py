@@ -7,11 +7,13 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Generator
 from xml.etree import ElementTree
 
+from ..journal import JournalEntryKind, discard, process_start_time, record
 from ..xml import xml_element
 from .base import Device, DeviceXmlContext
 
 
 if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
     from ..libvirtd.connection import Connection
 
 
@@ -23,6 +25,8 @@ class DisplayDeviceType(enum.Enum):
 @dataclass(kw_only=True)
 class DisplayDevice(Device):
 
+    CONCURRENT_RUN = True
+
     type_: DisplayDeviceType
     resolution: str
     port: int | None
@@ -84,6 +88,7 @@ class DisplayDevice(Device):
     @contextmanager
     def run(self, connection: Connection, domain_uuid: str) -> Generator[None, None, None]:
         process = None
+        journaled = None
         if self.type_ == DisplayDeviceType.SPICE:
             web_bind = f":{self.web_port}" if self.bind == "0.0.0.0" else f"{self.bind}:{self.web_port}"
             server_addr = f"{self.bind}:{self.port}"
@@ -92,6 +97,9 @@ class DisplayDevice(Device):
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
             )
+            if (start_time := process_start_time(process.pid)) is not None:
+                journaled = [process.pid, start_time]
+                record(domain_uuid, JournalEntryKind.PROCESS, journaled)
 
         try:
             yield
@@ -104,10 +112,13 @@ class DisplayDevice(Device):
                     process.kill()
                     process.wait()
 
+                if journaled is not None:
+                    discard(domain_uuid, JournalEntryKind.PROCESS, journaled)
+
     def identity_impl(self) -> str:
         return f"{self.bind}:{self.port}"
 
-    def is_available_impl(self) -> bool:
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
         return True
 
     def validate_impl(self) -> list[tuple[str, str]]:
@@ -11,16 +11,20 @@ import truenas_os
 
 from .base import Device, DeviceXmlContext
 from ..error import Error
+from ..journal import JournalEntryKind, discard, record
 from ..runtime import DEVICES_RUNTIME_ROOT, umount_and_rmdir
 from ..xml import xml_element
 
 if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
     from ..libvirtd.connection import Connection
 
 
 @dataclass(kw_only=True)
 class FilesystemDevice(Device):
 
+    CONCURRENT_RUN = True
+
     target: str
     source: str
 
@@ -79,6 +83,7 @@ class FilesystemDevice(Device):
             DEVICES_RUNTIME_ROOT, domain_uuid, self._staging_slug(),
         )
 
+        record(domain_uuid, JournalEntryKind.MOUNT, staged_path)
         os.makedirs(staged_path, mode=0o755, exist_ok=True)
 
         fd: int | None = None
@@ -109,28 +114,29 @@ class FilesystemDevice(Device):
             if fd is not None:
                 os.close(fd)
             if not attached:
-                self._cleanup_self_stage(staged_path)
+                self._cleanup_self_stage(domain_uuid, staged_path)
 
         self.source = staged_path
         try:
             yield
         finally:
             self.source = original_source
-            self._cleanup_self_stage(staged_path)
+            self._cleanup_self_stage(domain_uuid, staged_path)
 
     def _staging_slug(self) -> str:
         return urllib.parse.quote(self.target, safe='')
 
     @staticmethod
-    def _cleanup_self_stage(staged_path: str) -> None:
+    def _cleanup_self_stage(domain_uuid: str, staged_path: str) -> None:
         # Best-effort: only undo this device's own mount + dir. The per-uuid
         # parent dir is left for runtime.cleanup_for_uuid to reap centrally.
         umount_and_rmdir(staged_path)
+        discard(domain_uuid, JournalEntryKind.MOUNT, staged_path)
 
     def identity_impl(self) -> str:
         return f'{self.source}:{self.target}'
 
-    def is_available_impl(self) -> bool:
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
         return os.path.exists(self.source)
 
     def validate_impl(self) -> list[tuple[str, str]]:
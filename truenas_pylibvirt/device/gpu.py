@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 from xml.etree import ElementTree
 
 from .base import Device, DeviceXmlContext
 from .gpu_utils import GPUBase
 
+if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
+
 
 @dataclass(kw_only=True)
 class GPUDevice(Device):
@@ -20,8 +24,8 @@ class GPUDevice(Device):
             'gpu_type': self.gpu_type,
         })
 
-    def is_available_impl(self) -> bool:
-        return self.gpu.is_available()
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
+        return self.gpu.is_available(context.snapshot if context else None)
 
     def identity_impl(self) -> str:
         return f'{self.gpu_type} {self.pci_address!r}'
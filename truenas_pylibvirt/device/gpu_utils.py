@@ -5,13 +5,16 @@ import functools
 import os
 import pathlib
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, TYPE_CHECKING
 from xml.etree import ElementTree
 
 from ..utils.gpu import get_gpus, parse_nvidia_info_file
 from ..utils.pci import get_single_pci_device_details, normalize_pci_address
 from ..xml import xml_element
 
+if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationSnapshot
+
 
 class GPUBase(ABC):
 
@@ -30,12 +33,14 @@ class GPUBase(ABC):
     def from_data(cls, data: dict[str, Any]) -> GPUBase:
         return cls._registry[data['gpu_type'].lower()](**data)
 
-    def is_available(self) -> bool:
-        pci_device = self.pci_device_details()
+    def is_available(self, snapshot: StartValidationSnapshot | None = None) -> bool:
+        pci_device = self.pci_device_details(snapshot)
         return all(d != 'vfio-pci' for d in pci_device['drivers']) if pci_device else False
 
-    def pci_device_details(self) -> dict[str, Any] | None:
+    def pci_device_details(self, snapshot: StartValidationSnapshot | None = None) -> dict[str, Any] | None:
         pci_addr = normalize_pci_address(self.pci_address)
+        if snapshot is not None:
+            return snapshot.pci_device(pci_addr)
         return get_single_pci_device_details(pci_addr).get(pci_addr)
 
     def validate(self) -> list[tuple[str, str]]:
@@ -91,8 +96,8 @@ class DRMBase(GPUBase):
         except FileNotFoundError:
             return None
 
-    def is_available(self) -> bool:
-        return super().is_available() and self.render_device_path is not None
+    def is_available(self, snapshot: StartValidationSnapshot | None = None) -> bool:
+        return super().is_available(snapshot) and self.render_device_path is not None
 
     def validate(self) -> list[tuple[str, str]]:
         # We would like to ensure that we have compute/render node available
@@ -124,8 +129,8 @@ class AMD(DRMBase, gpu_type='AMD'):
 
     DRIVER_PATH = '/dev/kfd'
 
-    def is_available(self) -> bool:
-        return super().is_available() and os.path.exists(self.DRIVER_PATH)
+    def is_available(self, snapshot: StartValidationSnapshot | None = None) -> bool:
+        return super().is_available(snapshot) and os.path.exists(self.DRIVER_PATH)
 
     def validate(self) -> list[tuple[str, str]]:
         # We should ensure that we have /dev/kfd available
@@ -176,8 +181,8 @@ class NVIDIA(GPUBase, gpu_type='NVIDIA'):
 
         return None
 
-    def is_available(self) -> bool:
-        return super().is_available() and self.drivers_available and self.device_path is not None
+    def is_available(self, snapshot: StartValidationSnapshot | None = None) -> bool:
+        return super().is_available(snapshot) and self.drivers_available and self.device_path is not None
 
     def validate(self) -> list[tuple[str, str]]:
         # We will like to validate following things here:
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import ExitStack, contextmanager
 import logging
 from typing import TYPE_CHECKING, Generator, Self
 
+from ..domain.tracing import trace_span
+
 
 if TYPE_CHECKING:
     from .base import Device
+    from ..domain.tracing import StartTracer
     from ..libvirtd.connection import Connection
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DEVICE_START_CONCURRENCY = 4
+
 
 class StartedDevice:
     def __init__(self, device: Device, connection: Connection, domain_uuid: str) -> None:
@@ -25,36 +31,143 @@ class StartedDevice:
 
 
 class DeviceManager:
-    def __init__(self, devices: list[Device], domain_uuid: str) -> None:
+    """
+    Runs the `run()` contexts of the devices of a domain.
+
+    With `parallel`, the contexts of devices that declare `CONCURRENT_RUN` are entered (and exited) concurrently,
+    at most `max_workers` at a time, while the other devices are started one after another in their declared order.
+    """
+
+    def __init__(
+        self, devices: list[Device], domain_uuid: str, parallel: bool = False,
+        max_workers: int = DEFAULT_DEVICE_START_CONCURRENCY,
+    ) -> None:
         self.devices: list[Device] = devices
         self.domain_uuid = domain_uuid
+        self.parallel = parallel
+        self.max_workers = max_workers
+        # Devices whose `run()` context is entered, while the domain is started
+        self.started_devices: list[StartedDevice] = []
 
     @contextmanager
-    def start(self, connection: Connection) -> Generator[Self, None, None]:
-        started_devices = []
+    def start(self, connection: Connection, tracer: StartTracer | None = None) -> Generator[Self, None, None]:
+        started_devices: list[StartedDevice] = []
+        self.started_devices = started_devices
 
         try:
-            for device in self.devices:
-                try:
-                    started = StartedDevice(device, connection, self.domain_uuid)
-                    started_devices.append(started)
-                except Exception as e:
-                    logger.error(f'Failed to start device {device.identity()}: {e}', exc_info=True)
-                    for started_device in reversed(started_devices):
-                        try:
-                            started_device.cleanup()
-                        except Exception as cleanup_error:
-                            logger.error(
-                                f'Failed to cleanup device during startup rollback: {cleanup_error}', exc_info=True
-                            )
-                    raise
+            if self.parallel:
+                self._start_parallel(connection, tracer, started_devices)
+            else:
+                for device in self.devices:
+                    try:
+                        started_devices.append(self._start_device(device, connection, tracer))
+                    except Exception:
+                        self._rollback(started_devices)
+                        raise
 
             yield self
 
         finally:
-            for started_device in reversed(started_devices):
+            self._cleanup(started_devices)
+            started_devices.clear()
+
+    def start_device(self, device: Device, connection: Connection) -> None:
+        """Enter the `run()` context of a device hotplugged into the started domain and add it to its devices."""
+        self.started_devices.append(self._start_device(device, connection, None))
+        self.devices.append(device)
+
+    def stop_device(self, device: Device) -> None:
+        """Exit the `run()` context of a device unplugged from the started domain and remove it from its devices."""
+        # By identity, identically configured devices are still distinct devices
+        for i, started_device in enumerate(self.started_devices):
+            if started_device.device is device:
+                del self.started_devices[i]
+                self._cleanup_device(started_device, ' after detach')
+                break
+
+        for i, other_device in enumerate(self.devices):
+            if other_device is device:
+                del self.devices[i]
+                break
+
+    def replace_device(self, device: Device, replacement: Device) -> None:
+        """Swap `device` for `replacement` after it was changed in place in the started domain."""
+        for i, other_device in enumerate(self.devices):
+            if other_device is device:
+                self.devices[i] = replacement
+                break
+
+        for started_device in self.started_devices:
+            if started_device.device is device:
+                started_device.device = replacement
+
+    def _start_parallel(
+        self, connection: Connection, tracer: StartTracer | None, started_devices: list[StartedDevice],
+    ) -> None:
+        error: BaseException | None = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='device_start') as executor:
+            futures = [
+                executor.submit(self._start_device, device, connection, tracer)
+                for device in self.devices if device.CONCURRENT_RUN
+            ]
+
+            for device in self.devices:
+                if device.CONCURRENT_RUN:
+                    continue
+
                 try:
-                    started_device.cleanup()
+                    started_devices.append(self._start_device(device, connection, tracer))
                 except Exception as e:
-                    device_id = started_device.device.identity()
-                    logger.error(f'Failed to cleanup device {device_id}: {e}', exc_info=True)
+                    error = e
+                    break
+
+            if error is not None:
+                for future in futures:
+                    future.cancel()
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+
+                if (exception := future.exception()) is not None:
+                    error = error or exception
+                else:
+                    started_devices.append(future.result())
+
+        if error is not None:
+            self._rollback(started_devices)
+            raise error
+
+    def _start_device(self, device: Device, connection: Connection, tracer: StartTracer | None) -> StartedDevice:
+        try:
+            # The identity of some devices costs a host lookup, it is only resolved when tracing
+            with trace_span(tracer, 'device.run', device.identity() if tracer is not None else None):
+                return StartedDevice(device, connection, self.domain_uuid)
+        except Exception as e:
+            logger.error(f'Failed to start device {device.identity()}: {e}', exc_info=True)
+            raise
+
+    def _rollback(self, started_devices: list[StartedDevice]) -> None:
+        self._cleanup(started_devices, ' during startup rollback')
+        started_devices.clear()
+
+    def _cleanup(self, started_devices: list[StartedDevice], reason: str = '') -> None:
+        # Reverse start order. In parallel mode devices that run concurrently are also torn down concurrently, before
+        # the others (which were started alongside them).
+        concurrent = [started for started in started_devices if self.parallel and started.device.CONCURRENT_RUN]
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='device_cleanup') as executor:
+                for started_device in reversed(concurrent):
+                    executor.submit(self._cleanup_device, started_device, reason)
+
+        for started_device in reversed(started_devices):
+            if started_device not in concurrent:
+                self._cleanup_device(started_device, reason)
+
+    @staticmethod
+    def _cleanup_device(started_device: StartedDevice, reason: str) -> None:
+        try:
+            started_device.cleanup()
+        except Exception as e:
+            device_id = started_device.device.identity()
+            logger.error(f'Failed to cleanup device {device_id}{reason}: {e}', exc_info=True)
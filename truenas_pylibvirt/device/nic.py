@@ -18,6 +18,7 @@ from .base import Device, DeviceXmlContext
 
 
 if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
     from ..libvirtd.connection import Connection
 
 
@@ -46,6 +47,8 @@ class PciAddress:
 @dataclass(kw_only=True)
 class NICDevice(Device):
 
+    CONCURRENT_RUN = True
+
     type_: NICDeviceType
     source: str
     model: NICDeviceModel | None
@@ -107,7 +110,11 @@ class NICDevice(Device):
                 pass
         yield
 
-    def is_available_impl(self) -> bool:
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
+        if context is not None:
+            nic_attach = self.source or context.snapshot.default_route_interface
+            return nic_attach is not None and context.snapshot.link_exists(nic_attach)
+
         with netlink_route() as sock:
             try:
                 get_link(sock, self.identity())
@@ -115,6 +122,12 @@ class NICDevice(Device):
             except DeviceNotFound:
                 return False
 
+    def identity(self, context: StartValidationContext | None = None) -> str:
+        if context is not None and not self.source:
+            return context.snapshot.default_route_interface or ''
+
+        return super().identity(context)
+
     def identity_impl(self) -> str:
         nic_attach = self.source
         if not nic_attach:
@@ -9,11 +9,14 @@ from xml.etree import ElementTree
 import libvirt
 
 from ..error import Error
+from ..journal import JournalEntryKind, discard, record
+from ..libvirtd.ownership import OwnershipKey, pci_key
 from ..xml import xml_element
 from .base import Device, DeviceXmlContext
 from ..utils.pci import get_single_pci_device_details, iommu_enabled
 
 if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext, StartValidationSnapshot
     from ..libvirtd.connection import Connection
 
 
@@ -24,6 +27,7 @@ logger = logging.getLogger(__name__)
 class PCIDevice(Device):
 
     EXCLUSIVE_DEVICE = True  # PCI devices can only be used by one VM at a time
+    CONCURRENT_RUN = True
 
     domain: str
     bus: str
@@ -59,30 +63,23 @@ class PCIDevice(Device):
             )
         ]
 
-    def is_available_impl(self) -> bool:
-        pci_device = self.get_pci_device_details()
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
+        pci_device = self.get_pci_device_details(context.snapshot if context else None)
         if not pci_device:
             return False
         return not pci_device['critical'] and not pci_device['error']
 
-    def get_pci_device_details(self) -> dict[str, Any] | None:
+    def get_pci_device_details(self, snapshot: StartValidationSnapshot | None = None) -> dict[str, Any] | None:
+        if snapshot is not None:
+            return snapshot.pci_device(self.pci_device)
         pci_device = get_single_pci_device_details(self.pci_device)
         return pci_device[self.pci_device] if pci_device else None
 
     def identity_impl(self) -> str:
         return self.pci_device
 
-    def _is_device_in_domain_xml(self, domain_xml_root: ElementTree.Element) -> bool:
-        """Check if this PCI device is present in the domain XML"""
-        for hostdev in domain_xml_root.findall(".//devices/hostdev[@type='pci']"):
-            address = hostdev.find('.//source/address')
-            if address is not None:
-                if (address.get('domain') == f'0x{self.domain}' and
-                        address.get('bus') == f'0x{self.bus}' and
-                        address.get('slot') == f'0x{self.slot}' and
-                        address.get('function') == f'0x{self.function}'):
-                    return True
-        return False
+    def ownership_keys(self) -> list[OwnershipKey]:
+        return [pci_key(f'0x{self.domain}', f'0x{self.bus}', f'0x{self.slot}', f'0x{self.function}')]
 
     @contextmanager
     def run(self, connection: Connection, domain_uuid: str) -> Generator[None, None, None]:
@@ -92,14 +89,18 @@ class PCIDevice(Device):
         2. Reattach to host driver on exit (if not in use by other VMs)
         """
         # Detach from host driver
+        record(domain_uuid, JournalEntryKind.PCI_DEVICE, self.pci_device)
         try:
-            node_device = connection.connection.nodeDeviceLookupByName(self.pci_device)
-            node_device.dettach()
+            node_device = connection.call(
+                "nodeDeviceLookupByName", connection.connection.nodeDeviceLookupByName, self.pci_device,
+            )
+            connection.call("dettach", node_device.dettach)
             logger.info(f'Detached PCI device {self.pci_device} from host')
         except libvirt.libvirtError as e:
             if 'already in use' in str(e).lower():
                 logger.debug(f'PCI device {self.pci_device} already detached')
             else:
+                discard(domain_uuid, JournalEntryKind.PCI_DEVICE, self.pci_device)
                 raise Error(f'Failed to detach PCI device {self.pci_device}: {e}')
 
         try:
@@ -109,15 +110,19 @@ class PCIDevice(Device):
             in_use, vm_name = self._is_in_use_by_other_vms(connection, domain_uuid)
             if not in_use:
                 try:
-                    node_device = connection.connection.nodeDeviceLookupByName(self.pci_device)
-                    node_device.reAttach()
+                    node_device = connection.call(
+                        "nodeDeviceLookupByName", connection.connection.nodeDeviceLookupByName, self.pci_device,
+                    )
+                    connection.call("reAttach", node_device.reAttach)
                     logger.info(f'Reattached PCI device {self.pci_device} to host')
-                except libvirt.libvirtError as e:
+                except (Error, libvirt.libvirtError) as e:
                     # Non-fatal - log but don't raise
                     logger.warning(f'Failed to reattach PCI device {self.pci_device}: {e}')
             else:
                 logger.info(f'Not reattaching PCI device {self.pci_device} - still in use by VM {vm_name}')
 
+            discard(domain_uuid, JournalEntryKind.PCI_DEVICE, self.pci_device)
+
     def validate_impl(self) -> list[tuple[str, str]]:
         verrors = []
         pci_device_details = self.get_pci_device_details()
@@ -3,12 +3,16 @@ from __future__ import annotations
 from dataclasses import dataclass
 import enum
 import os
+from typing import TYPE_CHECKING
 from xml.etree import ElementTree
 
 from ..xml import xml_element
 from .base import Device, DeviceXmlContext
 from .utils import disk_from_number
 
+if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext
+
 
 class StorageDeviceType(enum.Enum):
     AHCI = "AHCI"
@@ -94,7 +98,7 @@ class BaseStorageDevice(Device):
     def identity_impl(self) -> str:
         return self.path
 
-    def is_available_impl(self) -> bool:
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
         return os.path.exists(self.identity())
 
 
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, TYPE_CHECKING
 from xml.etree import ElementTree
 
+from ..libvirtd.ownership import OwnershipKey, OwnershipKind
 from ..xml import xml_element
 from .base import Device, DeviceXmlContext
 from ..utils.usb import find_usb_device_by_libvirt_name, find_usb_device_by_ids
 
+if TYPE_CHECKING:
+    from ..domain.start_validator import StartValidationContext, StartValidationSnapshot
+
 
 @dataclass(kw_only=True)
 class USBDevice(Device):
@@ -90,17 +94,19 @@ class USBDevice(Device):
     def identity_impl(self) -> str:
         return self.device or f"{self.product_id}--{self.vendor_id}"
 
-    def get_usb_details(self) -> dict[str, Any] | None:
+    def get_usb_details(self, snapshot: StartValidationSnapshot | None = None) -> dict[str, Any] | None:
+        # With a snapshot, both lookups search its single udev enumeration
+        kwargs = {'usb_devices': snapshot.usb_devices} if snapshot is not None else {}
         if self.device:
-            return find_usb_device_by_libvirt_name(self.device)
+            return find_usb_device_by_libvirt_name(self.device, **kwargs)
         elif self.vendor_id and self.product_id:
-            device_name = find_usb_device_by_ids(self.vendor_id, self.product_id)
+            device_name = find_usb_device_by_ids(self.vendor_id, self.product_id, **kwargs)
             if device_name:
-                return find_usb_device_by_libvirt_name(device_name)
+                return find_usb_device_by_libvirt_name(device_name, **kwargs)
         return None
 
-    def is_available_impl(self) -> bool:
-        details = self.get_usb_details()
+    def is_available_impl(self, context: StartValidationContext | None = None) -> bool:
+        details = self.get_usb_details(context.snapshot if context else None)
         if details is None:
             return False
 
@@ -139,21 +145,10 @@ class USBDevice(Device):
 
         return verrors
 
-    def _is_device_in_domain_xml(self, domain_xml_root: ElementTree.Element) -> bool:
-        """Check if this USB device is present in the domain XML"""
-        for hostdev in domain_xml_root.findall(".//devices/hostdev[@type='usb']"):
-            # Check by vendor/product ID
-            if self.vendor_id and self.product_id:
-                vendor = hostdev.find(".//source/vendor")
-                product = hostdev.find(".//source/product")
-                if (vendor is not None and vendor.get("id") == self.vendor_id and
-                        product is not None and product.get("id") == self.product_id):
-                    return True
-
-            # Check by device
-            if self.device:
-                address = hostdev.find(".//source/address")
-                if address is not None and address.get("device") == self.device:
-                    return True
-
-        return False
+    def ownership_keys(self) -> list[OwnershipKey]:
+        keys = []
+        if self.vendor_id and self.product_id:
+            keys.append((OwnershipKind.USB, f"{self.vendor_id}:{self.product_id}"))
+        if self.device:
+            keys.append((OwnershipKind.USB_DEVICE, self.device))
+        return keys
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from ..libvirtd.async_connection import AsyncConnection
+from ..libvirtd.connection import INACTIVE_STATES, DomainState
+from .base.domain import BaseDomain
+from .manager import DEFAULT_SHUTDOWN_RESEND_INTERVAL, DELETE_CLEANUP_TIMEOUT, SHUTDOWN_WAIT_STATES, DomainManager
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDomainManager:
+    """
+    asyncio facade for `DomainManager`.
+
+    Operations run on the executor of `connection`. `shutdown` does not occupy a thread while waiting: it awaits the
+    completion signal of `DomainManager.wait_for_stop` and only wakes up periodically to re-send the ACPI shutdown
+    request.
+    """
+
+    def __init__(self, manager: DomainManager, connection: AsyncConnection) -> None:
+        self.manager = manager
+        self.connection = connection
+
+    async def start(self, domain: BaseDomain) -> None:
+        await self.connection.run(self.manager.start, domain)
+
+    async def shutdown(
+        self, domain: BaseDomain, shutdown_timeout: float | None = None,
+        resend_interval: float = DEFAULT_SHUTDOWN_RESEND_INTERVAL,
+    ) -> bool:
+        """See `DomainManager.shutdown`."""
+        libvirt_domain = await self.connection.run(self.manager.active_libvirt_domain, domain)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (shutdown_timeout or domain.configuration.shutdown_timeout)
+        stop = self.manager.wait_for_stop(domain.configuration.uuid)
+        stopped = asyncio.wrap_future(stop)
+        try:
+            # The event might have been emitted before the waiter was registered
+            if (state := await self.connection.domain_state(libvirt_domain, cached=True)) in INACTIVE_STATES:
+                return True
+            if state not in SHUTDOWN_WAIT_STATES:
+                return False
+
+            while (remaining := deadline - loop.time()) > 0:
+                if state == DomainState.RUNNING:
+                    try:
+                        # Retry shutting down as sometimes LXC driver ignores this request
+                        await self.connection.run(self.manager.connection.call, "shutdown", libvirt_domain.shutdown)
+                    except Exception:
+                        pass
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(stopped), min(resend_interval, remaining))
+                    return True
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            stop.cancel()
+
+        return False
+
+    async def destroy(self, domain: BaseDomain) -> None:
+        await self.connection.run(self.manager.destroy, domain)
+
+    async def suspend(self, domain: BaseDomain) -> None:
+        await self.connection.run(self.manager.suspend, domain)
+
+    async def resume(self, domain: BaseDomain) -> None:
+        await self.connection.run(self.manager.resume, domain)
+
+    async def delete(self, domain: BaseDomain) -> None:
+        """See `DomainManager.delete`, the post-stop cleanup is awaited without occupying a thread."""
+        cleaned_up = self.manager.wait_for_cleanup(domain.configuration.uuid)
+        try:
+            if (pending := await self.connection.run(self.manager.prepare_delete, domain)) is None:
+                return
+
+            if pending.destroyed:
+                try:
+                    await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(cleaned_up)), DELETE_CLEANUP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(
+                        "Post-stop cleanup of domain %r did not complete in %d seconds, deleting it anyway",
+                        domain.configuration.name, DELETE_CLEANUP_TIMEOUT,
+                    )
+        finally:
+            cleaned_up.cancel()
+
+        await self.connection.run(self.manager.finish_delete, domain, pending)
@@ -24,6 +24,13 @@ class BaseDomainConfiguration:
     time: Time
     shutdown_timeout: int
     devices: list[Device]
+    # Start the domain with a single `createXML` instead of defining it first. libvirt keeps no persistent
+    # configuration for such domains, they disappear once stopped.
+    transient: bool = False
+    # Only for `transient` domains: libvirt destroys the domain when the connection that started it is closed
+    autodestroy: bool = False
+    # Start (and stop) devices that support it concurrently, see `DeviceManager`
+    parallel_device_start: bool = False
 
     @property
     def cpuset_list(self) -> list[int]:
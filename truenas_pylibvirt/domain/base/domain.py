@@ -16,7 +16,9 @@ class BaseDomain:
 
     def __init__(self, configuration: BaseDomainConfiguration):
         self.configuration = configuration
-        self.device_manager = DeviceManager(configuration.devices, domain_uuid=configuration.uuid)
+        self.device_manager = DeviceManager(
+            configuration.devices, domain_uuid=configuration.uuid, parallel=configuration.parallel_device_start,
+        )
 
     def xml_generator(self, context: ContainerDomainContext) -> BaseDomainXmlGenerator:
         return self.xml_generator_class(self, context)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from typing import TYPE_CHECKING
 from xml.etree import ElementTree
 
@@ -13,6 +14,20 @@ if TYPE_CHECKING:
     from .domain import BaseDomain
     from ..container.domain import ContainerDomainContext
 
+# Namespace of our `<metadata>` element, which records the hash of the configuration the domain was defined from
+CONFIG_METADATA_NAMESPACE = "http://truenas.com/pylibvirt/config/1.0"
+CONFIG_METADATA_PREFIX = "truenas"
+
+ElementTree.register_namespace(CONFIG_METADATA_PREFIX, CONFIG_METADATA_NAMESPACE)
+
+
+def config_hash_from_metadata(metadata_xml: str) -> str | None:
+    """Extract the hash from our metadata element, as returned by `virDomain.metadata()`."""
+    try:
+        return ElementTree.fromstring(metadata_xml).get("hash")
+    except ElementTree.ParseError:
+        return None
+
 
 class BaseDomainXmlGenerator:
     def __init__(self, domain: BaseDomain, context: ContainerDomainContext) -> None:
@@ -29,6 +44,18 @@ class BaseDomainXmlGenerator:
             children=self._children(),
         )
 
+    def generate_xml(self) -> tuple[str, str]:
+        """
+        Generate the domain XML along with the hash of its canonical form (C14N). The hash is embedded in the
+        domain `<metadata>` so that a later start can tell whether the defined domain is still up to date.
+        """
+        root = self.generate()
+        config_hash = hashlib.sha256(ElementTree.canonicalize(ElementTree.tostring(root).decode()).encode()).hexdigest()
+        root.append(xml_element("metadata", children=[
+            xml_element(f"{{{CONFIG_METADATA_NAMESPACE}}}config", attributes={"hash": config_hash}),
+        ]))
+        return ElementTree.tostring(root).decode(), config_hash
+
     def _element(
             self,
             tag: str,
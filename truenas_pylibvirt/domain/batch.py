@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import heapq
+from typing import Callable, Iterable
+
+from ..error import Error
+from .base.domain import BaseDomain
+
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+def run_batch(
+    domains: list[BaseDomain],
+    operation: Callable[[BaseDomain], None],
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    priorities: dict[str, int] | None = None,
+    dependencies: dict[str, Iterable[str]] | None = None,
+    reverse_dependencies: bool = False,
+) -> dict[str, BaseException | None]:
+    """
+    Run `operation` for each of `domains` with at most `max_concurrency` operations in flight.
+
+    `dependencies` maps a domain UUID to the UUIDs of the domains whose operation must complete successfully before
+    its own operation is run (with `reverse_dependencies`, the other way around, which is what stopping domains
+    needs). Dependencies on domains that are not part of the batch are ignored. Among domains that are ready to run,
+    the ones with a higher `priorities` value go first, ties are broken by the order of `domains`.
+
+    Returns a map of UUID to `None` on success or to the exception the operation raised. Domains whose dependency
+    failed (or that are part of a dependency cycle) are not attempted and map to an `Error`.
+    """
+    priorities = priorities or {}
+    by_uuid = {domain.configuration.uuid: domain for domain in domains}
+    order = {uuid: i for i, uuid in enumerate(by_uuid)}
+
+    # UUID -> UUIDs that must complete first, and the inverse
+    prerequisites: dict[str, set[str]] = {uuid: set() for uuid in by_uuid}
+    for uuid, required in (dependencies or {}).items():
+        for required_uuid in required:
+            if uuid not in by_uuid or required_uuid not in by_uuid or required_uuid == uuid:
+                continue
+
+            if reverse_dependencies:
+                prerequisites[required_uuid].add(uuid)
+            else:
+                prerequisites[uuid].add(required_uuid)
+
+    dependents: dict[str, set[str]] = {uuid: set() for uuid in by_uuid}
+    for uuid, required in prerequisites.items():
+        for required_uuid in required:
+            dependents[required_uuid].add(uuid)
+
+    results: dict[str, BaseException | None] = {}
+    ready: list[tuple[int, int, str]] = []
+
+    def push(uuid: str) -> None:
+        heapq.heappush(ready, (-priorities.get(uuid, 0), order[uuid], uuid))
+
+    def fail_dependents(uuid: str) -> None:
+        for dependent in dependents[uuid]:
+            if dependent not in results:
+                results[dependent] = Error(
+                    f"Domain {by_uuid[dependent].configuration.name!r} was not processed because "
+                    f"{by_uuid[uuid].configuration.name!r} failed"
+                )
+                fail_dependents(dependent)
+
+    for uuid, required in prerequisites.items():
+        if not required:
+            push(uuid)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="domain_batch") as executor:
+        running: dict[Future[None], str] = {}
+        while ready or running:
+            while ready and len(running) < max_concurrency:
+                uuid = heapq.heappop(ready)[2]
+                if uuid not in results:
+                    running[executor.submit(operation, by_uuid[uuid])] = uuid
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                uuid = running.pop(future)
+                results[uuid] = future.exception()
+                if results[uuid] is not None:
+                    fail_dependents(uuid)
+                    continue
+
+                for dependent in dependents[uuid]:
+                    prerequisites[dependent].discard(uuid)
+                    if not prerequisites[dependent] and dependent not in results:
+                        push(dependent)
+
+    for uuid in by_uuid:
+        if uuid not in results:
+            results[uuid] = Error(
+                f"Domain {by_uuid[uuid].configuration.name!r} was not processed because of a dependency cycle"
+            )
+
+    return {uuid: results[uuid] for uuid in by_uuid}
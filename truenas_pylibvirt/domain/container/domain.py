@@ -9,7 +9,7 @@ from typing import Any, Generator
 import truenas_os
 from truenas_os_pyutils.namespace import idmap_userns
 
-from ... import runtime
+from ... import journal, runtime
 from ...error import Error
 from ..base.domain import BaseDomain
 from .configuration import ContainerDomainConfiguration
@@ -30,6 +30,7 @@ class ContainerDomain(BaseDomain):
             (pathlib.Path(self.configuration.root) / ".oldroot").mkdir(mode=0o0755, exist_ok=True)
 
             idmapped_root = os.path.join(runtime.ROOTFS_RUNTIME_ROOT, self.configuration.uuid)
+            journal.record(self.configuration.uuid, journal.JournalEntryKind.MOUNT, idmapped_root)
             os.makedirs(idmapped_root, exist_ok=True)
 
             uid_map = [
@@ -82,6 +83,7 @@ class ContainerDomain(BaseDomain):
                     # Symmetric with FilesystemDevice's failure path: leave no
                     # half-created dir for the startup reconcile to mop up.
                     runtime.cleanup_for_uuid(self.configuration.uuid)
+                    journal.discard(self.configuration.uuid, journal.JournalEntryKind.MOUNT, idmapped_root)
 
         try:
             yield ContainerDomainContext(root=root)
@@ -93,6 +95,7 @@ class ContainerDomain(BaseDomain):
                 # raise -- otherwise it would mask a more interesting
                 # upstream error and prevent siblings' cleanup.
                 runtime.umount_and_rmdir(idmapped_root)
+                journal.discard(self.configuration.uuid, journal.JournalEntryKind.MOUNT, idmapped_root)
 
     def pid(self) -> int | None:
         pid_path = f"/var/run/libvirt/lxc/{self.configuration.uuid}.pid"
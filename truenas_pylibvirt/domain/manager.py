@@ -1,113 +1,355 @@
 from __future__ import annotations
 
-from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from contextlib import ExitStack, closing, contextmanager
+import dataclasses
+import functools
 import logging
 import threading
 import time
-from typing import Any
+from typing import Any, Generator, TypeVar
 from xml.etree import ElementTree
 
-from .. import runtime
+import libvirt
+
+from .. import journal, runtime
+from ..device.base import Device, DeviceXmlContext
+from ..device.cdrom import CDROMDevice
+from ..device.counters import Counters
+from ..device.manager import DeviceManager
 from ..error import Error, DomainDoesNotExistError
-from ..libvirtd.connection import Connection, DomainEvent, DomainState, VirDomainEvent
+from ..libvirtd.connection import INACTIVE_STATES, Connection, DomainEvent, DomainState, VirDomainEvent
+from ..libvirtd.events import DeviceRemovedEvent
+from ..libvirtd.ownership import pci_key
 from .base.domain import BaseDomain
-from .start_validator import StartValidator, StartValidationContext
+from .base.xml import CONFIG_METADATA_NAMESPACE, config_hash_from_metadata
+from .start_validator import StartValidator, StartValidationContext, StartValidationSnapshot
+from .tracing import StartTracer, TraceHook, trace_span
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 STOPPED_STATES = [DomainState.SHUTDOWN, DomainState.SHUTOFF, DomainState.CRASHED]
+# States `shutdown()` waits for the STOPPED event in, SHUTDOWN is reported while QEMU is still tearing down
+SHUTDOWN_WAIT_STATES = (DomainState.RUNNING, DomainState.SHUTDOWN)
 STOPPED_EVENTS = [VirDomainEvent.STOPPED, VirDomainEvent.UNDEFINED]
+DEFAULT_SHUTDOWN_RESEND_INTERVAL = 1.0
+# Fallback only, `delete` normally proceeds as soon as the post-stop cleanup of the domain has completed
+DELETE_CLEANUP_TIMEOUT = 30
+# The guest has to release a device before it is unplugged, which takes a while for busy disks
+DEFAULT_DEVICE_DETACH_TIMEOUT = 30
+
+
+def device_alias(domain_root: ElementTree.Element, element: ElementTree.Element) -> str | None:
+    """
+    Alias libvirt assigned to the device of the live domain XML `domain_root` that `element` (as generated by
+    `Device.xml()`) describes, matched on its `<source>`, `<target>` and `<mac>`. `None` unless exactly one device
+    matches.
+    """
+    identifying = [child for child in element if child.tag in ("source", "target", "mac")]
+    if not identifying:
+        return None
+
+    matches = [
+        candidate for candidate in domain_root.findall(f"./devices/{element.tag}")
+        if all(_attributes_match(child, candidate.find(child.tag)) for child in identifying)
+    ]
+    if len(matches) != 1 or (alias := matches[0].find("alias")) is None:
+        return None
+
+    return alias.get("name")
+
+
+def _attributes_match(expected: ElementTree.Element, actual: ElementTree.Element | None) -> bool:
+    # libvirt adds attributes and children to the live XML, so `expected` only needs to be a subset of `actual`
+    if actual is None or any(actual.get(name) != value for name, value in expected.attrib.items()):
+        return False
+
+    return all(any(_attributes_match(child, other) for other in actual.findall(child.tag)) for child in expected)
 
 
 class StartedDomain:
-    def __init__(self, domain: BaseDomain, connection: Connection):
+    def __init__(self, domain: BaseDomain, connection: Connection, tracer: StartTracer | None = None):
         self.connection = connection
         self.domain = domain
+        # STOPPED events received before are left over from the previous run of the domain
+        self.started_at = time.monotonic()
         self.exit_stack = ExitStack()
 
-        self.exit_stack.enter_context(self.domain.device_manager.start(connection))
-        self.context = self.exit_stack.enter_context(self.domain.run())
+        with trace_span(tracer, "devices"):
+            self.exit_stack.enter_context(self.domain.device_manager.start(connection, tracer))
+        with trace_span(tracer, "domain.run"):
+            self.context = self.exit_stack.enter_context(self.domain.run())
 
     def cleanup(self) -> None:
         self.exit_stack.close()
 
 
+class RehydratedDomain:
+    """Cleanup handle of a domain started before a restart, rebuilt from its journal entry."""
+
+    def __init__(self, uuid: str, connection: Connection, entry: journal.JournalEntry):
+        self.uuid = uuid
+        self.connection = connection
+        self.entry = entry
+        # Started before the restart, no event received since predates it
+        self.started_at = 0.0
+
+    def cleanup(self) -> None:
+        for pid, start_time in self.entry.processes:
+            journal.terminate_process(pid, start_time)
+
+        for path in reversed(self.entry.mounts):
+            runtime.umount_and_rmdir(path)
+
+        if self.entry.pci_devices:
+            others = journal.load_all()
+            for pci_device in self.entry.pci_devices:
+                if self._pci_device_in_use(pci_device, others):
+                    logger.info("Not reattaching PCI device %s - still in use by another domain", pci_device)
+                    continue
+
+                try:
+                    node_device = self.connection.call(
+                        "nodeDeviceLookupByName", self.connection.connection.nodeDeviceLookupByName, pci_device,
+                    )
+                    self.connection.call("reAttach", node_device.reAttach)
+                    logger.info("Reattached PCI device %s to host", pci_device)
+                except (Error, libvirt.libvirtError) as e:
+                    logger.warning("Failed to reattach PCI device %s: %s", pci_device, e)
+
+        journal.remove(self.uuid)
+
+    def _pci_device_in_use(self, pci_device: str, others: dict[str, journal.JournalEntry] | None) -> bool:
+        if others is not None:
+            return any(pci_device in entry.pci_devices for uuid, entry in others.items() if uuid != self.uuid)
+
+        # The journal can not tell which other domains hold the device, ask the active domains of the connection
+        # (`pci_0000_01_00_0` -> 0x0000:0x01:0x00.0x0)
+        try:
+            address = [f"0x{part}" for part in pci_device.split("_")[1:]]
+            return self.connection.ownership.owner([pci_key(*address)], self.uuid) is not None
+        except (Error, TypeError, libvirt.libvirtError) as e:
+            logger.warning("Unable to tell whether PCI device %s is in use by another domain: %s", pci_device, e)
+            return True
+
+
+@dataclasses.dataclass
+class PendingDelete:
+    libvirt_domain: Any
+    persistent: bool
+    # Whether the domain was running and had to be destroyed
+    destroyed: bool
+
+
 class DomainManager:
     def __init__(self, connection: Connection):
         self.connection = connection
-        self.started_domains: dict[str, StartedDomain] = {}
+        self.started_domains: dict[str, StartedDomain | RehydratedDomain] = {}
+        # Guards `started_domains`, `_reserved_devices` and `_stale_definitions` only, never held across libvirt calls
+        # or device setup
         self.started_domains_lock = threading.Lock()
+        # UUID -> (lock, number of threads holding or waiting for it), dropped once unused
+        self._domain_locks: dict[str, tuple[threading.Lock, int]] = {}
+        # (device class, identity) of exclusive devices of domains being started -> UUID of that domain. Those
+        # domains are not active in libvirt yet, so the conflict check of a concurrent start would not see them.
+        self._reserved_devices: dict[tuple[str, str], str] = {}
+        # UUIDs of domains whose persistent definition was changed by a device hotplug since they were last defined
+        self._stale_definitions: set[str] = set()
         self.start_validator = StartValidator()
-
+        # Receive a span for every phase of every start, see `tracing.TraceCollector`
+        self.trace_hooks: list[TraceHook] = []
+        self._stop_waiters: dict[str, list[Future[DomainEvent]]] = {}
+        self._cleanup_waiters: dict[str, list[Future[None]]] = {}
+        # Keyed by `UUID/device alias`
+        self._device_removed_waiters: dict[str, list[Future[DeviceRemovedEvent]]] = {}
+        self._waiters_lock = threading.Lock()
+
+        # Waiters are resolved as soon as the event arrives, not behind the cleanups of other domains on the dispatcher
+        self.connection.register_domain_event_callback(self._resolve_stop_waiters, immediate=True)
         self.connection.register_domain_event_callback(self._domain_event_callback)
+        self.connection.register_event_callback(DeviceRemovedEvent, self._device_removed_callback)
 
-    def start(self, domain: BaseDomain) -> None:
+    def add_trace_hook(self, hook: TraceHook) -> None:
+        self.trace_hooks.append(hook)
+
+    def rehydrate(self, uuid: str, entry: journal.JournalEntry) -> None:
+        """
+        Install the cleanup handle of a domain that was started before a restart and is still running, so that its
+        stop undoes exactly the journaled staging.
+        """
         with self.started_domains_lock:
-            if started_domain := self.started_domains.pop(domain.configuration.uuid, None):
-                if libvirt_domain := self.connection.get_domain(domain.configuration.uuid):
+            self.started_domains.setdefault(uuid, RehydratedDomain(uuid, self.connection, entry))
+
+    def start(self, domain: BaseDomain, snapshot: StartValidationSnapshot | None = None) -> None:
+        """`snapshot` shares the host inventory scans of the start validation with other starts, see `start_many`."""
+        tracer = StartTracer(domain.configuration.uuid, self.trace_hooks) if self.trace_hooks else None
+        try:
+            self._start_locked(domain, tracer, snapshot)
+        except BaseException as e:
+            if tracer is not None:
+                tracer.finish(e)
+            raise
+
+        if tracer is not None:
+            tracer.finish()
+
+    def _start_locked(
+        self, domain: BaseDomain, tracer: StartTracer | None, snapshot: StartValidationSnapshot | None,
+    ) -> None:
+        uuid = domain.configuration.uuid
+        # Only starts (and stop handling) of the same domain are serialized, independent domains start in parallel
+        with self._domain_lock(uuid):
+            with self.started_domains_lock:
+                started_domain = self.started_domains.pop(uuid, None)
+
+            if started_domain:
+                if libvirt_domain := self.connection.get_domain(uuid):
                     domain_state = self.connection.domain_state(libvirt_domain)
                     if domain_state in STOPPED_STATES:
+                        # E.g. restarted right after `shutdown()` returned, before the STOPPED event was handled. That
+                        # event is ignored once this start registered the new run.
                         logger.info(
                             f"Requested to start domain {domain.configuration.name!r}. It is present in "
-                            f"`started_domains`, but its state is {domain_state!r}. This should not happen. "
-                            "Performing clean-up routing."
+                            f"`started_domains`, but its state is {domain_state!r}. Performing clean-up routine."
                         )
-                        started_domain.cleanup()
+                        self._cleanup_stopped(uuid, started_domain)
                     else:
+                        with self.started_domains_lock:
+                            self.started_domains[uuid] = started_domain
+
                         raise Error(f"Domain {domain.configuration.name!r} is already started ({domain_state!r}).")
 
-            validation_context = StartValidationContext(
-                connection=self.connection,
-                domain_uuid=domain.configuration.uuid
-            )
+            with self._reserve_exclusive_devices(domain):
+                self._start(domain, tracer, snapshot)
 
-            errors = self.start_validator.validate(domain.device_manager.devices, validation_context)
-            if errors:
-                error_msg = "\n".join([f"{field}: {error}" for field, error in errors])
-                raise Error(f"Cannot start domain {domain.configuration.name!r}:\n{error_msg}")
+    def _start(
+        self, domain: BaseDomain, tracer: StartTracer | None, snapshot: StartValidationSnapshot | None,
+    ) -> None:
+        validation_context = StartValidationContext(
+            connection=self.connection,
+            domain_uuid=domain.configuration.uuid,
+            tracer=tracer,
+            snapshot=snapshot or StartValidationSnapshot(),
+        )
 
-            started_domain = StartedDomain(domain, self.connection)
-            created = False
+        with trace_span(tracer, "validate"):
             try:
-                xml = ElementTree.tostring(domain.xml_generator(started_domain.context).generate()).decode()
-
-                self.connection.define_domain(xml)
-
-                libvirtd_domain = self.connection.get_domain(domain.configuration.uuid)
-
-                if libvirtd_domain.create() < 0:
-                    raise Error(f"Failed to create domain {domain.configuration.name!r}")
-
-                created = True
+                errors = self.start_validator.validate(domain.device_manager.devices, validation_context)
             finally:
-                if created:
+                # A shared snapshot is closed by its creator
+                if snapshot is None:
+                    validation_context.snapshot.close()
+        if errors:
+            error_msg = "\n".join([f"{field}: {error}" for field, error in errors])
+            raise Error(f"Cannot start domain {domain.configuration.name!r}:\n{error_msg}")
+
+        started_domain = StartedDomain(domain, self.connection, tracer)
+        created = False
+        try:
+            with trace_span(tracer, "xml"):
+                xml, config_hash = domain.xml_generator(started_domain.context).generate_xml()
+
+            if domain.configuration.transient:
+                flags = libvirt.VIR_DOMAIN_START_AUTODESTROY if domain.configuration.autodestroy else 0
+                with trace_span(tracer, "create"):
+                    self.connection.create_domain(xml, flags)
+            else:
+                # Redefining an unchanged domain would only make libvirtd rewrite and re-parse its persistent config
+                libvirtd_domain = self.connection.get_domain(domain.configuration.uuid)
+                with self.started_domains_lock:
+                    # Changed by a device hotplug, the hash might not have been dropped
+                    stale = domain.configuration.uuid in self._stale_definitions
+                if stale or libvirtd_domain is None or self._defined_config_hash(libvirtd_domain) != config_hash:
+                    with trace_span(tracer, "define"):
+                        self.connection.define_domain(xml)
+
+                    with self.started_domains_lock:
+                        self._stale_definitions.discard(domain.configuration.uuid)
+
+                    libvirtd_domain = self.connection.get_domain(domain.configuration.uuid)
+
+                with trace_span(tracer, "create"):
+                    if self.connection.call("create", libvirtd_domain.create) < 0:
+                        raise Error(f"Failed to create domain {domain.configuration.name!r}")
+
+            created = True
+        finally:
+            if created:
+                with self.started_domains_lock:
                     self.started_domains[domain.configuration.uuid] = started_domain
-                else:
-                    started_domain.cleanup()
-
-    def shutdown(self, domain: BaseDomain, shutdown_timeout: int | None = None) -> None:
-        libvirt_domain = self._libvirt_domain_for_stop(domain)
 
-        shutdown_timeout = shutdown_timeout or domain.configuration.shutdown_timeout
-        # We wait for timeout seconds before initiating post stop activities for the vm
-        # This is done because the shutdown call above is non-blocking
-        while shutdown_timeout > 0 and self.connection.domain_state(libvirt_domain) == DomainState.RUNNING:
-            try:
-                # Retry shutting down as sometimes LXC driver ignores this request
-                libvirt_domain.shutdown()
-            except Exception:
-                pass
+                # The STARTED event updates the ownership index asynchronously, a start of another domain right after
+                # this one returned must already see the devices of this one
+                self.connection.ownership.claim(domain.configuration.uuid, [
+                    key for device in domain.device_manager.devices for key in device.ownership_keys()
+                ])
+            else:
+                started_domain.cleanup()
+
+    def shutdown(
+        self, domain: BaseDomain, shutdown_timeout: float | None = None,
+        resend_interval: float = DEFAULT_SHUTDOWN_RESEND_INTERVAL,
+    ) -> bool:
+        """
+        Request an ACPI shutdown and wait up to `shutdown_timeout` seconds for the domain to stop, re-sending the
+        request every `resend_interval` seconds. Returns `True` as soon as the STOPPED event is received, `False` if
+        the domain is still not stopped once `shutdown_timeout` expired. A domain that is already shutting down is
+        waited for without re-sending the request.
+        """
+        libvirt_domain = self.active_libvirt_domain(domain)
+
+        deadline = time.monotonic() + (shutdown_timeout or domain.configuration.shutdown_timeout)
+        stopped = self.wait_for_stop(domain.configuration.uuid)
+        try:
+            # The event might have been emitted before the waiter was registered
+            if (state := self.connection.domain_state(libvirt_domain, cached=True)) in INACTIVE_STATES:
+                return True
+            if state not in SHUTDOWN_WAIT_STATES:
+                return False
+
+            while (remaining := deadline - time.monotonic()) > 0:
+                if state == DomainState.RUNNING:
+                    try:
+                        # Retry shutting down as sometimes LXC driver ignores this request
+                        self.connection.call("shutdown", libvirt_domain.shutdown)
+                    except Exception:
+                        pass
 
-            shutdown_timeout -= 1
-            time.sleep(1)
+                try:
+                    stopped.result(min(resend_interval, remaining))
+                    return True
+                except FutureTimeoutError:
+                    continue
+        finally:
+            stopped.cancel()
+
+        return False
+
+    def wait_for_stop(self, uuid: str) -> Future[DomainEvent]:
+        """
+        Return a future resolved with the STOPPED (or UNDEFINED) event of the domain.
+
+        Obtain the future *before* triggering the stop and then check the domain state, to avoid missing an event
+        that arrived in between. Cancel the future if it is no longer needed. Use `asyncio.wrap_future` to await it.
+        """
+        return self._add_waiter(self._stop_waiters, uuid)
+
+    def wait_for_cleanup(self, uuid: str) -> Future[None]:
+        """
+        Return a future resolved once the post-stop cleanup of the domain (unwinding its `StartedDomain` and the
+        runtime state sweep) has completed. Same usage rules as `wait_for_stop`.
+        """
+        return self._add_waiter(self._cleanup_waiters, uuid)
 
     def destroy(self, domain: BaseDomain) -> None:
-        libvirt_domain = self._libvirt_domain_for_stop(domain)
+        libvirt_domain = self.active_libvirt_domain(domain)
         self._destroy(libvirt_domain)
 
     def _destroy(self, libvirt_domain: Any) -> None:
         try:
-            libvirt_domain.destroy()
+            self.connection.call("destroy", libvirt_domain.destroy)
         except Exception:
             if self.connection.domain_state(libvirt_domain) == DomainState.SHUTOFF:
                 # Sometimes `libvirt.libvirtError: Failed to read /sys/fs/cgroup/machine.slice/machine-lxc\x2d63139\x2d
@@ -118,8 +360,8 @@ class DomainManager:
             raise
 
     def suspend(self, domain: BaseDomain) -> None:
-        libvirt_domain = self._libvirt_domain_for_stop(domain)
-        libvirt_domain.suspend()
+        libvirt_domain = self.active_libvirt_domain(domain)
+        self.connection.call("suspend", libvirt_domain.suspend)
 
     def resume(self, domain: BaseDomain) -> None:
         libvirt_domain = self._libvirt_domain(domain)
@@ -127,17 +369,265 @@ class DomainManager:
         if self.connection.domain_state(libvirt_domain) != DomainState.PAUSED:
             raise Error(f"Domain {domain.configuration.name!r} is not suspended")
 
-        libvirt_domain.resume()
+        self.connection.call("resume", libvirt_domain.resume)
 
     def delete(self, domain: BaseDomain) -> None:
+        cleaned_up = self.wait_for_cleanup(domain.configuration.uuid)
+        try:
+            if (pending := self.prepare_delete(domain)) is None:
+                return
+
+            if pending.destroyed:
+                try:
+                    cleaned_up.result(DELETE_CLEANUP_TIMEOUT)
+                except FutureTimeoutError:
+                    logger.warning(
+                        "Post-stop cleanup of domain %r did not complete in %d seconds, deleting it anyway",
+                        domain.configuration.name, DELETE_CLEANUP_TIMEOUT,
+                    )
+        finally:
+            cleaned_up.cancel()
+
+        self.finish_delete(domain, pending)
+
+    def prepare_delete(self, domain: BaseDomain) -> PendingDelete | None:
+        """
+        First half of `delete`: destroy the domain if it is running. `None` if there is nothing left to delete.
+
+        Obtain a `wait_for_cleanup` future before calling this. If the domain was destroyed, post stop actions might
+        require interaction with it, so `finish_delete` must only be called once the future resolved.
+        """
+        if domain.configuration.transient and self.connection.get_domain(domain.configuration.uuid) is None:
+            # A stopped transient domain is already gone
+            return None
+
         libvirt_domain = self._libvirt_domain(domain)
+        # A transient domain vanishes once destroyed. It is only persistent if a definition was left over from
+        # before it was switched to transient mode.
+        persistent = self.connection.call("isPersistent", libvirt_domain.isPersistent)
+        destroyed = False
         if self.connection.domain_state(libvirt_domain) in [DomainState.RUNNING, DomainState.PAUSED]:
             self._destroy(libvirt_domain)
-            # We would like to wait at least 7 seconds to have the vm complete its post vm actions which might require
-            # interaction with its domain
-            time.sleep(7)
+            destroyed = True
+
+        return PendingDelete(libvirt_domain, bool(persistent), destroyed)
+
+    def finish_delete(self, domain: BaseDomain, pending: PendingDelete) -> None:
+        """Second half of `delete`: undefine the domain."""
+        if pending.persistent:
+            self.connection.call("undefine", domain.undefine, pending.libvirt_domain)
+        self.connection.forget_domain(domain.configuration.uuid)
+
+    def attach_device(self, domain: BaseDomain, device: Device) -> None:
+        """
+        Hotplug `device` into the running domain, for its current run and its persistent configuration.
+
+        The device is validated like on start, its `run()` context is entered and it is added to the devices of the
+        domain, so that the stop of the domain tears it down along with the others.
+        """
+        uuid = domain.configuration.uuid
+        with self._domain_lock(uuid):
+            started_domain = self._started_domain(domain)
+            libvirt_domain = self.active_libvirt_domain(domain)
+            # Validation can not see the devices of domains that are being started concurrently
+            with self._reserve_exclusive_devices(domain, [device], "attach device to domain"):
+                self._attach_device(domain, started_domain.domain.device_manager, libvirt_domain, device)
+
+    def _attach_device(
+        self, domain: BaseDomain, device_manager: DeviceManager, libvirt_domain: Any, device: Device,
+    ) -> None:
+        uuid = domain.configuration.uuid
+        with closing(StartValidationSnapshot()) as snapshot:
+            errors = self.start_validator.validate([device], StartValidationContext(
+                connection=self.connection,
+                domain_uuid=uuid,
+                snapshot=snapshot,
+            ))
+        if errors:
+            error_msg = "\n".join([f"{field}: {error}" for field, error in errors])
+            raise Error(f"Cannot attach device to domain {domain.configuration.name!r}:\n{error_msg}")
+
+        device_manager.start_device(device, self.connection)
+        try:
+            for element in self._hotplug_device_xml(device_manager.devices, device):
+                self.connection.call(
+                    "attachDeviceFlags", libvirt_domain.attachDeviceFlags,
+                    ElementTree.tostring(element).decode(), self._hotplug_flags(domain),
+                )
+        except Exception:
+            device_manager.stop_device(device)
+            raise
+        finally:
+            self._invalidate_config_hash(domain, libvirt_domain)
+            self.connection.ownership.refresh(uuid)
+
+    def detach_device(
+        self, domain: BaseDomain, device: Device, timeout: float = DEFAULT_DEVICE_DETACH_TIMEOUT,
+    ) -> None:
+        """
+        Unplug `device` from the running domain and its persistent configuration, then exit its `run()` context.
+
+        Unplugging needs the cooperation of the guest, so this waits up to `timeout` seconds for the device-removed
+        event. If it does not arrive, the device stays attached to the current run and `Error` is raised.
+        """
+        uuid = domain.configuration.uuid
+        with self._domain_lock(uuid):
+            started_domain = self._started_domain(domain)
+            libvirt_domain = self.active_libvirt_domain(domain)
+            device_manager = started_domain.domain.device_manager
+            if not any(other_device is device for other_device in device_manager.devices):
+                raise Error(f"Device {device.identity()!r} is not attached to domain {domain.configuration.name!r}")
+
+            elements = [
+                element for element in self._hotplug_device_xml(device_manager.devices, device)
+                # USB controllers are shared with other devices
+                if element.tag != "controller"
+            ]
+            if (live_xml := self.connection.domain_xml(uuid)) is None:
+                raise DomainDoesNotExistError(f"Domain {domain.configuration.name!r} does not exist")
+
+            live_root = ElementTree.fromstring(live_xml)
+            aliases = []
+            for element in elements:
+                # Without its alias there is no telling when the guest released the device, and exiting its `run()`
+                # context before that would pull it from under the guest (e.g. reattach a PCI device to the host)
+                if (alias := device_alias(live_root, element)) is None:
+                    raise Error(
+                        f"Unable to find device {device.identity()!r} in the running domain "
+                        f"{domain.configuration.name!r}"
+                    )
+
+                aliases.append(alias)
+
+            stopped = self.wait_for_stop(uuid)
+            removed = [self._add_waiter(self._device_removed_waiters, f"{uuid}/{alias}") for alias in aliases]
+            try:
+                try:
+                    for element in elements:
+                        self.connection.call(
+                            "detachDeviceFlags", libvirt_domain.detachDeviceFlags,
+                            ElementTree.tostring(element).decode(), self._hotplug_flags(domain),
+                        )
+                finally:
+                    self._invalidate_config_hash(domain, libvirt_domain)
+
+                deadline = time.monotonic() + timeout
+                for future in removed:
+                    waiting: list[Future[Any]] = [future, stopped]
+                    done, _ = wait(waiting, max(deadline - time.monotonic(), 0), FIRST_COMPLETED)
+                    if stopped in done:
+                        # The stop cleanup of the domain tears the device down
+                        return
+                    if not done:
+                        raise Error(
+                            f"Device {device.identity()!r} was not released by domain {domain.configuration.name!r} "
+                            f"in {timeout} seconds"
+                        )
+            finally:
+                stopped.cancel()
+                for future in removed:
+                    future.cancel()
+
+                self.connection.ownership.refresh(uuid)
+
+            device_manager.stop_device(device)
+
+    def change_media(self, domain: BaseDomain, cdrom: CDROMDevice, path: str | None) -> CDROMDevice:
+        """
+        Insert the image at `path` into `cdrom` of the running domain (eject its media with `None`), for its current
+        run and its persistent configuration. The target and boot order of the drive are kept.
+
+        Returns the device that replaces `cdrom` in the devices of the domain.
+        """
+        uuid = domain.configuration.uuid
+        with self._domain_lock(uuid):
+            started_domain = self._started_domain(domain)
+            libvirt_domain = self.active_libvirt_domain(domain)
+            device_manager = started_domain.domain.device_manager
+            devices = device_manager.devices
+            if not any(device is cdrom for device in devices):
+                raise Error(f"CDROM {cdrom.identity()!r} is not attached to domain {domain.configuration.name!r}")
+
+            # An empty path renders an empty drive
+            media = dataclasses.replace(cdrom, path=path or "")
+            if not media.is_available():
+                raise Error(f"Cannot insert {path!r} into domain {domain.configuration.name!r}: it does not exist")
+
+            [element] = self._hotplug_device_xml([media if device is cdrom else device for device in devices], media)
+            try:
+                self.connection.call(
+                    "updateDeviceFlags", libvirt_domain.updateDeviceFlags,
+                    ElementTree.tostring(element).decode(), self._hotplug_flags(domain),
+                )
+            finally:
+                self._invalidate_config_hash(domain, libvirt_domain)
+                self.connection.ownership.refresh(uuid)
 
-        domain.undefine(libvirt_domain)
+            device_manager.replace_device(cdrom, media)
+            return media
+
+    def _started_domain(self, domain: BaseDomain) -> StartedDomain:
+        with self.started_domains_lock:
+            started_domain = self.started_domains.get(domain.configuration.uuid)
+
+        if not isinstance(started_domain, StartedDomain):
+            # Domains started before a restart only have their journaled cleanup handle, there is no device context
+            # to attach to
+            raise Error(f"Devices of domain {domain.configuration.name!r} can only be changed once it is restarted")
+
+        return started_domain
+
+    @staticmethod
+    def _hotplug_device_xml(devices: list[Device], device: Device) -> list[ElementTree.Element]:
+        # Replay the devices preceding `device` so that the counters (boot order, target names, USB controller indexes)
+        # continue where the XML the domain was started with left off
+        context = DeviceXmlContext(Counters())
+        for other_device in devices:
+            # Devices are compared by identity, identically configured devices are still distinct devices
+            if other_device is device:
+                break
+
+            other_device.xml(context)
+
+        return device.xml(context)
+
+    @staticmethod
+    def _hotplug_flags(domain: BaseDomain) -> int:
+        flags: int = libvirt.VIR_DOMAIN_AFFECT_LIVE
+        if not domain.configuration.transient:
+            flags |= libvirt.VIR_DOMAIN_AFFECT_CONFIG
+
+        return flags
+
+    def _invalidate_config_hash(self, domain: BaseDomain, libvirt_domain: Any) -> None:
+        """
+        Drop the configuration hash of a domain whose persistent definition was changed in place, the next start has
+        to redefine it from the configuration it is started with.
+        """
+        if domain.configuration.transient:
+            return
+
+        with self.started_domains_lock:
+            self._stale_definitions.add(domain.configuration.uuid)
+
+        try:
+            self.connection.call(
+                "setMetadata", libvirt_domain.setMetadata, libvirt.VIR_DOMAIN_METADATA_ELEMENT, None, None,
+                CONFIG_METADATA_NAMESPACE, libvirt.VIR_DOMAIN_AFFECT_CONFIG,
+            )
+        except libvirt.libvirtError as e:
+            logger.warning("Failed to drop the configuration hash of domain %r: %s", domain.configuration.name, e)
+
+    def _defined_config_hash(self, libvirt_domain: Any) -> str | None:
+        try:
+            metadata = self.connection.call(
+                "metadata", libvirt_domain.metadata, libvirt.VIR_DOMAIN_METADATA_ELEMENT, CONFIG_METADATA_NAMESPACE, 0,
+            )
+        except libvirt.libvirtError:
+            # Most likely defined before we started recording the hash (VIR_ERR_NO_DOMAIN_METADATA)
+            return None
+
+        return config_hash_from_metadata(metadata)
 
     def _libvirt_domain(self, domain: BaseDomain) -> Any:
         libvirt_domain = self.connection.get_domain(domain.configuration.uuid)
@@ -146,40 +636,137 @@ class DomainManager:
 
         return libvirt_domain
 
-    def _libvirt_domain_for_stop(self, domain: BaseDomain) -> Any:
+    def active_libvirt_domain(self, domain: BaseDomain) -> Any:
+        """libvirt handle of `domain`, raises `Error` unless it is active."""
         libvirt_domain = self._libvirt_domain(domain)
 
-        if not libvirt_domain.isActive():
+        if not self.connection.call("isActive", libvirt_domain.isActive):
             raise Error(f"Domain {domain.configuration.name!r} is not active")
 
         return libvirt_domain
 
-    def _domain_event_callback(self, event: DomainEvent) -> None:
-        libvirt_domain = self.connection.get_domain(event.uuid)
-        if libvirt_domain is None:
-            return
+    @contextmanager
+    def _domain_lock(self, uuid: str) -> Generator[None, None, None]:
+        with self.started_domains_lock:
+            lock, users = self._domain_locks.get(uuid, (threading.Lock(), 0))
+            self._domain_locks[uuid] = lock, users + 1
 
-        if event.event in STOPPED_EVENTS:
-            # Happy path: contextmanagers unwind first and undo their own
-            # per-device staging. Wrapped because one device's cleanup
-            # failing must not block the runtime sweep below.
+        try:
+            with lock:
+                yield
+        finally:
             with self.started_domains_lock:
-                if started_domain := self.started_domains.pop(event.uuid, None):
-                    try:
-                        started_domain.cleanup()
-                    except Exception:
-                        logger.exception(
-                            "StartedDomain cleanup failed for uuid %s; "
-                            "runtime sweep will reconcile",
-                            event.uuid,
-                        )
+                lock, users = self._domain_locks[uuid]
+                if users == 1:
+                    del self._domain_locks[uuid]
+                else:
+                    self._domain_locks[uuid] = lock, users - 1
+
+    @contextmanager
+    def _reserve_exclusive_devices(
+        self, domain: BaseDomain, devices: list[Device] | None = None, action: str = "start domain",
+    ) -> Generator[None, None, None]:
+        """Reserve the exclusive `devices` (by default all devices of `domain`) against concurrent starts."""
+        uuid = domain.configuration.uuid
+        keys = [
+            (device.__class__.__name__, device.identity())
+            for device in (domain.device_manager.devices if devices is None else devices) if device.EXCLUSIVE_DEVICE
+        ]
+        with self.started_domains_lock:
+            if conflicts := [key for key in keys if self._reserved_devices.get(key, uuid) != uuid]:
+                raise Error(f"Cannot {action} {domain.configuration.name!r}: " + ", ".join(
+                    f"{identity} is being claimed by another domain being started" for _, identity in conflicts
+                ))
 
-                # Authoritative reconciliation of durable runtime state.
-                # Independent of `started_domains`, which is empty after a
-                # middleware restart even when libvirt-managed containers are
-                # still running. Harmless for VMs: no `/run/truenas_containers/*`
-                # entries match their UUIDs, so this is a no-op.
-                try:
-                    runtime.cleanup_for_uuid(event.uuid)
-                except Exception:
-                    logger.exception("Runtime state cleanup failed for uuid %s", event.uuid)
+            for key in keys:
+                self._reserved_devices[key] = uuid
+
+        try:
+            yield
+        finally:
+            with self.started_domains_lock:
+                for key in keys:
+                    if self._reserved_devices.get(key) == uuid:
+                        del self._reserved_devices[key]
+
+    def _add_waiter(self, waiters: dict[str, list[Future[T]]], uuid: str) -> Future[T]:
+        future: Future[T] = Future()
+        with self._waiters_lock:
+            waiters.setdefault(uuid, []).append(future)
+
+        future.add_done_callback(functools.partial(self._remove_waiter, waiters, uuid))
+        return future
+
+    def _remove_waiter(self, waiters: dict[str, list[Future[T]]], uuid: str, future: Future[T]) -> None:
+        with self._waiters_lock:
+            if uuid_waiters := waiters.get(uuid):
+                if future in uuid_waiters:
+                    uuid_waiters.remove(future)
+                if not uuid_waiters:
+                    del waiters[uuid]
+
+    def _resolve_waiters(self, waiters: dict[str, list[Future[T]]], uuid: str, result: T) -> None:
+        with self._waiters_lock:
+            uuid_waiters = list(waiters.get(uuid, []))
+
+        for future in uuid_waiters:
+            # Might have been cancelled in the meantime
+            if not future.done() and future.set_running_or_notify_cancel():
+                future.set_result(result)
+
+    def _device_removed_callback(self, event: DeviceRemovedEvent) -> None:
+        self._resolve_waiters(self._device_removed_waiters, f"{event.uuid}/{event.alias}", event)
+
+    def _resolve_stop_waiters(self, event: DomainEvent) -> None:
+        if event.event in STOPPED_EVENTS:
+            self._resolve_waiters(self._stop_waiters, event.uuid, event)
+
+    def _domain_event_callback(self, event: DomainEvent) -> None:
+        if event.event in STOPPED_EVENTS:
+            # Serialized with starts of the same domain only, a slow cleanup
+            # does not hold up other domains.
+            with self._domain_lock(event.uuid):
+                with self.started_domains_lock:
+                    started_domain = self.started_domains.get(event.uuid)
+                    # Stop waiters are resolved ahead of this callback, the domain might have been started again
+                    # (and the previous run cleaned up by that start) in the meantime
+                    stale = started_domain is not None and started_domain.started_at > event.received
+                    if not stale:
+                        self.started_domains.pop(event.uuid, None)
+
+                if stale:
+                    logger.debug("Ignoring STOPPED event of domain %s received before it was started again", event.uuid)
+                else:
+                    self._cleanup_stopped(event.uuid, started_domain)
+
+            self._resolve_waiters(self._cleanup_waiters, event.uuid, None)
+
+    def _cleanup_stopped(self, uuid: str, started_domain: StartedDomain | RehydratedDomain | None) -> None:
+        # Happy path: contextmanagers unwind first and undo their own
+        # per-device staging. Wrapped because one device's cleanup
+        # failing must not block the runtime sweep below.
+        cleaned_up = True
+        if started_domain:
+            try:
+                started_domain.cleanup()
+            except Exception:
+                cleaned_up = False
+                logger.exception(
+                    "StartedDomain cleanup failed for uuid %s; "
+                    "runtime sweep will reconcile",
+                    uuid,
+                )
+
+        # Authoritative reconciliation of durable runtime state.
+        # Independent of `started_domains`, which is empty after a
+        # middleware restart even when libvirt-managed containers are
+        # still running. Harmless for VMs: no `/run/truenas_containers/*`
+        # entries match their UUIDs, so this is a no-op.
+        try:
+            runtime.cleanup_for_uuid(uuid)
+        except Exception:
+            logger.exception("Runtime state cleanup failed for uuid %s", uuid)
+
+        if cleaned_up:
+            # Otherwise it is left for the next startup to retry what is left
+            journal.remove(uuid)
@@ -1,6 +1,23 @@
-from .. import runtime
-from .manager import DomainManager
+from __future__ import annotations
+
+from contextlib import closing
+import logging
+from typing import Iterable
+
+import libvirt
+
+from .. import journal, runtime
+from ..error import Error
+from ..libvirtd.connection import INACTIVE_STATES
 from ..libvirtd.connection_manager import ConnectionManager
+from ..libvirtd.stats import DomainStatsGroup
+from .base.domain import BaseDomain
+from .batch import DEFAULT_BATCH_CONCURRENCY, run_batch
+from .container.domain import ContainerDomain
+from .manager import DomainManager, RehydratedDomain
+from .start_validator import StartValidationSnapshot
+
+logger = logging.getLogger(__name__)
 
 
 # Libvirt connection URIs used by middleware + any sibling tooling that
@@ -25,18 +42,127 @@ class DomainManagers:
         self.vms_connection = self.connection_manager.create(vms_uri)
         self.vms = DomainManager(self.vms_connection)
 
+    def manager_for(self, domain: BaseDomain) -> DomainManager:
+        return self.containers if isinstance(domain, ContainerDomain) else self.vms
+
+    def start_many(
+        self,
+        domains: list[BaseDomain],
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        priorities: dict[str, int] | None = None,
+        dependencies: dict[str, Iterable[str]] | None = None,
+    ) -> dict[str, BaseException | None]:
+        """
+        Start `domains`, at most `max_concurrency` at a time. A domain is only started once all domains it depends
+        on (`dependencies`, keyed by UUID) have started. See `run_batch` for ordering and the returned map.
+
+        The host inventory scans of the start validation (IOMMU groups, USB devices, network links) are performed
+        once for the whole batch.
+        """
+        with closing(StartValidationSnapshot()) as snapshot:
+            return run_batch(
+                domains, lambda domain: self.manager_for(domain).start(domain, snapshot), max_concurrency,
+                priorities, dependencies,
+            )
+
+    def shutdown_many(
+        self,
+        domains: list[BaseDomain],
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        priorities: dict[str, int] | None = None,
+        dependencies: dict[str, Iterable[str]] | None = None,
+        shutdown_timeout: float | None = None,
+    ) -> dict[str, BaseException | None]:
+        """
+        Gracefully shut `domains` down, at most `max_concurrency` at a time. Dependencies are honored in reverse: a
+        domain is only shut down once all domains depending on it are down. Domains that are not running are
+        skipped and reported as successful, domains still running after `shutdown_timeout` are reported as failed
+        (and the domains they depend on are not shut down).
+        """
+        active = self._active_domains(domains)
+        return run_batch(
+            [domain for domain in domains if domain.configuration.uuid in active],
+            lambda domain: self._shutdown(domain, shutdown_timeout), max_concurrency, priorities, dependencies,
+            reverse_dependencies=True,
+        ) | {domain.configuration.uuid: None for domain in domains if domain.configuration.uuid not in active}
+
+    def destroy_many(
+        self,
+        domains: list[BaseDomain],
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        priorities: dict[str, int] | None = None,
+        dependencies: dict[str, Iterable[str]] | None = None,
+    ) -> dict[str, BaseException | None]:
+        """Same as `shutdown_many`, but powers the domains off."""
+        active = self._active_domains(domains)
+        return run_batch(
+            [domain for domain in domains if domain.configuration.uuid in active],
+            lambda domain: self.manager_for(domain).destroy(domain), max_concurrency, priorities, dependencies,
+            reverse_dependencies=True,
+        ) | {domain.configuration.uuid: None for domain in domains if domain.configuration.uuid not in active}
+
+    def _shutdown(self, domain: BaseDomain, shutdown_timeout: float | None) -> None:
+        if not self.manager_for(domain).shutdown(domain, shutdown_timeout):
+            raise Error(f"Domain {domain.configuration.name!r} did not shut down in time")
+
+    def _managers_for(self, domains: list[BaseDomain]) -> list[DomainManager]:
+        managers = []
+        for domain in domains:
+            if (manager := self.manager_for(domain)) not in managers:
+                managers.append(manager)
+
+        return managers
+
+    def _active_domains(self, domains: list[BaseDomain]) -> set[str]:
+        # One state listing per connection for the whole batch. It also refreshes the cached states and handles the
+        # individual operations use.
+        active = set()
+        for manager in self._managers_for(domains):
+            uuids = [domain.configuration.uuid for domain in domains if self.manager_for(domain) is manager]
+            try:
+                stats = manager.connection.bulk_stats({DomainStatsGroup.STATE}, uuids)
+            except (Error, libvirt.libvirtError) as e:
+                # Let the individual operations find out
+                logger.warning("Failed to retrieve domain states of %r: %s", manager.connection.uri, e)
+                active.update(uuids)
+                continue
+
+            active.update(uuid for uuid, domain_stats in stats.items() if domain_stats.state not in INACTIVE_STATES)
+
+        return active
+
     def reconcile_runtime_state(self) -> None:
-        # Sweep /run/truenas_containers/* for per-uuid trees that don't
-        # correspond to an active libvirt domain. Call once at process
-        # startup, after libvirt connections are reachable.
+        # Rehydrate the cleanup handles of running domains from the journal
+        # and undo the journaled staging of domains that stopped while we
+        # were not around. Call once at process startup, after libvirt
+        # connections are reachable.
         #
+        # Without a usable journal, sweep /run/truenas_containers/* for
+        # per-uuid trees that don't correspond to an active libvirt domain.
         # Aggregation across both managers is required: per-uuid runtime
         # state is container-only, but if we reconciled per-manager the
         # VM manager would see container UUIDs as "not in my active set"
         # and wrongly clean them.
-        active: set[str] = set()
+        active: dict[str, DomainManager] = {}
+        defined: dict[str, DomainManager] = {}
         for manager in (self.containers, self.vms):
             for domain in manager.connection.list_domains():
+                defined[domain.name()] = manager
                 if domain.isActive():
-                    active.add(domain.name())
-        runtime.reconcile(active)
+                    active[domain.name()] = manager
+
+        if (entries := journal.load_all()) is None:
+            runtime.reconcile(set(active))
+            # Stopped domains were swept, running ones keep their entries (and markers) until they stop
+            journal.prune(set(active))
+            return
+
+        for uuid, entry in entries.items():
+            if active_manager := active.get(uuid):
+                active_manager.rehydrate(uuid, entry)
+                continue
+
+            logger.info("Cleaning up journaled runtime state of stopped domain %s", uuid)
+            # Node devices are shared by both drivers of the daemon, any connection can reattach PCI devices
+            RehydratedDomain(uuid, defined.get(uuid, self.vms).connection, entry).cleanup()
+            runtime.cleanup_for_uuid(uuid)
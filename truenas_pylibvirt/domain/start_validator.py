@@ -1,12 +1,101 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+import functools
+import threading
+from typing import Any, TYPE_CHECKING
+
+from pyudev import Device as UdevDevice
+from truenas_pynetif.address.get_links import get_link
+from truenas_pynetif.address.netlink import get_default_route, netlink_route
+from truenas_pynetif.netlink import DeviceNotFound
+
+from ..utils.iommu import get_iommu_groups_info
+from ..utils.pci import get_single_pci_device_details
+from ..utils.usb import list_usb_devices
+from .tracing import trace_span
 
 
 if TYPE_CHECKING:
     from ..device.base import Device
     from ..libvirtd.connection import Connection
+    from .tracing import StartTracer
+
+
+class StartValidationSnapshot:
+    """
+    Host inventory shared by the device checks of a start, or of a batch of starts (see `DomainManagers.start_many`).
+    Every part is read on first use and reused afterwards, so each expensive scan is performed at most once no matter
+    how many devices (of however many domains) consult it. Starting domains does not change the inventory it covers.
+    Active domains are not part of it, conflict checks are served by the connection's `OwnershipIndex`.
+
+    Safe to use from concurrent starts. Whoever created it closes it once the starts using it are done.
+    """
+
+    def __init__(self) -> None:
+        self._exit_stack = ExitStack()
+        # Serializes the scans and the use of the netlink socket
+        self._lock = threading.RLock()
+        self._links: dict[str, bool] = {}
+        self._pci_devices: dict[str, dict[str, Any] | None] = {}
+
+    @property
+    def iommu_groups(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return self._iommu_groups
+
+    @functools.cached_property
+    def _iommu_groups(self) -> dict[str, dict[str, Any]]:
+        return get_iommu_groups_info(get_critical_info=True)
+
+    def pci_device(self, name: str) -> dict[str, Any] | None:
+        """Details of a PCI device by libvirt name (e.g. `pci_0000_01_00_0`), `None` if there is no such device."""
+        with self._lock:
+            if name not in self._pci_devices:
+                self._pci_devices[name] = get_single_pci_device_details(name, self.iommu_groups).get(name)
+
+            return self._pci_devices[name]
+
+    @property
+    def usb_devices(self) -> list[UdevDevice]:
+        with self._lock:
+            return self._usb_devices
+
+    @functools.cached_property
+    def _usb_devices(self) -> list[UdevDevice]:
+        return list_usb_devices()
+
+    @property
+    def default_route_interface(self) -> str | None:
+        with self._lock:
+            return self._default_route_interface
+
+    @functools.cached_property
+    def _default_route_interface(self) -> str | None:
+        if default_route := get_default_route(self._netlink):
+            oif_name: str | None = default_route.oif_name
+            return oif_name
+        return None
+
+    def link_exists(self, name: str) -> bool:
+        with self._lock:
+            if name not in self._links:
+                try:
+                    get_link(self._netlink, name)
+                    self._links[name] = True
+                except DeviceNotFound:
+                    self._links[name] = False
+
+            return self._links[name]
+
+    @functools.cached_property
+    def _netlink(self) -> Any:
+        return self._exit_stack.enter_context(netlink_route())
+
+    def close(self) -> None:
+        with self._lock:
+            self._exit_stack.close()
 
 
 @dataclass
@@ -14,6 +103,8 @@ class StartValidationContext:
     """Context for start validation - can be extended by consumers"""
     connection: Connection
     domain_uuid: str
+    tracer: StartTracer | None = None
+    snapshot: StartValidationSnapshot = field(default_factory=StartValidationSnapshot)
 
 
 class StartValidator:
@@ -27,13 +118,17 @@ class StartValidator:
         errors = []
 
         for device in devices:
-            if not device.is_available():
+            identity = device.identity(context)
+            with trace_span(context.tracer, 'device.is_available', identity):
+                available = device.is_available(context)
+            if not available:
                 errors.append((
-                    f'device.{device.identity()}',
-                    f'Device {device.identity()} is not available'
+                    f'device.{identity}',
+                    f'Device {identity} is not available'
                 ))
 
-            device_errors = device.validate_start(context)
+            with trace_span(context.tracer, 'device.validate_start', identity):
+                device_errors = device.validate_start(context)
             errors.extend(device_errors)
 
         return errors
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import ContextManager, Generator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TRACES = 10
+
+
+@dataclass
+class Span:
+    # Phase of the start: `validate`, `device.is_available`, `device.validate_start`, `devices`, `device.run`,
+    # `domain.run`, `xml`, `define` or `create`
+    name: str
+    # Seconds since the start of the trace
+    offset: float
+    duration: float
+    # Identity of the device for `device.*` spans
+    device: str | None = None
+    error: str | None = None
+
+
+@dataclass
+class StartTrace:
+    uuid: str
+    # `time.time()` of the start
+    started_at: float
+    spans: list[Span] = field(default_factory=list)
+    # Set once the start completed
+    duration: float | None = None
+    error: str | None = None
+
+
+class TraceHook:
+    """Receives the spans of domain starts as they complete. Hooks run synchronously, so they should be cheap."""
+
+    def span(self, trace: StartTrace, span: Span) -> None:
+        pass
+
+    def finished(self, trace: StartTrace) -> None:
+        pass
+
+
+class StartTracer:
+    """Records the spans of a single domain start and forwards them to the hooks."""
+
+    def __init__(self, uuid: str, hooks: list[TraceHook]) -> None:
+        self.trace = StartTrace(uuid=uuid, started_at=time.time())
+        self.hooks = hooks
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, device: str | None = None) -> Generator[None, None, None]:
+        start = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            span = Span(name, start - self._start, time.monotonic() - start, device, error)
+            with self._lock:
+                self.trace.spans.append(span)
+
+            self._call_hooks("span", self.trace, span)
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.trace.duration = time.monotonic() - self._start
+        self.trace.error = repr(error) if error is not None else None
+        self._call_hooks("finished", self.trace)
+
+    def _call_hooks(self, method: str, *args: object) -> None:
+        for hook in self.hooks:
+            try:
+                getattr(hook, method)(*args)
+            except Exception:
+                logger.error("Unhandled exception in trace hook %r", hook, exc_info=True)
+
+
+def trace_span(tracer: StartTracer | None, name: str, device: str | None = None) -> ContextManager[None]:
+    if tracer is None:
+        return nullcontext()
+
+    return tracer.span(name, device)
+
+
+class TraceCollector(TraceHook):
+    """Keeps the last `max_traces` completed start traces of each domain in memory."""
+
+    def __init__(self, max_traces: int = DEFAULT_MAX_TRACES) -> None:
+        self.max_traces = max_traces
+        self._traces: dict[str, deque[StartTrace]] = {}
+        self._lock = threading.Lock()
+
+    def finished(self, trace: StartTrace) -> None:
+        with self._lock:
+            self._traces.setdefault(trace.uuid, deque(maxlen=self.max_traces)).append(trace)
+
+    def traces(self, uuid: str) -> list[StartTrace]:
+        """Traces of the domain, oldest first."""
+        with self._lock:
+            return list(self._traces.get(uuid, []))
+
+    def last(self, uuid: str) -> StartTrace | None:
+        with self._lock:
+            if traces := self._traces.get(uuid):
+                return traces[-1]
+
+        return None
@@ -1,6 +1,8 @@
 import libvirt
 
-__all__ = ["Error", "DomainDoesNotExistError", "GuestAgentError", "is_no_domain_error"]
+__all__ = [
+    "Error", "CircuitOpenError", "DomainDoesNotExistError", "GuestAgentError", "RpcTimeoutError", "is_no_domain_error",
+]
 
 
 class Error(Exception):
@@ -15,6 +17,14 @@ class GuestAgentError(Error):
     pass
 
 
+class RpcTimeoutError(Error):
+    pass
+
+
+class CircuitOpenError(Error):
+    pass
+
+
 def is_no_domain_error(exc: BaseException) -> bool:
     return (
         isinstance(exc, libvirt.libvirtError)
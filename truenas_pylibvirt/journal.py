@@ -0,0 +1,219 @@
+"""Journal of the host-side staging of started domains under /run/truenas_pylibvirt/journal/.
+
+`DomainManager.started_domains` lives in memory only, so after a middleware
+restart the `StartedDomain` cleanup handles of domains that kept running are
+gone: PCI devices would never be reattached, websockify processes never
+terminated and staged mounts only found by a full `runtime.reconcile` sweep.
+
+Devices therefore record what they stage in a small JSON file per domain:
+mount paths, PCI devices detached from the host and spawned helper
+processes. Entries are recorded *before* the staging happens (processes
+right after they are spawned), so undoing a journaled entry that was never
+staged is a harmless no-op, and discarded once the device undid its staging.
+On startup `DomainManagers.reconcile_runtime_state()` rebuilds exact cleanup
+handles from the journal instead of rescanning everything.
+
+Everything lives under /run, so the journal does not survive a reboot --
+neither does the state it describes.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+import enum
+import json
+import logging
+import os
+import signal
+import threading
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+JOURNAL_ROOT = "/run/truenas_pylibvirt/journal"
+# Marks the entry of a domain for which a record failed to be written
+UNTRUSTED_SUFFIX = ".untrusted"
+
+_lock = threading.Lock()
+
+
+class JournalEntryKind(enum.Enum):
+    MOUNT = "mounts"
+    PCI_DEVICE = "pci_devices"
+    PROCESS = "processes"
+
+
+@dataclass
+class JournalEntry:
+    # Staged mount paths, in staging order
+    mounts: list[str] = field(default_factory=list)
+    # Names of the libvirt node devices detached from the host
+    pci_devices: list[str] = field(default_factory=list)
+    # [pid, start time in clock ticks since boot], the start time guards against PID reuse
+    processes: list[list[int]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.mounts or self.pci_devices or self.processes)
+
+
+def record(uuid: str, kind: JournalEntryKind, value: Any) -> None:
+    """
+    Add `value` to the journal entry of `uuid`. Best-effort: a failure marks the entry untrusted, which costs the
+    full sweep on startup until the domain stops.
+    """
+    with _lock:
+        entry = _read(uuid) or JournalEntry()
+        values = getattr(entry, kind.value)
+        if value not in values:
+            values.append(value)
+
+        try:
+            _write(uuid, entry)
+        except OSError as e:
+            logger.warning("Unable to journal %s %r of domain %s: %s", kind.value, value, uuid, e)
+            _mark_untrusted(uuid)
+
+
+def discard(uuid: str, kind: JournalEntryKind, value: Any) -> None:
+    """Remove `value` from the journal entry of `uuid` once it was undone. Idempotent."""
+    with _lock:
+        if (entry := _read(uuid)) is None:
+            return
+
+        values = getattr(entry, kind.value)
+        if value not in values:
+            return
+
+        values.remove(value)
+        try:
+            if entry.is_empty():
+                _unlink(uuid)
+            else:
+                _write(uuid, entry)
+        except OSError as e:
+            logger.warning("Unable to update journal of domain %s: %s", uuid, e)
+
+
+def remove(uuid: str) -> None:
+    """Drop the journal entry of `uuid`. Idempotent."""
+    with _lock:
+        try:
+            _unlink(uuid)
+        except OSError as e:
+            logger.warning("Unable to remove journal of domain %s: %s", uuid, e)
+
+
+def prune(keep: set[str]) -> None:
+    """Drop the journal entries (and untrusted markers) of all domains but `keep`, after a full sweep."""
+    with _lock:
+        try:
+            names = os.listdir(JOURNAL_ROOT)
+        except FileNotFoundError:
+            return
+
+        for uuid in {name.rsplit(".", 1)[0] for name in names} - keep:
+            try:
+                _unlink(uuid)
+            except OSError as e:
+                logger.warning("Unable to remove journal of domain %s: %s", uuid, e)
+
+
+def load(uuid: str) -> JournalEntry | None:
+    with _lock:
+        return _read(uuid)
+
+
+def load_all() -> dict[str, JournalEntry] | None:
+    """
+    All journal entries keyed by domain UUID. `None` if the journal can not be trusted (it does not exist yet, an
+    entry is unreadable or failed to be written), in which case callers have to fall back to a full sweep.
+    """
+    with _lock:
+        try:
+            names = os.listdir(JOURNAL_ROOT)
+        except FileNotFoundError:
+            return None
+
+        if untrusted := [name for name in names if name.endswith(UNTRUSTED_SUFFIX)]:
+            logger.warning("Journal entries %s are incomplete", ", ".join(sorted(untrusted)))
+            return None
+
+        entries = {}
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+
+            uuid = name.removesuffix(".json")
+            try:
+                with open(_path(uuid)) as f:
+                    entries[uuid] = JournalEntry(**json.load(f))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("Journal entry %s is unreadable: %s", name, e)
+                return None
+
+        return entries
+
+
+def process_start_time(pid: int) -> int | None:
+    """Start time of `pid` in clock ticks since boot (field 22 of /proc/<pid>/stat), `None` if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except FileNotFoundError:
+        return None
+
+    # The command name in parentheses may contain spaces, the fields after it start with field 3
+    return int(stat.rsplit(")", 1)[1].split()[19])
+
+
+def terminate_process(pid: int, start_time: int) -> None:
+    """SIGTERM `pid` unless it exited and the PID was reused since `start_time` was journaled."""
+    if process_start_time(pid) != start_time:
+        return
+
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _path(uuid: str) -> str:
+    return os.path.join(JOURNAL_ROOT, f"{uuid}.json")
+
+
+def _read(uuid: str) -> JournalEntry | None:
+    try:
+        with open(_path(uuid)) as f:
+            return JournalEntry(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning("Journal entry of domain %s is unreadable: %s", uuid, e)
+        return None
+
+
+def _write(uuid: str, entry: JournalEntry) -> None:
+    os.makedirs(JOURNAL_ROOT, mode=0o700, exist_ok=True)
+    path = _path(uuid)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(asdict(entry), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _mark_untrusted(uuid: str) -> None:
+    try:
+        os.makedirs(JOURNAL_ROOT, mode=0o700, exist_ok=True)
+        with open(os.path.join(JOURNAL_ROOT, f"{uuid}{UNTRUSTED_SUFFIX}"), "w"):
+            pass
+    except OSError as e:
+        logger.error("Unable to mark journal of domain %s as incomplete: %s", uuid, e)
+
+
+def _unlink(uuid: str) -> None:
+    for path in (_path(uuid), os.path.join(JOURNAL_ROOT, f"{uuid}{UNTRUSTED_SUFFIX}")):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import functools
+import threading
+from typing import Any, Callable, Iterable, TypeVar
+
+from .connection import Connection, DomainEvent, DomainState, VirDomainEvent
+from .stats import DEFAULT_STATS_GROUPS, DomainStats, DomainStatsGroup
+
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class AsyncConnection:
+    """
+    asyncio facade for `Connection`.
+
+    Blocking libvirt calls run on a small dedicated executor, so that many concurrent operations share a bounded
+    number of threads instead of occupying the default executor of the event loop. Waiting for domain events does
+    not need a thread at all: `wait_for_event` returns a future resolved from the libvirt event callback.
+    """
+
+    def __init__(
+        self, connection: Connection, *, executor: ThreadPoolExecutor | None = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ) -> None:
+        self.connection = connection
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="libvirt_async")
+        self._event_waiters: dict[str, list[tuple[asyncio.Future[DomainEvent], frozenset[VirDomainEvent]]]] = {}
+        self._event_waiters_lock = threading.Lock()
+
+        self.connection.register_domain_event_callback(self._domain_event_callback)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking callable on the libvirt executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        if self._own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def ensure_alive(self) -> bool:
+        return await self.run(self.connection.ensure_alive)
+
+    async def list_domains(self) -> list[Any]:
+        return await self.run(self.connection.list_domains)
+
+    async def define_domain(self, xml: str) -> None:
+        await self.run(self.connection.define_domain, xml)
+
+    async def get_domain(self, uuid: str) -> Any:
+        return await self.run(self.connection.get_domain, uuid)
+
+    async def domain_memory_usage(self, domain: Any) -> int:
+        return await self.run(self.connection.domain_memory_usage, domain)
+
+    async def guest_agent_command(self, domain: Any, command: str, timeout: int = 30) -> str:
+        return await self.run(self.connection.guest_agent_command, domain, command, timeout)
+
+    async def bulk_stats(
+        self,
+        groups: frozenset[DomainStatsGroup] | set[DomainStatsGroup] = DEFAULT_STATS_GROUPS,
+        uuids: list[str] | None = None,
+    ) -> dict[str, DomainStats]:
+        return await self.run(self.connection.bulk_stats, groups, uuids)
+
+    async def domain_state(self, domain: Any, cached: bool = False) -> DomainState:
+        return await self.run(self.connection.domain_state, domain, cached)
+
+    def wait_for_event(self, uuid: str, events: Iterable[VirDomainEvent]) -> asyncio.Future[DomainEvent]:
+        """
+        Return a future resolved with the first of `events` reported for `uuid`.
+
+        The waiter is registered immediately, so callers should obtain the future *before* triggering the action
+        that emits the event and then check the current state, to avoid missing an event that arrived in between.
+        Cancelling the future unregisters the waiter.
+        """
+        future: asyncio.Future[DomainEvent] = asyncio.get_running_loop().create_future()
+        waiter = (future, frozenset(events))
+        with self._event_waiters_lock:
+            self._event_waiters.setdefault(uuid, []).append(waiter)
+
+        future.add_done_callback(functools.partial(self._remove_event_waiter, uuid, waiter))
+        return future
+
+    def _remove_event_waiter(
+        self, uuid: str, waiter: tuple[asyncio.Future[DomainEvent], frozenset[VirDomainEvent]], _: Any,
+    ) -> None:
+        with self._event_waiters_lock:
+            if waiters := self._event_waiters.get(uuid):
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    del self._event_waiters[uuid]
+
+    def _domain_event_callback(self, event: DomainEvent) -> None:
+        # Runs on an event dispatcher worker, futures must be resolved on the loop that owns them
+        with self._event_waiters_lock:
+            waiters = [
+                future for future, events in self._event_waiters.get(event.uuid, []) if event.event in events
+            ]
+
+        for future in waiters:
+            # The loop might already be closed if its owner went away without cancelling the waiter
+            with contextlib.suppress(RuntimeError):
+                future.get_loop().call_soon_threadsafe(_resolve_future, future, event)
+
+
+def _resolve_future(future: asyncio.Future[DomainEvent], event: DomainEvent) -> None:
+    if not future.done():
+        future.set_result(event)
@@ -1,22 +1,38 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+import contextlib
+from dataclasses import dataclass, field
 import enum
 import functools
 import logging
 import os
-from typing import Any, Callable, TYPE_CHECKING
+import threading
+import time
+from typing import Any, Callable, TYPE_CHECKING, TypeVar
 
 import libvirt
 import libvirt_qemu
 
-from ..error import Error, GuestAgentError, is_no_domain_error
+from ..error import Error, GuestAgentError, RpcTimeoutError, is_no_domain_error
+from .events import TypedDomainEvent, lifecycle_event_detail, typed_event_registrations
+from .instrumentation import RpcMetrics, unwrap
+from .monitoring_pool import MonitoringPool
+from .ownership import OwnershipIndex
+from .rpc_guard import RpcGuard, RpcGuardConfig
+from .stats import DEFAULT_STATS_GROUPS, DomainStats, DomainStatsGroup, libvirt_stats_flags
 
 if TYPE_CHECKING:
     from .connection_manager import ConnectionManager
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+TE = TypeVar("TE", bound=TypedDomainEvent)
+
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
 
 @functools.cache
 def kvm_supported() -> bool:
@@ -49,6 +65,30 @@ class VirDomainEvent(enum.Enum):
     UNKNOWN = "UNKNOWN"
 
 
+LIBVIRT_DOMAIN_STATES = {
+    libvirt.VIR_DOMAIN_NOSTATE: DomainState.NOSTATE,
+    libvirt.VIR_DOMAIN_RUNNING: DomainState.RUNNING,
+    libvirt.VIR_DOMAIN_BLOCKED: DomainState.BLOCKED,
+    libvirt.VIR_DOMAIN_PAUSED: DomainState.PAUSED,
+    libvirt.VIR_DOMAIN_SHUTDOWN: DomainState.SHUTDOWN,
+    libvirt.VIR_DOMAIN_SHUTOFF: DomainState.SHUTOFF,
+    libvirt.VIR_DOMAIN_CRASHED: DomainState.CRASHED,
+    libvirt.VIR_DOMAIN_PMSUSPENDED: DomainState.PMSUSPENDED,
+}
+
+LIBVIRT_DOMAIN_EVENTS = {
+    libvirt.VIR_DOMAIN_EVENT_DEFINED: VirDomainEvent.DEFINED,
+    libvirt.VIR_DOMAIN_EVENT_UNDEFINED: VirDomainEvent.UNDEFINED,
+    libvirt.VIR_DOMAIN_EVENT_STARTED: VirDomainEvent.STARTED,
+    libvirt.VIR_DOMAIN_EVENT_SUSPENDED: VirDomainEvent.SUSPENDED,
+    libvirt.VIR_DOMAIN_EVENT_RESUMED: VirDomainEvent.RESUMED,
+    libvirt.VIR_DOMAIN_EVENT_STOPPED: VirDomainEvent.STOPPED,
+    libvirt.VIR_DOMAIN_EVENT_SHUTDOWN: VirDomainEvent.SHUTDOWN,
+    libvirt.VIR_DOMAIN_EVENT_PMSUSPENDED: VirDomainEvent.PMSUSPENDED,
+    libvirt.VIR_DOMAIN_EVENT_CRASHED: VirDomainEvent.CRASHED,
+}
+
+
 class DomainEventType(enum.Enum):
     ADDED = "ADDED"
     CHANGED = "CHANGED"
@@ -58,54 +98,212 @@ class DomainEventType(enum.Enum):
 class DomainEvent:
     event: VirDomainEvent
     uuid: str
+    # Decoded lifecycle event detail, i.e. why the event happened (`DESTROYED`, `SHUTDOWN`, `CRASHED`... for
+    # `STOPPED`), see `events.LIFECYCLE_EVENT_DETAILS`
+    detail: str = "UNKNOWN"
+    # Synthesized after a reconnect because libvirt could not deliver the event while the connection was down
+    replayed: bool = False
+    # `time.monotonic()` of the moment the event was received, tells which run of the domain it belongs to
+    received: float = field(default_factory=time.monotonic, compare=False, repr=False)
 
 
 DomainEventCallback = Callable[[DomainEvent], None]
 
+INACTIVE_STATES = (DomainState.SHUTOFF, DomainState.CRASHED)
+
+
+@dataclass
+class DomainStateEntry:
+    state: DomainState
+    # `time.monotonic()` of the moment the state was last confirmed by an event or a read
+    updated_at: float
+
 
 class Connection:
-    def __init__(self, manager: ConnectionManager, uri: str):
+    """
+    With `auto_reconnect`, a supervisor thread reopens the connection (with exponential backoff) as soon as libvirt
+    reports it closed, instead of waiting for the next caller. Whenever a connection is reopened, the states of all
+    domains are compared with the last known ones and the lifecycle events missed in between are replayed, so that
+    e.g. post-stop cleanup runs for domains that stopped while libvirtd was restarting.
+
+    With `rpc_guard_config`, libvirt calls made through `call()` (which includes all calls made by this class and by
+    `DomainManager`) are subject to per-operation deadlines and a circuit breaker, see `RpcGuard`.
+
+    With `monitoring_lanes`, read-only monitoring calls (`bulk_stats`, `domain_xml`, `monitoring_call`) are served by
+    that many additional read-only connections instead of the control connection used for lifecycle operations and
+    events, so that polling does not add latency to starting and stopping domains. Domain handles obtained on a
+    monitoring lane are never cached nor handed out.
+
+    With `rpc_metrics`, the `virConnect` and `virDomain` objects handed out by this class are wrapped so that their
+    method calls are recorded (see `instrumentation.RpcMetrics`). Without it, the raw libvirt objects are returned.
+    """
+
+    def __init__(
+        self, manager: ConnectionManager, uri: str, auto_reconnect: bool = False,
+        rpc_guard_config: RpcGuardConfig | None = None, monitoring_lanes: int = 0,
+        rpc_metrics: RpcMetrics | None = None,
+    ):
         self.manager = manager
         self.uri = uri
-        self._connection = None
+        self.auto_reconnect = auto_reconnect
+        self.rpc_guard = RpcGuard(rpc_guard_config) if rpc_guard_config is not None else None
+        self.monitoring_pool = MonitoringPool(manager, uri, monitoring_lanes) if monitoring_lanes > 0 else None
+        self.rpc_metrics = rpc_metrics
+        self._connection: Any = None
+        self._connection_alive = False
+        self._connection_lock = threading.Lock()
+        # Resolved once the (re)opening of the connection in progress completed, shared by everybody waiting for it
+        self._opening: Future[None] | None = None
         self._domain_event_callbacks: list[DomainEventCallback] = []
+        self._immediate_domain_event_callbacks: list[DomainEventCallback] = []
+        self._typed_event_callbacks: dict[type[Any], list[Callable[[Any], None]]] = {}
+        self._event_callback_ids: list[int] = []
+        # `virDomain` handles keyed by domain UUID (which is also the domain name). Handles are bound to the
+        # `virConnect` they were obtained from, so the cache is dropped whenever the connection is reopened, and
+        # entries are evicted when libvirt reports the domain as undefined.
+        self._domains: dict[str, Any] = {}
+        # UUIDs of the domains started with `create_domain`. Their handles are evicted once they stop as libvirt does
+        # not report transient domains vanishing with an UNDEFINED event.
+        self._transient_domains: set[str] = set()
+        # State of each domain, seeded from a single bulk listing whenever a connection is opened and then maintained
+        # from lifecycle events. Serves cached `domain_state()` reads and lets us detect events missed on reconnect.
+        self._domain_states: dict[str, DomainStateEntry] = {}
+        self._domain_states_seeded = False
+        self._reconnect_thread: threading.Thread | None = None
+        self._reconnect_stop = threading.Event()
+        # Host resources used by the active domains, see `OwnershipIndex`
+        self.ownership = OwnershipIndex(self)
+        self.register_domain_event_callback(self._update_ownership)
 
     @property
     def connection(self) -> Any:
-        # We see isAlive call failed for a user in NAS-109072, it would be better
-        # if we handle this to ensure that system recognises libvirt connection
-        # is no longer active and a new one should be initiated.
-        if (
-            self._connection and
-            self._connection.isAlive() and
-            isinstance(self._connection.listAllDomains(), list)
-        ):
-            return self._connection
-
-        self._open()
-        return self._connection
-
-    def register_domain_event_callback(self, callback: DomainEventCallback) -> None:
-        self._domain_event_callbacks.append(callback)
+        # Liveness is tracked by the close callback which libvirt invokes when the keepalive fails or the daemon
+        # goes away (we saw isAlive fail for a user in NAS-109072), so the happy path does not issue any RPC here.
+        # Code that hits a libvirt error should call `ensure_alive()` to find out whether the connection is at fault.
+        if self._connection is not None and self._connection_alive:
+            return self._instrument(self._connection)
+
+        self._wait_open()
+        return self._instrument(self._connection)
+
+    @property
+    def is_alive(self) -> bool:
+        return self._connection is not None and self._connection_alive
+
+    def ensure_alive(self) -> bool:
+        """
+        Actively probe the connection with a round trip to libvirtd.
+        Returns False (and marks the connection dead so that the next access reopens it) if the probe fails.
+        Meant for error paths only, the happy path relies on the close callback.
+        """
+        connection = self._connection
+        if connection is None or not self._connection_alive:
+            return False
+
+        try:
+            alive = bool(connection.isAlive()) and connection.getLibVersion() > 0
+        except libvirt.libvirtError:
+            alive = False
+
+        if not alive:
+            self._mark_dead(connection)
+
+        return alive
+
+    def register_domain_event_callback(self, callback: DomainEventCallback, immediate: bool = False) -> None:
+        """
+        Callbacks run on the event dispatcher. `immediate` callbacks run as soon as the event arrives (on the libvirt
+        event loop), ahead of the dispatched ones, so they must be cheap and never block, e.g. resolve futures.
+        """
+        if immediate:
+            self._immediate_domain_event_callbacks.append(callback)
+        else:
+            self._domain_event_callbacks.append(callback)
+
+    def register_event_callback(self, event_type: type[TE], callback: Callable[[TE], None]) -> None:
+        """
+        Subscribe to a typed domain event (see `events.TypedDomainEvent`).
+        The libvirt event is only registered once somebody subscribes to it.
+        """
+        with self._connection_lock:
+            subscribe = event_type not in self._typed_event_callbacks
+            self._typed_event_callbacks.setdefault(event_type, []).append(callback)
+            if subscribe and self.is_alive:
+                self._register_typed_event(self._connection, event_type)
+
+    def call(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        """
+        Invoke the libvirt method `func` (named `operation`, which selects its deadline) under the RPC guard, if
+        one is configured.
+        """
+        if self.rpc_guard is None:
+            return func(*args)
+
+        return self.rpc_guard.call(operation, func, *args)
+
+    def monitoring_call(self, operation: str, func: Callable[[Any], T]) -> T:
+        """
+        Invoke `func` with a `virConnect` meant for read-only monitoring traffic: a monitoring lane if there are any,
+        the control connection otherwise. `func` must not keep the domain handles it obtains.
+        """
+        if self.monitoring_pool is None:
+            return self._retry_if_dead(operation, func)
+
+        with self.monitoring_pool.lane() as lane:
+            try:
+                return self.call(operation, func, self._instrument(lane.connection))
+            except libvirt.libvirtError as e:
+                if is_no_domain_error(e) or lane.ensure_alive():
+                    raise
+
+            return self.call(operation, func, self._instrument(lane.connection))
 
     def list_domains(self) -> list[Any]:
-        return list(self.connection.listAllDomains())
+        domains = list(self._retry_if_dead("listAllDomains", lambda connection: connection.listAllDomains()))
+        for domain in domains:
+            self._domains.setdefault(domain.name(), unwrap(domain))
+
+        return domains
 
     def define_domain(self, xml: str) -> None:
-        if not self.connection.defineXML(xml):
+        domain = self._retry_if_dead("defineXML", lambda connection: connection.defineXML(xml))
+        if not domain:
             raise Error("Failed to define a domain from an XML definition")
 
+        self._domains[domain.name()] = unwrap(domain)
+
+    def create_domain(self, xml: str, flags: int = 0) -> Any:
+        """Start a transient domain from an XML definition and return its handle."""
+        domain = self._retry_if_dead("createXML", lambda connection: connection.createXML(xml, flags))
+        if not domain:
+            raise Error("Failed to create a domain from an XML definition")
+
+        self._domains[domain.name()] = unwrap(domain)
+        self._transient_domains.add(domain.name())
+        return domain
+
     def get_domain(self, uuid: str) -> Any:
+        if self.is_alive and (domain := self._domains.get(uuid)) is not None:
+            return self._instrument(domain)
+
         try:
-            return self.connection.lookupByName(uuid)
+            domain = self._retry_if_dead("lookupByName", lambda connection: connection.lookupByName(uuid))
         except libvirt.libvirtError as e:
             if is_no_domain_error(e):
+                self._domains.pop(uuid, None)
                 return None
 
             raise
 
+        self._domains[uuid] = unwrap(domain)
+        return domain
+
+    def forget_domain(self, uuid: str) -> None:
+        """Drop the cached handle for `uuid`, e.g. after the domain was undefined through it."""
+        self._domains.pop(uuid, None)
+
     def domain_memory_usage(self, domain: Any) -> int:
-        return int(domain.memoryStats().get("actual", 0) * 1024)
+        return int(self.call("memoryStats", domain.memoryStats).get("actual", 0) * 1024)
 
     def guest_agent_command(self, domain: Any, command: str, timeout: int = 30) -> str:
         """Send a QEMU guest agent command and return the raw JSON response string.
@@ -113,53 +311,454 @@ class Connection:
         Raises GuestAgentError if the guest agent is unavailable or times out.
         """
         try:
-            return str(libvirt_qemu.qemuAgentCommand(domain, command, timeout, 0))
+            if self.rpc_metrics is None:
+                return str(libvirt_qemu.qemuAgentCommand(domain, command, timeout, 0))
+
+            return str(self.rpc_metrics.timed(
+                self.uri, "qemuAgentCommand", libvirt_qemu.qemuAgentCommand, unwrap(domain), command, timeout, 0,
+            ))
         except libvirt.libvirtError as e:
             raise GuestAgentError(f"Guest agent command failed: {e}")
 
-    def domain_state(self, domain: Any) -> DomainState:
-        return {
-            libvirt.VIR_DOMAIN_NOSTATE: DomainState.NOSTATE,
-            libvirt.VIR_DOMAIN_RUNNING: DomainState.RUNNING,
-            libvirt.VIR_DOMAIN_BLOCKED: DomainState.BLOCKED,
-            libvirt.VIR_DOMAIN_PAUSED: DomainState.PAUSED,
-            libvirt.VIR_DOMAIN_SHUTDOWN: DomainState.SHUTDOWN,
-            libvirt.VIR_DOMAIN_SHUTOFF: DomainState.SHUTOFF,
-            libvirt.VIR_DOMAIN_CRASHED: DomainState.CRASHED,
-            libvirt.VIR_DOMAIN_PMSUSPENDED: DomainState.PMSUSPENDED,
-        }[domain.state()[0]]
+    def bulk_stats(
+        self,
+        groups: frozenset[DomainStatsGroup] | set[DomainStatsGroup] = DEFAULT_STATS_GROUPS,
+        uuids: list[str] | None = None,
+    ) -> dict[str, DomainStats]:
+        """
+        Retrieve statistics for all domains (or only for `uuids`) with a single RPC.
+        Domains from `uuids` which do not exist are omitted from the result.
+
+        Drivers without bulk statistics only report the state, retrieved with an RPC per domain.
+        """
+        flags = libvirt_stats_flags(groups)
+        try:
+            records = self._bulk_stats_records(flags, uuids)
+        except libvirt.libvirtError as e:
+            if is_no_domain_error(e):
+                raise
+
+            logger.debug("Bulk statistics unavailable on %r, falling back to domain states: %s", self.uri, e)
+            records = self.monitoring_call("state", lambda connection: self._state_records(connection, uuids))
+
+        result = {}
+        for domain, record in records:
+            if self.monitoring_pool is None:
+                self._domains.setdefault(domain.name(), domain)
+            result[domain.name()] = stats = DomainStats.from_libvirt(
+                domain.name(), record, self.domain_state_from_code,
+            )
+            if stats.state is not None:
+                self._set_domain_state(domain.name(), stats.state)
+
+        return result
+
+    def domain_xml(self, uuid: str, flags: int = 0) -> str | None:
+        """XML description of the domain (`None` if it does not exist), retrieved over a monitoring lane."""
+        def xml_desc(connection: Any) -> str | None:
+            try:
+                return str(connection.lookupByName(uuid).XMLDesc(flags))
+            except libvirt.libvirtError as e:
+                if is_no_domain_error(e):
+                    return None
+
+                raise
+
+        return self.monitoring_call("XMLDesc", xml_desc)
+
+    def domain_state(self, domain: Any, cached: bool = False) -> DomainState:
+        """
+        Return the state of `domain`. With `cached`, the state is served from the event-maintained state table
+        without any RPC (falling back to a fresh read for domains the table does not know yet).
+        """
+        if cached and self.is_alive and (entry := self._domain_states.get(domain.name())) is not None:
+            return entry.state
+
+        state = self.domain_state_from_code(self.call("state", domain.state)[0])
+        self._set_domain_state(domain.name(), state)
+        return state
+
+    def domain_state_entry(self, uuid: str) -> DomainStateEntry | None:
+        """Cached state of the domain along with the time it was last confirmed, `None` if it is not known."""
+        return self._domain_states.get(uuid)
+
+    def domain_states(self) -> dict[str, DomainStateEntry]:
+        """Snapshot of the cached state table."""
+        return dict(self._domain_states)
+
+    def domain_state_from_code(self, state: int) -> DomainState:
+        return LIBVIRT_DOMAIN_STATES[state]
 
     def domain_event(self, event: int) -> VirDomainEvent:
-        return {
-            libvirt.VIR_DOMAIN_EVENT_DEFINED: VirDomainEvent.DEFINED,
-            libvirt.VIR_DOMAIN_EVENT_UNDEFINED: VirDomainEvent.UNDEFINED,
-            libvirt.VIR_DOMAIN_EVENT_STARTED: VirDomainEvent.STARTED,
-            libvirt.VIR_DOMAIN_EVENT_SUSPENDED: VirDomainEvent.SUSPENDED,
-            libvirt.VIR_DOMAIN_EVENT_RESUMED: VirDomainEvent.RESUMED,
-            libvirt.VIR_DOMAIN_EVENT_STOPPED: VirDomainEvent.STOPPED,
-            libvirt.VIR_DOMAIN_EVENT_SHUTDOWN: VirDomainEvent.SHUTDOWN,
-            libvirt.VIR_DOMAIN_EVENT_PMSUSPENDED: VirDomainEvent.PMSUSPENDED,
-            libvirt.VIR_DOMAIN_EVENT_CRASHED: VirDomainEvent.CRASHED
-        }.get(event, VirDomainEvent.UNKNOWN)
+        return LIBVIRT_DOMAIN_EVENTS.get(event, VirDomainEvent.UNKNOWN)
+
+    def _instrument(self, obj: Any) -> Any:
+        if self.rpc_metrics is None:
+            return obj
+
+        return self.rpc_metrics.wrap(self.uri, obj)
+
+    def _bulk_stats_records(self, flags: int, uuids: list[str] | None) -> list[tuple[Any, dict[str, Any]]]:
+        if uuids is None:
+            return list(self.monitoring_call(
+                "getAllDomainStats", lambda connection: connection.getAllDomainStats(flags, 0),
+            ))
+        if self.monitoring_pool is not None:
+            return self.monitoring_call(
+                "domainListGetStats", lambda connection: self._domain_list_stats(connection, uuids, flags),
+            )
+
+        domains = [unwrap(domain) for uuid in uuids if (domain := self.get_domain(uuid)) is not None]
+        if not domains:
+            return []
+
+        return list(self._retry_if_dead(
+            "domainListGetStats", lambda connection: connection.domainListGetStats(domains, flags, 0),
+        ))
+
+    @staticmethod
+    def _state_records(connection: Any, uuids: list[str] | None = None) -> list[tuple[Any, dict[str, Any]]]:
+        """State group records of the domains (all of them or only `uuids`) from an RPC per domain."""
+        domains = []
+        if uuids is None:
+            domains = connection.listAllDomains(0)
+        else:
+            for uuid in uuids:
+                try:
+                    domains.append(connection.lookupByName(uuid))
+                except libvirt.libvirtError as e:
+                    if not is_no_domain_error(e):
+                        raise
+
+        records = []
+        for domain in domains:
+            try:
+                state, reason = domain.state()
+            except libvirt.libvirtError as e:
+                # Undefined in the meantime
+                if not is_no_domain_error(e):
+                    raise
+                continue
+
+            records.append((domain, {"state.state": state, "state.reason": reason}))
+
+        return records
+
+    @staticmethod
+    def _domain_list_stats(connection: Any, uuids: list[str], flags: int) -> list[tuple[Any, dict[str, Any]]]:
+        domains = []
+        for uuid in uuids:
+            try:
+                domains.append(unwrap(connection.lookupByName(uuid)))
+            except libvirt.libvirtError as e:
+                if not is_no_domain_error(e):
+                    raise
+
+        if not domains:
+            return []
+
+        return list(connection.domainListGetStats(domains, flags, 0))
+
+    def _retry_if_dead(self, operation: str, func: Callable[[Any], T]) -> T:
+        # A libvirt error might mean that the daemon went away since the close callback last told us otherwise.
+        # Only in that case (which `ensure_alive()` confirms with an explicit probe) is the call retried once on a
+        # freshly opened connection.
+        try:
+            return self.call(operation, func, self.connection)
+        except libvirt.libvirtError as e:
+            if is_no_domain_error(e) or self.ensure_alive():
+                raise
+
+        return self.call(operation, func, self.connection)
+
+    def _wait_open(self) -> None:
+        """
+        Open the connection, or wait for the opening already in progress. The opening runs under the RPC guard (as
+        the `open` operation) and without holding `_connection_lock`, so a daemon that hangs while we reconnect
+        costs callers the deadline of `open` and trips the circuit breaker instead of blocking them indefinitely.
+        """
+        with self._connection_lock:
+            if self._connection is not None and self._connection_alive:
+                return
+
+            if (opening := self._opening) is None:
+                opening = self._opening = Future()
+                opener = True
+            else:
+                opener = False
+
+        if opener:
+            try:
+                self.call("open", self._run_open, opening)
+            except BaseException:
+                # Never started because the guard gave up on it while it was queued
+                if opening.cancel():
+                    self._opening_done(opening)
+                raise
+
+            return
+
+        if self.rpc_guard is not None:
+            self.rpc_guard.breaker.before_call()
+
+        timeout = self.rpc_guard.timeout("open") if self.rpc_guard is not None else None
+        try:
+            opening.result(timeout)
+        except (CancelledError, FutureTimeoutError):
+            raise RpcTimeoutError(f"Opening libvirt connection to {self.uri!r} did not complete in time") from None
+
+    def _run_open(self, opening: Future[None]) -> None:
+        if not opening.set_running_or_notify_cancel():
+            return
+
+        try:
+            self._open()
+        except BaseException as e:
+            opening.set_exception(e)
+            raise
+        else:
+            opening.set_result(None)
+        finally:
+            self._opening_done(opening)
+
+    def _opening_done(self, opening: Future[None]) -> None:
+        with self._connection_lock:
+            if self._opening is opening:
+                self._opening = None
 
     def _open(self) -> None:
+        # Only ever run by a single thread at a time, see `_wait_open`
+        if (stale := self._connection) is not None:
+            # Release whatever is left of a connection that the close callback reported dead
+            with contextlib.suppress(libvirt.libvirtError):
+                stale.close()
+
         connection = self.manager.open(self.uri)
 
-        connection.domainEventRegister(self._libvirt_event_callback, None)
+        self._event_callback_ids = [
+            connection.domainEventRegisterAny(
+                None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, self._libvirt_event_callback, None,
+            ),
+        ]
+        registered = list(self._typed_event_callbacks)
+        for event_type in registered:
+            self._register_typed_event(connection, event_type)
+
+        connection.registerCloseCallback(self._libvirt_close_callback, None)
         connection.setKeepAlive(5, 3)
 
-        self._connection = connection
+        self._domains.clear()
+        self.ownership.invalidate()
+        with self._connection_lock:
+            # Subscribed to while the connection was being opened
+            for event_type in self._typed_event_callbacks.keys() - set(registered):
+                self._register_typed_event(connection, event_type)
+
+            self._connection = connection
+            self._connection_alive = True
+
+        self._replay_missed_events(connection)
+
+    def _replay_missed_events(self, connection: Any) -> None:
+        try:
+            try:
+                records = self._instrument(connection).getAllDomainStats(libvirt.VIR_DOMAIN_STATS_STATE, 0)
+            except libvirt.libvirtError as e:
+                # Not every driver implements bulk statistics
+                logger.debug("Bulk statistics unavailable on %r, falling back to domain states: %s", self.uri, e)
+                records = self._state_records(self._instrument(connection))
+        except libvirt.libvirtError as e:
+            logger.warning("Unable to retrieve domain states from %r: %s", self.uri, e)
+            return
+
+        now = time.monotonic()
+        states = {}
+        for domain, record in records:
+            self._domains[domain.name()] = domain
+            states[domain.name()] = DomainStateEntry(self.domain_state_from_code(record["state.state"]), now)
+
+        last_known_states, self._domain_states = self._domain_states, states
+        seeded, self._domain_states_seeded = self._domain_states_seeded, True
+        if not seeded:
+            # First connection, nothing could have been missed
+            return
+
+        missed_events = self._missed_events(
+            {uuid: entry.state for uuid, entry in last_known_states.items()},
+            {uuid: entry.state for uuid, entry in states.items()},
+        )
+        for uuid, event in missed_events:
+            logger.info("Replaying missed %s event for domain %r", event.value, uuid)
+            self._dispatch_domain_event(DomainEvent(event=event, uuid=uuid, replayed=True))
+
+    @staticmethod
+    def _missed_events(
+        old: dict[str, DomainState], new: dict[str, DomainState],
+    ) -> list[tuple[str, VirDomainEvent]]:
+        events = []
+        for uuid, old_state in old.items():
+            was_active = old_state not in INACTIVE_STATES
+            if (new_state := new.get(uuid)) is None:
+                if was_active:
+                    events.append((uuid, VirDomainEvent.STOPPED))
+                events.append((uuid, VirDomainEvent.UNDEFINED))
+                continue
+
+            is_active = new_state not in INACTIVE_STATES
+            if was_active and not is_active:
+                events.append((uuid, VirDomainEvent.STOPPED))
+            elif not was_active and is_active:
+                events.append((uuid, VirDomainEvent.STARTED))
+                if new_state == DomainState.PAUSED:
+                    events.append((uuid, VirDomainEvent.SUSPENDED))
+            elif old_state == DomainState.PAUSED and new_state == DomainState.RUNNING:
+                events.append((uuid, VirDomainEvent.RESUMED))
+            elif old_state == DomainState.RUNNING and new_state == DomainState.PAUSED:
+                events.append((uuid, VirDomainEvent.SUSPENDED))
+
+        for uuid, new_state in new.items():
+            if uuid not in old:
+                events.append((uuid, VirDomainEvent.DEFINED))
+                if new_state not in INACTIVE_STATES:
+                    events.append((uuid, VirDomainEvent.STARTED))
+
+        return events
+
+    def _set_domain_state(self, uuid: str, state: DomainState) -> None:
+        self._domain_states[uuid] = DomainStateEntry(state, time.monotonic())
+
+    def _update_domain_state(self, domain_event: DomainEvent) -> None:
+        match domain_event.event:
+            case VirDomainEvent.UNDEFINED:
+                self._domain_states.pop(domain_event.uuid, None)
+            case VirDomainEvent.DEFINED:
+                if domain_event.uuid not in self._domain_states:
+                    self._set_domain_state(domain_event.uuid, DomainState.SHUTOFF)
+            case VirDomainEvent.STARTED | VirDomainEvent.RESUMED:
+                self._set_domain_state(domain_event.uuid, DomainState.RUNNING)
+            case VirDomainEvent.SUSPENDED:
+                self._set_domain_state(domain_event.uuid, DomainState.PAUSED)
+            case VirDomainEvent.STOPPED:
+                self._set_domain_state(domain_event.uuid, DomainState.SHUTOFF)
+            case VirDomainEvent.SHUTDOWN:
+                self._set_domain_state(domain_event.uuid, DomainState.SHUTDOWN)
+            case VirDomainEvent.PMSUSPENDED:
+                self._set_domain_state(domain_event.uuid, DomainState.PMSUSPENDED)
+            case VirDomainEvent.CRASHED:
+                self._set_domain_state(domain_event.uuid, DomainState.CRASHED)
 
     def _close(self) -> None:
+        self._reconnect_stop.set()
+        connection = self._connection
+        self._connection = None
+        self._connection_alive = False
+        self._domains.clear()
+        if connection is None:
+            return
+
         try:
-            self.connection.close()
+            for callback_id in self._event_callback_ids:
+                connection.domainEventDeregisterAny(callback_id)
+            connection.unregisterCloseCallback()
+            connection.close()
         except libvirt.libvirtError as e:
             raise Error(f"Failed to close libvirt connection: {e}")
 
-        self._connection = None
+    def _mark_dead(self, connection: Any) -> bool:
+        # Only the connection we currently hand out is relevant, a late close notification for a connection that
+        # was already replaced must not invalidate its successor.
+        if connection is self._connection:
+            self._connection_alive = False
+            return True
+
+        return False
+
+    def _libvirt_close_callback(self, conn: Any, reason: int, opaque: Any) -> None:
+        logger.warning("libvirt connection to %r was closed (reason %r)", self.uri, reason)
+        if self._mark_dead(conn) and self.auto_reconnect:
+            self._start_reconnect()
+
+    def _start_reconnect(self) -> None:
+        with self._connection_lock:
+            if self._reconnect_thread is not None and self._reconnect_thread.is_alive():
+                return
+
+            self._reconnect_stop.clear()
+            self._reconnect_thread = threading.Thread(
+                target=self._reconnect_loop, name="libvirt_reconnect", daemon=True,
+            )
+            self._reconnect_thread.start()
+
+    def _reconnect_loop(self) -> None:
+        delay = RECONNECT_INITIAL_DELAY
+        while not self._reconnect_stop.wait(delay):
+            try:
+                self.connection
+            except (Error, libvirt.libvirtError) as e:
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                logger.debug("Failed to reconnect to %r, retrying in %d seconds: %s", self.uri, delay, e)
+            else:
+                logger.info("Reconnected to %r", self.uri)
+                return
 
     def _libvirt_event_callback(self, conn: Any, dom: Any, event: int, detail: int, opaque: Any) -> None:
         domain_event = DomainEvent(uuid=dom.name(), event=self.domain_event(event))
+        domain_event.detail = lifecycle_event_detail(domain_event.event.value, detail)
+        if domain_event.event != VirDomainEvent.UNDEFINED and conn is self._connection:
+            self._domains[domain_event.uuid] = dom
+
+        self._dispatch_domain_event(domain_event)
+
+    def _dispatch_domain_event(self, domain_event: DomainEvent) -> None:
+        if domain_event.event == VirDomainEvent.UNDEFINED:
+            self._domains.pop(domain_event.uuid, None)
+        elif domain_event.event == VirDomainEvent.STOPPED and domain_event.uuid in self._transient_domains:
+            self._transient_domains.discard(domain_event.uuid)
+            self._domains.pop(domain_event.uuid, None)
+
+        self._update_domain_state(domain_event)
+
+        for callback in self._immediate_domain_event_callbacks:
+            try:
+                callback(domain_event)
+            except Exception:
+                logger.error("Unhandled exception in immediate domain event callback %r", callback, exc_info=True)
+
+        # Only bookkeeping happens on the libvirt event loop, callbacks may block (RPCs, unmounts, PCI reattach) and
+        # must not stall keepalives or the delivery of other events.
+        self.manager.event_dispatcher.submit(
+            domain_event.uuid, functools.partial(self._run_domain_event_callbacks, domain_event),
+        )
+
+    def _update_ownership(self, domain_event: DomainEvent) -> None:
+        match domain_event.event:
+            case VirDomainEvent.STARTED:
+                self.ownership.refresh(domain_event.uuid)
+            case VirDomainEvent.DEFINED:
+                self.ownership.refresh(domain_event.uuid, only_if_known=True)
+            case VirDomainEvent.STOPPED | VirDomainEvent.UNDEFINED:
+                self.ownership.release(domain_event.uuid)
+
+    def _register_typed_event(self, connection: Any, event_type: type[Any]) -> None:
+        event_id, factory = typed_event_registrations()[event_type]
+
+        # libvirt invokes the callback with (conn, dom, *event_args, opaque)
+        def callback(conn: Any, dom: Any, *args: Any) -> None:
+            event = factory(dom.name(), *args[:-1])
+            self.manager.event_dispatcher.submit(
+                event.uuid, functools.partial(self._run_typed_event_callbacks, event_type, event),
+            )
+
+        self._event_callback_ids.append(connection.domainEventRegisterAny(None, event_id, callback, None))
+
+    def _run_typed_event_callbacks(self, event_type: type[Any], event: TypedDomainEvent) -> None:
+        for callback in self._typed_event_callbacks.get(event_type, []):
+            try:
+                callback(event)
+            except Exception:
+                logger.error("Unhandled exception in %s callback %r", event_type.__name__, callback, exc_info=True)
+
+    def _run_domain_event_callbacks(self, domain_event: DomainEvent) -> None:
         for callback in self._domain_event_callbacks:
             try:
                 callback(domain_event)
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+from dataclasses import dataclass
+import logging
 import threading
 from typing import Any
 
@@ -7,37 +10,136 @@ import libvirt
 
 from ..error import Error
 from .connection import Connection
+from .event_dispatcher import DEFAULT_EVENT_WORKERS, EventDispatcher, EventDispatcherMetrics
+from .instrumentation import DEFAULT_SLOW_CALL_THRESHOLD, MethodMetrics, RpcMetrics
+from .rpc_guard import RpcGuardConfig
 from .service_delegate import ServiceDelegate
 
+logger = logging.getLogger(__name__)
+
+EVENT_THREAD_JOIN_TIMEOUT = 5
+
+
+@dataclass
+class ConnectionManagerMetrics:
+    # URI -> libvirt method name -> metrics, empty unless instrumentation is enabled
+    rpc: dict[str, dict[str, MethodMetrics]]
+    events: EventDispatcherMetrics
+
 
 class ConnectionManager:
-    def __init__(self, service_delegate: ServiceDelegate):
+    """
+    By default libvirt events are dispatched by a dedicated thread running libvirt's default event loop
+    implementation. When `loop` is given, libvirt's event implementation is registered on that asyncio loop instead
+    (via `libvirtaio`, which ships with libvirt-python).
+
+    The event implementation is process-wide in libvirt, so only one `ConnectionManager` should exist per process.
+
+    Either way, only `immediate` domain event callbacks (see `Connection.register_domain_event_callback`) run on the
+    event loop itself. All other callbacks are handed to `event_dispatcher`, which runs them on `event_workers`
+    threads in per-UUID FIFO order, so the events of each domain are handled in the order they were received.
+
+    With `auto_reconnect`, connections are reopened in the background as soon as libvirtd goes away (see
+    `Connection`). Note that opening a connection goes through `ServiceDelegate.ensure_started`.
+
+    With `rpc_guard_config`, every connection gets its own `RpcGuard` (and so its own circuit breaker) built from it.
+
+    With `monitoring_lanes`, every connection additionally gets that many read-only connections for monitoring
+    traffic (see `Connection`).
+
+    With `instrument`, libvirt calls made through the connections are counted and timed, see `metrics()`. Calls
+    taking longer than `slow_call_threshold` seconds are logged.
+    """
+
+    def __init__(
+        self, service_delegate: ServiceDelegate, loop: asyncio.AbstractEventLoop | None = None,
+        event_workers: int = DEFAULT_EVENT_WORKERS, auto_reconnect: bool = False,
+        rpc_guard_config: RpcGuardConfig | None = None, monitoring_lanes: int = 0, instrument: bool = False,
+        slow_call_threshold: float | None = DEFAULT_SLOW_CALL_THRESHOLD,
+    ):
         self.service_delegate = service_delegate
+        self.auto_reconnect = auto_reconnect
+        self.rpc_guard_config = rpc_guard_config
+        self.monitoring_lanes = monitoring_lanes
+        self.rpc_metrics = RpcMetrics(slow_call_threshold) if instrument else None
         self.connections: list[Connection] = []
+        self.loop = loop
+        self.event_dispatcher = EventDispatcher(event_workers)
+        self._event_thread: threading.Thread | None = None
+        self._event_thread_running = False
+
+        if loop is None:
+            libvirt.virEventRegisterDefaultImpl()
+        else:
+            import libvirtaio
+            libvirtaio.virEventRegisterAsyncIOImpl(loop=loop)
 
-        libvirt.virEventRegisterDefaultImpl()
         libvirt.registerErrorHandler(self._libvirt_error_handler, None)
 
-        event_thread = threading.Thread(target=self._libvirt_event_loop, name='libvirt_event_loop')
-        event_thread.setDaemon(True)
-        event_thread.start()
+        if loop is None:
+            self._event_thread_running = True
+            self._event_thread = threading.Thread(
+                target=self._libvirt_event_loop, name='libvirt_event_loop', daemon=True,
+            )
+            self._event_thread.start()
 
     def create(self, uri: str) -> Connection:
-        connection = Connection(self, uri)
+        connection = Connection(
+            self, uri, auto_reconnect=self.auto_reconnect, rpc_guard_config=self.rpc_guard_config,
+            monitoring_lanes=self.monitoring_lanes, rpc_metrics=self.rpc_metrics,
+        )
         self.connections.append(connection)
         return connection
 
-    def open(self, uri: str) -> Any:
+    def open(self, uri: str, read_only: bool = False) -> Any:
         self.service_delegate.ensure_started()
 
         try:
+            if read_only:
+                return libvirt.openReadOnly(uri)
+
             return libvirt.open(uri)
         except libvirt.libvirtError as e:
             raise Error(f"Failed to open libvirt connection: {e}")
 
+    def metrics(self) -> ConnectionManagerMetrics:
+        return ConnectionManagerMetrics(
+            rpc=self.rpc_metrics.snapshot() if self.rpc_metrics is not None else {},
+            events=self.event_dispatcher.metrics(),
+        )
+
+    def close(self) -> None:
+        """Close all connections and stop the event loop thread (if running in thread mode)."""
+        for connection in self.connections:
+            try:
+                connection._close()
+            except Error as e:
+                logger.warning("Failed to close connection to %r: %s", connection.uri, e)
+
+            if connection.monitoring_pool is not None:
+                connection.monitoring_pool.close()
+            if connection.rpc_guard is not None:
+                connection.rpc_guard.close()
+
+        if self._event_thread is not None:
+            self._event_thread_running = False
+            # `virEventRunDefaultImpl` blocks until there is something to dispatch, so schedule an immediate timeout
+            # to make it return and notice that it should stop.
+            libvirt.virEventAddTimeout(0, self._wakeup_timeout_callback, None)
+            self._event_thread.join(EVENT_THREAD_JOIN_TIMEOUT)
+            if self._event_thread.is_alive():
+                logger.warning("libvirt event loop thread did not stop in %d seconds", EVENT_THREAD_JOIN_TIMEOUT)
+
+            self._event_thread = None
+
+        self.event_dispatcher.close()
+
     def _libvirt_error_handler(self, _: Any, error: Any) -> None:
         pass
 
     def _libvirt_event_loop(self) -> None:
-        while True:
+        while self._event_thread_running:
             libvirt.virEventRunDefaultImpl()
+
+    def _wakeup_timeout_callback(self, timer: int, opaque: Any) -> None:
+        libvirt.virEventRemoveTimeout(timer)
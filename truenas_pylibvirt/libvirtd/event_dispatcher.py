@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENT_WORKERS = 4
+
+
+@dataclass
+class EventDispatcherMetrics:
+    # Events waiting to be handled, excluding the ones being handled right now
+    queued: int
+    # Keys (domain UUIDs) that have an event being handled or waiting
+    active_keys: int
+    # Deepest queue of a single key and most events queued overall since the dispatcher was created
+    max_key_queue_depth: int
+    max_queued: int
+    dispatched: int
+    failed: int
+
+
+class EventDispatcher:
+    """
+    Runs event handlers on a bounded worker pool instead of the libvirt event loop thread.
+
+    Handlers submitted for the same key (domain UUID) run one at a time in submission order; handlers for different
+    keys run concurrently, up to `max_workers` at once. Each worker handles a single event and then requeues the key,
+    so a domain with a long backlog of events cannot starve the others.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_EVENT_WORKERS, name: str = "libvirt_events") -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._queues: dict[str, deque[Callable[[], None]]] = {}
+        self._condition = threading.Condition()
+        self._queued = 0
+        self._max_key_queue_depth = 0
+        self._max_queued = 0
+        self._dispatched = 0
+        self._failed = 0
+
+    def submit(self, key: str, handler: Callable[[], None]) -> None:
+        with self._condition:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+            if (queue := self._queues.get(key)) is not None:
+                # Either being handled or already scheduled, the worker will requeue the key when it is done
+                queue.append(handler)
+                self._max_key_queue_depth = max(self._max_key_queue_depth, len(queue))
+                return
+
+            self._queues[key] = deque([handler])
+            self._max_key_queue_depth = max(self._max_key_queue_depth, 1)
+
+        self._schedule(key)
+
+    def metrics(self) -> EventDispatcherMetrics:
+        with self._condition:
+            return EventDispatcherMetrics(
+                queued=self._queued,
+                active_keys=len(self._queues),
+                max_key_queue_depth=self._max_key_queue_depth,
+                max_queued=self._max_queued,
+                dispatched=self._dispatched,
+                failed=self._failed,
+            )
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until every submitted handler has run. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queues, timeout)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _run(self, key: str) -> None:
+        with self._condition:
+            handler = self._queues[key][0]
+            self._queued -= 1
+
+        failed = False
+        try:
+            handler()
+        except Exception:
+            failed = True
+            logger.error("Unhandled exception in event handler for %r", key, exc_info=True)
+
+        with self._condition:
+            self._dispatched += 1
+            self._failed += failed
+            queue = self._queues[key]
+            queue.popleft()
+            if not queue:
+                del self._queues[key]
+                self._condition.notify_all()
+                return
+
+        self._schedule(key)
+
+    def _schedule(self, key: str) -> None:
+        try:
+            self._executor.submit(self._run, key)
+        except RuntimeError:
+            # The dispatcher was closed, there is nobody left to handle these events
+            with self._condition:
+                if queue := self._queues.pop(key, None):
+                    self._queued -= len(queue)
+                    logger.debug("Dropping %d event(s) for %r, dispatcher is closed", len(queue), key)
+                self._condition.notify_all()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import enum
+from typing import Any, Callable, TypeVar
+
+import libvirt
+
+
+E = TypeVar("E", bound=enum.Enum)
+
+
+class BlockJobType(enum.Enum):
+    PULL = "PULL"
+    COPY = "COPY"
+    COMMIT = "COMMIT"
+    ACTIVE_COMMIT = "ACTIVE_COMMIT"
+    BACKUP = "BACKUP"
+    UNKNOWN = "UNKNOWN"
+
+
+class BlockJobStatus(enum.Enum):
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELED = "CANCELED"
+    READY = "READY"
+    UNKNOWN = "UNKNOWN"
+
+
+class AgentLifecycleState(enum.Enum):
+    CONNECTED = "CONNECTED"
+    DISCONNECTED = "DISCONNECTED"
+    UNKNOWN = "UNKNOWN"
+
+
+class AgentLifecycleReason(enum.Enum):
+    DOMAIN_STARTED = "DOMAIN_STARTED"
+    CHANNEL = "CHANNEL"
+    UNKNOWN = "UNKNOWN"
+
+
+class MemoryFailureRecipient(enum.Enum):
+    HYPERVISOR = "HYPERVISOR"
+    GUEST = "GUEST"
+    UNKNOWN = "UNKNOWN"
+
+
+class MemoryFailureAction(enum.Enum):
+    IGNORE = "IGNORE"
+    INJECT = "INJECT"
+    FATAL = "FATAL"
+    RESET = "RESET"
+    UNKNOWN = "UNKNOWN"
+
+
+@dataclass
+class RebootEvent:
+    uuid: str
+
+
+@dataclass
+class BalloonChangeEvent:
+    uuid: str
+    # Current balloon size in KiB
+    actual: int
+
+
+@dataclass
+class BlockJobEvent:
+    uuid: str
+    # Target device name (e.g. `vda`)
+    disk: str
+    job_type: BlockJobType
+    status: BlockJobStatus
+
+
+@dataclass
+class DeviceRemovedEvent:
+    uuid: str
+    alias: str
+
+
+@dataclass
+class AgentLifecycleEvent:
+    uuid: str
+    state: AgentLifecycleState
+    reason: AgentLifecycleReason
+
+
+@dataclass
+class JobCompletedEvent:
+    uuid: str
+    stats: dict[str, Any]
+
+
+@dataclass
+class MemoryFailureEvent:
+    uuid: str
+    recipient: MemoryFailureRecipient
+    action: MemoryFailureAction
+    action_required: bool
+    recursive: bool
+
+
+TypedDomainEvent = (
+    RebootEvent | BalloonChangeEvent | BlockJobEvent | DeviceRemovedEvent | AgentLifecycleEvent | JobCompletedEvent |
+    MemoryFailureEvent
+)
+
+# Possible `detail` values of each lifecycle event, by the suffix of their libvirt constant name
+# (`VIR_DOMAIN_EVENT_<EVENT>_<DETAIL>`)
+LIFECYCLE_EVENT_DETAILS = {
+    "DEFINED": ("ADDED", "UPDATED", "RENAMED", "FROM_SNAPSHOT"),
+    "UNDEFINED": ("REMOVED", "RENAMED"),
+    "STARTED": ("BOOTED", "MIGRATED", "RESTORED", "FROM_SNAPSHOT", "WAKEUP"),
+    "SUSPENDED": (
+        "PAUSED", "MIGRATED", "IOERROR", "WATCHDOG", "RESTORED", "FROM_SNAPSHOT", "API_ERROR", "POSTCOPY",
+        "POSTCOPY_FAILED",
+    ),
+    "RESUMED": ("UNPAUSED", "MIGRATED", "FROM_SNAPSHOT", "POSTCOPY", "POSTCOPY_FAILED"),
+    "STOPPED": ("SHUTDOWN", "DESTROYED", "CRASHED", "MIGRATED", "SAVED", "FAILED", "FROM_SNAPSHOT"),
+    "SHUTDOWN": ("FINISHED", "GUEST", "HOST"),
+    "PMSUSPENDED": ("MEMORY", "DISK"),
+    "CRASHED": ("PANICKED", "CRASHLOADED"),
+}
+
+
+def lifecycle_event_detail(event: str, detail: int) -> str:
+    """Decode the `detail` code of a lifecycle event into its name, e.g. `DESTROYED` for a STOPPED event."""
+    for name in LIFECYCLE_EVENT_DETAILS.get(event, ()):
+        # Constants introduced by newer libvirt versions might be missing
+        if getattr(libvirt, f"VIR_DOMAIN_EVENT_{event}_{name}", None) == detail:
+            return name
+
+    return "UNKNOWN"
+
+
+def _decode(enum_class: type[E], prefix: str, value: int) -> E:
+    for member in enum_class:
+        if member.value != "UNKNOWN" and getattr(libvirt, f"{prefix}{member.value}", None) == value:
+            return member
+
+    return enum_class["UNKNOWN"]
+
+
+def _memory_failure_event(uuid: str, recipient: int, action: int, flags: int) -> MemoryFailureEvent:
+    return MemoryFailureEvent(
+        uuid=uuid,
+        recipient=_decode(MemoryFailureRecipient, "VIR_DOMAIN_EVENT_MEMORY_FAILURE_RECIPIENT_", recipient),
+        action=_decode(MemoryFailureAction, "VIR_DOMAIN_EVENT_MEMORY_FAILURE_ACTION_", action),
+        action_required=bool(flags & getattr(libvirt, "VIR_DOMAIN_MEMORY_FAILURE_ACTION_REQUIRED", 0)),
+        recursive=bool(flags & getattr(libvirt, "VIR_DOMAIN_MEMORY_FAILURE_RECURSIVE", 0)),
+    )
+
+
+def typed_event_registrations() -> dict[type[Any], tuple[int, Callable[..., TypedDomainEvent]]]:
+    """
+    libvirt event ID and a factory building the typed event from the UUID and the event-specific callback arguments
+    for every supported typed event.
+    """
+    return {
+        RebootEvent: (libvirt.VIR_DOMAIN_EVENT_ID_REBOOT, RebootEvent),
+        BalloonChangeEvent: (libvirt.VIR_DOMAIN_EVENT_ID_BALLOON_CHANGE, BalloonChangeEvent),
+        BlockJobEvent: (
+            libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB_2,
+            lambda uuid, disk, job_type, status: BlockJobEvent(
+                uuid=uuid,
+                disk=disk,
+                job_type=_decode(BlockJobType, "VIR_DOMAIN_BLOCK_JOB_TYPE_", job_type),
+                status=_decode(BlockJobStatus, "VIR_DOMAIN_BLOCK_JOB_", status),
+            ),
+        ),
+        DeviceRemovedEvent: (libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED, DeviceRemovedEvent),
+        AgentLifecycleEvent: (
+            libvirt.VIR_DOMAIN_EVENT_ID_AGENT_LIFECYCLE,
+            lambda uuid, state, reason: AgentLifecycleEvent(
+                uuid=uuid,
+                state=_decode(AgentLifecycleState, "VIR_CONNECT_DOMAIN_EVENT_AGENT_LIFECYCLE_STATE_", state),
+                reason=_decode(AgentLifecycleReason, "VIR_CONNECT_DOMAIN_EVENT_AGENT_LIFECYCLE_REASON_", reason),
+            ),
+        ),
+        JobCompletedEvent: (libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED, JobCompletedEvent),
+        MemoryFailureEvent: (libvirt.VIR_DOMAIN_EVENT_ID_MEMORY_FAILURE, _memory_failure_event),
+    }
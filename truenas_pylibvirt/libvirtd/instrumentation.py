@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass, field
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+import libvirt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_CALL_THRESHOLD = 1.0
+# Upper bounds (in seconds) of the latency histogram buckets, calls slower than the last bound are counted in an
+# additional overflow bucket
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+# Methods answered from data libvirt-python already holds, without an RPC
+LOCAL_METHODS = frozenset({"name", "UUID", "UUIDString", "connect"})
+
+
+@dataclass
+class MethodMetrics:
+    calls: int = 0
+    errors: int = 0
+    # Seconds
+    total_time: float = 0.0
+    max_time: float = 0.0
+    # Count of calls per `LATENCY_BUCKETS` entry, plus the overflow bucket
+    histogram: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def observe(self, duration: float, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+
+class RpcMetrics:
+    """
+    Call counts, error counts and latency histograms of libvirt methods, per URI and method name
+    (e.g. `virDomain.create`). Calls slower than `slow_call_threshold` seconds are logged.
+    """
+
+    def __init__(self, slow_call_threshold: float | None = DEFAULT_SLOW_CALL_THRESHOLD) -> None:
+        self.slow_call_threshold = slow_call_threshold
+        self._lock = threading.Lock()
+        self._metrics: dict[str, dict[str, MethodMetrics]] = {}
+
+    def timed(self, uri: str, method: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        failed = True
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+        finally:
+            self.record(uri, method, time.monotonic() - start, failed)
+
+        return self.wrap(uri, result)
+
+    def record(self, uri: str, method: str, duration: float, failed: bool) -> None:
+        with self._lock:
+            uri_metrics = self._metrics.setdefault(uri, {})
+            if (method_metrics := uri_metrics.get(method)) is None:
+                method_metrics = uri_metrics[method] = MethodMetrics()
+
+            method_metrics.observe(duration, failed)
+
+        if self.slow_call_threshold is not None and duration >= self.slow_call_threshold:
+            logger.warning("Slow libvirt call: %s on %r took %.3f seconds", method, uri, duration)
+
+    def snapshot(self) -> dict[str, dict[str, MethodMetrics]]:
+        with self._lock:
+            return {
+                uri: {
+                    method: MethodMetrics(
+                        metrics.calls, metrics.errors, metrics.total_time, metrics.max_time, list(metrics.histogram),
+                    )
+                    for method, metrics in uri_metrics.items()
+                }
+                for uri, uri_metrics in self._metrics.items()
+            }
+
+    def wrap(self, uri: str, obj: Any) -> Any:
+        """Wrap `virConnect` and `virDomain` objects (also inside lists) so that their method calls are recorded."""
+        if isinstance(obj, libvirt.virDomain):
+            return InstrumentedProxy(obj, uri, self, "virDomain")
+        if isinstance(obj, libvirt.virConnect):
+            return InstrumentedProxy(obj, uri, self, "virConnect")
+        if isinstance(obj, list):
+            return [self.wrap(uri, item) for item in obj]
+
+        return obj
+
+
+class InstrumentedProxy:
+    """
+    Forwards attribute access to a libvirt object, timing method calls.
+
+    libvirt-python functions that take libvirt objects as arguments (`domainListGetStats`, `qemuAgentCommand`)
+    type-check them, so the wrapped object must be passed to those (see `unwrap`).
+    """
+
+    __slots__ = ("_target", "_uri", "_metrics", "_prefix")
+
+    def __init__(self, target: Any, uri: str, metrics: RpcMetrics, prefix: str) -> None:
+        self._target = target
+        self._uri = uri
+        self._metrics = metrics
+        self._prefix = prefix
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr) or name in LOCAL_METHODS:
+            return attr
+
+        return functools.partial(self._metrics.timed, self._uri, f"{self._prefix}.{name}", attr)
+
+    def __repr__(self) -> str:
+        return f"<Instrumented {self._target!r}>"
+
+
+def unwrap(obj: Any) -> Any:
+    if isinstance(obj, InstrumentedProxy):
+        return obj._target
+
+    return obj
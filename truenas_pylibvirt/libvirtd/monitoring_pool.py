@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import queue
+from typing import Any, Iterator, TYPE_CHECKING
+
+import libvirt
+
+if TYPE_CHECKING:
+    from .connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class MonitoringLane:
+    """
+    A read-only `virConnect` used for monitoring traffic. Opened lazily and reopened after libvirt reports it closed.
+    No events are registered on it, those are delivered through the control connection only.
+    """
+
+    def __init__(self, manager: ConnectionManager, uri: str) -> None:
+        self.manager = manager
+        self.uri = uri
+        self._connection: Any = None
+        self._connection_alive = False
+
+    @property
+    def connection(self) -> Any:
+        if self._connection is None or not self._connection_alive:
+            if (stale := self._connection) is not None:
+                with contextlib.suppress(libvirt.libvirtError):
+                    stale.close()
+
+            connection = self.manager.open(self.uri, read_only=True)
+            connection.registerCloseCallback(self._libvirt_close_callback, None)
+            connection.setKeepAlive(5, 3)
+            self._connection = connection
+            self._connection_alive = True
+
+        return self._connection
+
+    def ensure_alive(self) -> bool:
+        connection = self._connection
+        if connection is None or not self._connection_alive:
+            return False
+
+        try:
+            alive = bool(connection.isAlive()) and connection.getLibVersion() > 0
+        except libvirt.libvirtError:
+            alive = False
+
+        if not alive and connection is self._connection:
+            self._connection_alive = False
+
+        return alive
+
+    def close(self) -> None:
+        connection, self._connection = self._connection, None
+        self._connection_alive = False
+        if connection is not None:
+            with contextlib.suppress(libvirt.libvirtError):
+                connection.unregisterCloseCallback()
+                connection.close()
+
+    def _libvirt_close_callback(self, conn: Any, reason: int, opaque: Any) -> None:
+        logger.debug("Read-only libvirt connection to %r was closed (reason %r)", self.uri, reason)
+        if conn is self._connection:
+            self._connection_alive = False
+
+
+class MonitoringPool:
+    """
+    A fixed number of read-only lanes to a libvirt URI. Each lane serves one caller at a time, so monitoring
+    calls (bulk statistics, XML dumps) neither queue behind lifecycle operations on the control connection nor
+    behind each other beyond the pool size.
+    """
+
+    def __init__(self, manager: ConnectionManager, uri: str, size: int) -> None:
+        self.lanes = [MonitoringLane(manager, uri) for _ in range(size)]
+        self._idle: queue.SimpleQueue[MonitoringLane] = queue.SimpleQueue()
+        for lane in self.lanes:
+            self._idle.put(lane)
+
+    @contextlib.contextmanager
+    def lane(self) -> Iterator[MonitoringLane]:
+        lane = self._idle.get()
+        try:
+            yield lane
+        finally:
+            self._idle.put(lane)
+
+    def close(self) -> None:
+        for lane in self.lanes:
+            lane.close()
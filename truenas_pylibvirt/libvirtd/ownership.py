@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import enum
+import logging
+import threading
+from typing import Any, Iterable, TYPE_CHECKING
+from xml.etree import ElementTree
+
+import libvirt
+
+from ..error import Error
+
+if TYPE_CHECKING:
+    from .connection import Connection
+
+logger = logging.getLogger(__name__)
+
+
+class OwnershipKind(enum.Enum):
+    PCI = "PCI"
+    # vendor:product
+    USB = "USB"
+    # libvirt device address of a USB device
+    USB_DEVICE = "USB_DEVICE"
+
+
+OwnershipKey = tuple[OwnershipKind, str]
+
+
+def pci_key(domain: str | None, bus: str | None, slot: str | None, function: str | None) -> OwnershipKey:
+    """Key of a PCI address, with the components formatted as in libvirt domain XML (e.g. `0x01`)."""
+    return OwnershipKind.PCI, f"{domain}:{bus}:{slot}.{function}"
+
+
+def domain_xml_ownership_keys(root: ElementTree.Element) -> set[OwnershipKey]:
+    """Host resources claimed by the devices of a domain XML."""
+    keys = set()
+    for hostdev in root.findall(".//devices/hostdev[@type='pci']"):
+        if (address := hostdev.find(".//source/address")) is not None:
+            keys.add(pci_key(address.get("domain"), address.get("bus"), address.get("slot"), address.get("function")))
+
+    for hostdev in root.findall(".//devices/hostdev[@type='usb']"):
+        vendor = hostdev.find(".//source/vendor")
+        product = hostdev.find(".//source/product")
+        if vendor is not None and product is not None:
+            keys.add((OwnershipKind.USB, f"{vendor.get('id')}:{product.get('id')}"))
+
+        address = hostdev.find(".//source/address")
+        if address is not None and (device := address.get("device")):
+            keys.add((OwnershipKind.USB_DEVICE, device))
+
+    return keys
+
+
+class OwnershipIndex:
+    """
+    Maps host resources used by the active domains of a connection (PCI addresses and USB devices) to the domains
+    using them, so that exclusivity checks are dictionary lookups instead of an `XMLDesc` scan of every domain.
+
+    Built from a single pass over the active domains on first use (and again after a reconnect), then kept current
+    by `Connection` from lifecycle events: started and redefined domains are re-read, stopped domains are dropped.
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        self.connection = connection
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # key -> {UUID: name} of the domains using it
+        self._owners: dict[OwnershipKey, dict[str, str]] = {}
+        self._keys: dict[str, set[OwnershipKey]] = {}
+        self._built = False
+        self._building = False
+        # UUIDs updated from events while the index was being built, those take precedence over the build results
+        self._touched: set[str] = set()
+
+    def owner(self, keys: Iterable[OwnershipKey], exclude_uuid: str | None = None) -> str | None:
+        """Name of an active domain other than `exclude_uuid` using any of `keys`, `None` if there is none."""
+        self._ensure_built()
+        with self._lock:
+            for key in keys:
+                for uuid, name in self._owners.get(key, {}).items():
+                    if uuid != exclude_uuid:
+                        return name
+
+        return None
+
+    def claim(self, uuid: str, keys: Iterable[OwnershipKey], name: str | None = None) -> None:
+        """Record the resources of a domain that was just started, ahead of its STARTED event."""
+        with self._lock:
+            self._set(uuid, name or uuid, set(keys))
+
+    def release(self, uuid: str) -> None:
+        with self._lock:
+            self._touched.add(uuid)
+            self._set(uuid, uuid, set())
+
+    def refresh(self, uuid: str, only_if_known: bool = False) -> None:
+        """Re-read the resources of the domain from its live XML."""
+        with self._lock:
+            if not (self._built or self._building) or (only_if_known and uuid not in self._keys):
+                return
+
+            self._touched.add(uuid)
+
+        try:
+            xml = self.connection.domain_xml(uuid)
+        except (Error, libvirt.libvirtError) as e:
+            logger.warning("Failed to refresh device ownership of domain %r: %s", uuid, e)
+            return
+
+        keys = domain_xml_ownership_keys(ElementTree.fromstring(xml)) if xml is not None else set()
+        with self._lock:
+            self._set(uuid, uuid, keys)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built = False
+            self._owners.clear()
+            self._keys.clear()
+
+    def _ensure_built(self) -> None:
+        if self._built:
+            return
+
+        with self._build_lock:
+            if self._built:
+                return
+
+            with self._lock:
+                self._building = True
+                self._touched.clear()
+
+            try:
+                domains = self.connection.monitoring_call("XMLDesc", self._collect)
+            finally:
+                with self._lock:
+                    self._building = False
+
+            with self._lock:
+                for uuid, (name, keys) in domains.items():
+                    if uuid not in self._touched:
+                        self._set(uuid, name, keys)
+
+                self._touched.clear()
+                self._built = True
+
+    @staticmethod
+    def _collect(libvirt_connection: Any) -> dict[str, tuple[str, set[OwnershipKey]]]:
+        domains = {}
+        for domain in libvirt_connection.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE):
+            try:
+                xml = domain.XMLDesc()
+            except libvirt.libvirtError as e:
+                # Stopped in the meantime
+                logger.debug("Failed to retrieve XML of domain %r: %s", domain.name(), e)
+                continue
+
+            domains[domain.UUIDString()] = domain.name(), domain_xml_ownership_keys(ElementTree.fromstring(xml))
+
+        return domains
+
+    def _set(self, uuid: str, name: str, keys: set[OwnershipKey]) -> None:
+        for key in self._keys.pop(uuid, set()) - keys:
+            if owners := self._owners.get(key):
+                owners.pop(uuid, None)
+                if not owners:
+                    del self._owners[key]
+
+        if keys:
+            self._keys[uuid] = keys
+            for key in keys:
+                self._owners.setdefault(key, {})[uuid] = name
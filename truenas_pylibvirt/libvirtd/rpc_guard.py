@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+import enum
+import logging
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+from ..error import CircuitOpenError, RpcTimeoutError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Deadlines in seconds, keyed by the name of the libvirt method. Starting a domain or undefining it may legitimately
+# take a while (large guests, NVRAM handling), everything else should come back quickly from a healthy daemon.
+DEFAULT_RPC_TIMEOUTS: dict[str, float | None] = {
+    # Opening the control connection, which on a reconnect includes the event registrations and a state listing
+    "open": 60.0,
+    "attachDeviceFlags": 60.0,
+    "create": 120.0,
+    "createXML": 120.0,
+    "defineXML": 60.0,
+    "destroy": 60.0,
+    "detachDeviceFlags": 60.0,
+    # Rebinding PCI devices between host drivers and vfio-pci
+    "dettach": 60.0,
+    "reAttach": 60.0,
+    "undefine": 60.0,
+    "undefineFlags": 60.0,
+    "XMLDesc": 30.0,
+}
+DEFAULT_RPC_TIMEOUT = 30.0
+
+
+class CircuitState(enum.Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+@dataclass
+class RpcGuardConfig:
+    # Per-operation deadlines, operations missing here use `default_timeout`. `None` disables the deadline.
+    timeouts: dict[str, float | None] = field(default_factory=lambda: dict(DEFAULT_RPC_TIMEOUTS))
+    default_timeout: float | None = DEFAULT_RPC_TIMEOUT
+    # Threads running guarded calls. A call that hangs keeps its thread until libvirtd answers, so this also bounds
+    # how many threads a stuck daemon can hold.
+    max_workers: int = 8
+    # Consecutive timeouts after which the circuit opens
+    failure_threshold: int = 3
+    # Delay before the first probe of an open circuit, doubled after every failed probe up to `max_reset_timeout`
+    reset_timeout: float = 1.0
+    max_reset_timeout: float = 60.0
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast once `failure_threshold` consecutive calls timed out.
+
+    After `reset_timeout` seconds the circuit becomes half-open and lets a single probe call through: if it
+    succeeds the circuit closes, otherwise it opens again with a doubled delay.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._delay = reset_timeout
+        self._retry_at = 0.0
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            match self._state:
+                case CircuitState.CLOSED:
+                    return
+                case CircuitState.OPEN if time.monotonic() >= self._retry_at:
+                    self._state = CircuitState.HALF_OPEN
+                    return
+
+            raise CircuitOpenError(
+                "libvirt is not responding, failing fast "
+                f"(next attempt in {max(self._retry_at - time.monotonic(), 0):.1f} seconds)"
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info("libvirt is responding again, closing the circuit")
+
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._delay = self.reset_timeout
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitState.HALF_OPEN:
+                self._delay = min(self._delay * 2, self.max_reset_timeout)
+            elif self._failures < self.failure_threshold:
+                return
+
+            if self._state != CircuitState.OPEN:
+                logger.warning("libvirt did not respond to %d call(s), opening the circuit", self._failures)
+
+            self._state = CircuitState.OPEN
+            self._retry_at = time.monotonic() + self._delay
+
+
+class RpcGuard:
+    """
+    Runs libvirt calls on a dedicated worker pool and gives up waiting for them after a per-operation deadline.
+
+    libvirt RPCs cannot be interrupted, so a timed out call keeps running on its worker; the caller however gets an
+    `RpcTimeoutError` instead of blocking indefinitely on a hung daemon. Repeated timeouts open a circuit breaker,
+    after which calls fail with `CircuitOpenError` without touching libvirt until a probe call succeeds.
+
+    Only timeouts count as failures: a libvirt error means that the daemon did answer.
+    """
+
+    def __init__(self, config: RpcGuardConfig | None = None, name: str = "libvirt_rpc") -> None:
+        self.config = config or RpcGuardConfig()
+        self.breaker = CircuitBreaker(
+            self.config.failure_threshold, self.config.reset_timeout, self.config.max_reset_timeout,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers, thread_name_prefix=name)
+
+    def timeout(self, operation: str) -> float | None:
+        return self.config.timeouts.get(operation, self.config.default_timeout)
+
+    def call(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        self.breaker.before_call()
+
+        if (timeout := self.timeout(operation)) is None:
+            try:
+                return func(*args)
+            finally:
+                self.breaker.record_success()
+
+        future = self._executor.submit(func, *args)
+        try:
+            result = future.result(timeout)
+        except FutureTimeoutError:
+            # Still queued if every worker is held by a hung call, in that case it will not run at all
+            future.cancel()
+            self.breaker.record_timeout()
+            raise RpcTimeoutError(f"libvirt {operation} call did not complete in {timeout} seconds") from None
+        except BaseException:
+            self.breaker.record_success()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    def close(self) -> None:
+        # Hung calls cannot be interrupted, do not wait for them
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import enum
+from typing import Any, Callable, TYPE_CHECKING
+from xml.etree import ElementTree
+
+import libvirt
+
+if TYPE_CHECKING:
+    from ..device.base import Device
+    from .connection import DomainState
+
+
+class DomainStatsGroup(enum.Enum):
+    STATE = "STATE"
+    BALLOON = "BALLOON"
+    VCPU = "VCPU"
+    BLOCK = "BLOCK"
+    INTERFACE = "INTERFACE"
+
+
+DEFAULT_STATS_GROUPS = frozenset(DomainStatsGroup)
+
+
+def libvirt_stats_flags(groups: frozenset[DomainStatsGroup] | set[DomainStatsGroup]) -> int:
+    mapping = {
+        DomainStatsGroup.STATE: libvirt.VIR_DOMAIN_STATS_STATE,
+        DomainStatsGroup.BALLOON: libvirt.VIR_DOMAIN_STATS_BALLOON,
+        DomainStatsGroup.VCPU: libvirt.VIR_DOMAIN_STATS_VCPU,
+        DomainStatsGroup.BLOCK: libvirt.VIR_DOMAIN_STATS_BLOCK,
+        DomainStatsGroup.INTERFACE: libvirt.VIR_DOMAIN_STATS_INTERFACE,
+    }
+    flags = 0
+    for group in groups:
+        flags |= mapping[group]
+
+    return flags
+
+
+@dataclass
+class BalloonStats:
+    # All values are in KiB, as reported by libvirt
+    current: int
+    maximum: int
+    rss: int | None = None
+    available: int | None = None
+    usable: int | None = None
+    unused: int | None = None
+
+
+@dataclass
+class VcpuStats:
+    current: int
+    maximum: int
+    # Per-vCPU cumulative time in nanoseconds, indexed by vCPU number
+    times: dict[int, int] = field(default_factory=dict)
+
+
+@dataclass
+class BlockStats:
+    name: str
+    path: str | None
+    rd_reqs: int = 0
+    rd_bytes: int = 0
+    wr_reqs: int = 0
+    wr_bytes: int = 0
+    errors: int = 0
+    allocation: int | None = None
+    capacity: int | None = None
+    physical: int | None = None
+
+
+@dataclass
+class InterfaceStats:
+    name: str
+    rx_bytes: int = 0
+    rx_pkts: int = 0
+    rx_errs: int = 0
+    rx_drop: int = 0
+    tx_bytes: int = 0
+    tx_pkts: int = 0
+    tx_errs: int = 0
+    tx_drop: int = 0
+
+
+@dataclass
+class DomainStats:
+    uuid: str
+    state: DomainState | None = None
+    balloon: BalloonStats | None = None
+    vcpu: VcpuStats | None = None
+    block: list[BlockStats] = field(default_factory=list)
+    interfaces: list[InterfaceStats] = field(default_factory=list)
+
+    @property
+    def memory_usage(self) -> int | None:
+        """Memory usage in bytes, same as `Connection.domain_memory_usage` reports."""
+        if self.balloon is None:
+            return None
+
+        return self.balloon.current * 1024
+
+    def device_stats(
+        self, devices: list[Device], domain_xml: str | None,
+    ) -> list[tuple[Device, BlockStats | InterfaceStats]]:
+        """
+        Match block and interface entries to the devices the domain was generated from.
+
+        Block entries are matched by source path against the `path` of storage and CD-ROM devices. Interface entries
+        only carry the host-side tap name, which is resolved through the live `domain_xml` (see
+        `Connection.domain_xml`) to the MAC address and source of the interface. NICs are matched by MAC address, and
+        NICs without a configured MAC by source if no other such NIC shares it. Entries that cannot be matched
+        unambiguously are omitted.
+        """
+        # Imported lazily so that using a connection does not pull in device dependencies (netlink, udev)
+        from ..device.cdrom import CDROMDevice
+        from ..device.nic import NICDevice
+        from ..device.storage import BaseStorageDevice
+
+        result: list[tuple[Device, BlockStats | InterfaceStats]] = []
+
+        block_by_path = {block.path: block for block in self.block if block.path}
+        for device in devices:
+            if isinstance(device, (BaseStorageDevice, CDROMDevice)) and (block := block_by_path.get(device.path)):
+                result.append((device, block))
+
+        if domain_xml is None:
+            return result
+
+        # tap name -> (MAC address, source) of the interface
+        targets: dict[str, tuple[str, str | None]] = {}
+        for element in ElementTree.fromstring(domain_xml).findall("devices/interface"):
+            target = element.find("target")
+            mac = element.find("mac")
+            source = element.find("source")
+            if target is not None and (dev := target.get("dev")):
+                targets[dev] = (
+                    (mac.get("address") or "").lower() if mac is not None else "",
+                    (source.get("bridge") or source.get("dev")) if source is not None else None,
+                )
+
+        nics = [device for device in devices if isinstance(device, NICDevice)]
+        nics_by_mac = {nic.mac.lower(): nic for nic in nics if nic.mac}
+        nics_by_source: dict[str, list[NICDevice]] = {}
+        for nic in nics:
+            if not nic.mac:
+                nics_by_source.setdefault(nic.identity(), []).append(nic)
+
+        for interface in self.interfaces:
+            if interface.name not in targets:
+                continue
+
+            address, source_name = targets[interface.name]
+            if matched := nics_by_mac.get(address):
+                result.append((matched, interface))
+            elif source_name is not None and len(candidates := nics_by_source.get(source_name, [])) == 1:
+                result.append((candidates[0], interface))
+
+        return result
+
+    @classmethod
+    def from_libvirt(
+        cls, uuid: str, record: dict[str, Any], domain_state: Callable[[int], DomainState],
+    ) -> DomainStats:
+        stats = cls(uuid=uuid)
+
+        if "state.state" in record:
+            stats.state = domain_state(record["state.state"])
+
+        if "balloon.current" in record:
+            stats.balloon = BalloonStats(
+                current=record["balloon.current"],
+                maximum=record.get("balloon.maximum", record["balloon.current"]),
+                rss=record.get("balloon.rss"),
+                available=record.get("balloon.available"),
+                usable=record.get("balloon.usable"),
+                unused=record.get("balloon.unused"),
+            )
+
+        if "vcpu.current" in record:
+            stats.vcpu = VcpuStats(
+                current=record["vcpu.current"],
+                maximum=record.get("vcpu.maximum", record["vcpu.current"]),
+                times={
+                    i: record[f"vcpu.{i}.time"]
+                    for i in range(record.get("vcpu.maximum", record["vcpu.current"]))
+                    if f"vcpu.{i}.time" in record
+                },
+            )
+
+        for i in range(record.get("block.count", 0)):
+            prefix = f"block.{i}."
+            stats.block.append(BlockStats(
+                name=record.get(f"{prefix}name", ""),
+                path=record.get(f"{prefix}path"),
+                rd_reqs=record.get(f"{prefix}rd.reqs", 0),
+                rd_bytes=record.get(f"{prefix}rd.bytes", 0),
+                wr_reqs=record.get(f"{prefix}wr.reqs", 0),
+                wr_bytes=record.get(f"{prefix}wr.bytes", 0),
+                errors=record.get(f"{prefix}errors", 0),
+                allocation=record.get(f"{prefix}allocation"),
+                capacity=record.get(f"{prefix}capacity"),
+                physical=record.get(f"{prefix}physical"),
+            ))
+
+        for i in range(record.get("net.count", 0)):
+            prefix = f"net.{i}."
+            stats.interfaces.append(InterfaceStats(
+                name=record.get(f"{prefix}name", ""),
+                rx_bytes=record.get(f"{prefix}rx.bytes", 0),
+                rx_pkts=record.get(f"{prefix}rx.pkts", 0),
+                rx_errs=record.get(f"{prefix}rx.errs", 0),
+                rx_drop=record.get(f"{prefix}rx.drop", 0),
+                tx_bytes=record.get(f"{prefix}tx.bytes", 0),
+                tx_pkts=record.get(f"{prefix}tx.pkts", 0),
+                tx_errs=record.get(f"{prefix}tx.errs", 0),
+                tx_drop=record.get(f"{prefix}tx.drop", 0),
+            ))
+
+        return stats
@@ -189,6 +189,13 @@ def get_iommu_groups_info(
 ) -> dict[str, dict[str, Any]]:
     addresses = collections.defaultdict(list)
     final = dict()
+    device_to_class: dict[str, int] = {}
+    bus_to_devices: dict[tuple[int, int], list[str]] = {}
+    if get_critical_info:
+        # Build efficient caches upfront, once for all devices
+        device_to_class, bus_to_devices = (
+            pci_build_cache if pci_build_cache is not None else build_pci_device_cache()
+        )
     with contextlib.suppress(FileNotFoundError):
         # First pass: collect all devices and their classes
         for i in pathlib.Path('/sys/kernel/iommu_groups').glob('*/devices/*'):
@@ -208,8 +215,6 @@ def get_iommu_groups_info(
                 'addresses': addresses[iommu_group],
             }
             if get_critical_info:
-                # Build efficient caches upfront if we need critical info
-                device_to_class, bus_to_devices = pci_build_cache if pci_build_cache else build_pci_device_cache()
                 # Get device class from cache
                 class_code = device_to_class.get(i.name, 0)
                 class_id = (class_code >> 8) & 0xFFFF  # Extract 16-bit class ID
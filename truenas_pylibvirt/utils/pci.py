@@ -105,9 +105,12 @@ def get_all_pci_devices_details() -> dict[str, dict[str, Any]]:
     return result
 
 
-def get_single_pci_device_details(device: str) -> dict[str, dict[str, Any]]:
+def get_single_pci_device_details(
+    device: str, iommu_info: dict[str, dict[str, Any]] | None = None,
+) -> dict[str, dict[str, Any]]:
     result = dict()
-    iommu_info = get_iommu_groups_info(get_critical_info=True)
+    if iommu_info is None:
+        iommu_info = get_iommu_groups_info(get_critical_info=True)
     for i in filter(
         lambda x: x.sys_name == RE_DEVICE_PATH.sub(r'\1:\2:\3.\4', device),
         Context().list_devices(subsystem='pci')
@@ -1,5 +1,5 @@
 import re
-from typing import Any
+from typing import Any, Iterable
 
 from pyudev import Context, Device as UdevDevice
 
@@ -95,12 +95,20 @@ def get_usb_device_details(udev_device: UdevDevice) -> dict[str, Any]:
     return data
 
 
-def find_usb_device_by_libvirt_name(device_name: str) -> dict[str, Any]:
+def list_usb_devices() -> list[UdevDevice]:
+    """Enumerate the USB devices (not their interfaces) known to udev."""
+    return list(Context().list_devices(subsystem='usb', DEVTYPE='usb_device'))
+
+
+def find_usb_device_by_libvirt_name(
+    device_name: str, usb_devices: Iterable[UdevDevice] | None = None,
+) -> dict[str, Any]:
     """
     Find USB device by libvirt device name (e.g., usb_1_2).
 
     Args:
         device_name: Libvirt device name like "usb_1_2"
+        usb_devices: Result of `list_usb_devices()` to search instead of enumerating udev
 
     Returns:
         Device details dict or dict with error
@@ -118,9 +126,8 @@ def find_usb_device_by_libvirt_name(device_name: str) -> dict[str, Any]:
     # Convert to string format with leading zeros if needed
     target_bus = target_bus.lstrip('0') or '0'
 
-    context = Context()
     # Look for USB devices matching the bus and device number
-    for device in context.list_devices(subsystem='usb', DEVTYPE='usb_device'):
+    for device in list_usb_devices() if usb_devices is None else usb_devices:
         props = device.properties
 
         # Get bus and device numbers
@@ -137,25 +144,26 @@ def find_usb_device_by_libvirt_name(device_name: str) -> dict[str, Any]:
     }
 
 
-def find_usb_device_by_ids(vendor_id: str, product_id: str) -> str | None:
+def find_usb_device_by_ids(
+    vendor_id: str, product_id: str, usb_devices: Iterable[UdevDevice] | None = None,
+) -> str | None:
     """
     Find USB device name by vendor and product IDs.
 
     Args:
         vendor_id: USB vendor ID (hex string like "0x0db0" or "0db0")
         product_id: USB product ID (hex string like "0x0076" or "0076")
+        usb_devices: Result of `list_usb_devices()` to search instead of enumerating udev
 
     Returns:
         Libvirt device name (e.g., "usb_1_2") or None if not found
     """
-    context = Context()
-
     # Normalize IDs (remove 0x prefix if present, convert to lowercase)
     # Keep the hex digits as-is (don't strip leading zeros from hex values)
     vendor_id = vendor_id.lower().replace('0x', '')
     product_id = product_id.lower().replace('0x', '')
 
-    for device in context.list_devices(subsystem='usb', DEVTYPE='usb_device'):
+    for device in list_usb_devices() if usb_devices is None else usb_devices:
         props = device.properties
 
         # Get device IDs (they're already without 0x prefix in pyudev)